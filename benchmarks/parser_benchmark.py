@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Compare XMLParser.etree_to_dict with the previous recursive implementation.
+
+Usage:
+    python benchmarks/parser_benchmark.py [number_of_runs]
+"""
+import os
+import sys
+import timeit
+
+sys.path[0:0] = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+
+from lxml import etree
+
+from icebergsdk.parser import XMLParser
+
+
+def flat_feed(number_of_products=5000):
+    root = etree.Element("products")
+    for i in xrange(number_of_products):
+        product = etree.SubElement(root, "product")
+        etree.SubElement(product, "id").text = str(i)
+        etree.SubElement(product, "name").text = "Product %s" % i
+        etree.SubElement(product, "price").text = "%s.90" % i
+        etree.SubElement(product, "description").text = "Description of product %s" % i
+    return root
+
+
+def nested_feed(depth=300, width=50):
+    root = etree.Element("products")
+    for i in xrange(width):
+        node = etree.SubElement(root, "product")
+        for level in xrange(depth):
+            node = etree.SubElement(node, "category")
+            node.text = "level %s" % level
+    return root
+
+
+def attribute_heavy_feed(number_of_products=3000, number_of_attributes=15):
+    root = etree.Element("products")
+    for i in xrange(number_of_products):
+        product = etree.SubElement(root, "product", id=str(i))
+        for attribute in xrange(number_of_attributes):
+            product.set("attr%s" % attribute, "value %s" % attribute)
+        images = etree.SubElement(product, "images")
+        for image in xrange(3):
+            etree.SubElement(images, "image", width="600", height="600").text = "http://example.com/%s/%s.jpg" % (i, image)
+    return root
+
+
+FEED_SHAPES = [
+    ("flat", flat_feed),
+    ("deeply nested", nested_feed),
+    ("attribute heavy", attribute_heavy_feed),
+]
+
+
+def run(number_of_runs=5):
+    parser = XMLParser()
+    for name, builder in FEED_SHAPES:
+        root = builder()
+        assert parser.etree_to_dict(root) == parser.etree_to_dict_recursive(root)
+
+        iterative = min(timeit.repeat(lambda: parser.etree_to_dict(root), number=1, repeat=number_of_runs))
+        recursive = min(timeit.repeat(lambda: parser.etree_to_dict_recursive(root), number=1, repeat=number_of_runs))
+        print "%-16s recursive: %.4fs  iterative: %.4fs  (x%.2f)" % (name, recursive, iterative, recursive / iterative)
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:2]])
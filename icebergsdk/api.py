@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 
-import mimetypes
 import logging
 import time
 import hashlib
@@ -11,8 +10,11 @@ from icebergsdk.exceptions import IcebergMissingApplicationSettingsError
 from icebergsdk.exceptions import IcebergMissingSsoData
 
 from icebergsdk import resources
-from icebergsdk.managers import ResourceManager, UserResourceManager, CartResourceManager, StoreResourceManager
+from icebergsdk.managers import ResourceManager, UserResourceManager, CartResourceManager, StoreResourceManager, ProductOfferResourceManager,\
+    TransitionResourceManager
 from icebergsdk.mixins.request_mixin import IcebergRequestBase
+from icebergsdk.utils.identity_map import IdentityMap
+from icebergsdk.utils.multipart import MultipartEncoder, MultipartFile
 
 logger = logging.getLogger('icebergsdk')
 
@@ -23,7 +25,7 @@ class IcebergAPI(IcebergRequestBase):
         super(IcebergAPI, self).__init__(*args, **kwargs)
 
         self.define_resources()  # Resources definition
-        self._objects_store = {}  # Will store the object for relationship management
+        self._objects_store = IdentityMap()  # Will store the object for relationship management
 
     def define_resources(self):
         """
@@ -81,11 +83,13 @@ class IcebergAPI(IcebergRequestBase):
         ]
 
         for resource_class in resource_classes_list:
-            setattr(self, resource_class.__name__, ResourceManager(resource_class=resource_class, api_handler=self))
+            manager_class = TransitionResourceManager if getattr(resource_class, 'transitions', None) else ResourceManager
+            setattr(self, resource_class.__name__, manager_class(resource_class=resource_class, api_handler=self))
 
         self.Cart = CartResourceManager(resource_class=resources.Cart, api_handler=self)
         self.User = UserResourceManager(resource_class=resources.User, api_handler=self)
         self.Store = StoreResourceManager(resource_class=resources.Store, api_handler=self)
+        self.ProductOffer = ProductOfferResourceManager(resource_class=resources.ProductOffer, api_handler=self)
 
         # Missing
 
@@ -106,41 +110,70 @@ class IcebergAPI(IcebergRequestBase):
         if not self.conf.ICEBERG_API_PRIVATE_KEY:
             raise IcebergMissingApplicationSettingsError()
 
-        timestamp = int(time.time())
-        secret_key = str(self.conf.ICEBERG_API_PRIVATE_KEY)
+        def login():
+            timestamp = int(time.time())
+            secret_key = str(self.conf.ICEBERG_API_PRIVATE_KEY)
 
-        to_compose = [username, email, first_name or '', last_name or '', is_staff, is_superuser, timestamp]
+            to_compose = [username, email, first_name or '', last_name or '', is_staff, is_superuser, timestamp]
 
-        to_compose_str = []
-        for elem in to_compose:
-            if type(elem) == unicode:
-                to_compose_str.append(elem.encode('utf-8'))
-            else:
-                to_compose_str.append(str(elem))
+            to_compose_str = []
+            for elem in to_compose:
+                if type(elem) == unicode:
+                    to_compose_str.append(elem.encode('utf-8'))
+                else:
+                    to_compose_str.append(str(elem))
 
-        hash_obj = hmac.new(b"%s" % secret_key, b";".join(to_compose_str), digestmod=hashlib.sha1)  # Expect strings
-        message_auth = hash_obj.hexdigest()
+            hash_obj = hmac.new(b"%s" % secret_key, b";".join(to_compose_str), digestmod=hashlib.sha1)  # Expect strings
+            message_auth = hash_obj.hexdigest()
 
-        data = {
-            'username': username,
-            'email': email,
-            'first_name': first_name,
-            'last_name': last_name,
-            'is_staff': is_staff,
-            'is_superuser': is_superuser,
-            'timestamp': timestamp,
-            'message_auth': message_auth
-        }
-
-        response = self.request('user/auth/', args=data)
+            data = {
+                'username': username,
+                'email': email,
+                'first_name': first_name,
+                'last_name': last_name,
+                'is_staff': is_staff,
+                'is_superuser': is_superuser,
+                'timestamp': timestamp,
+                'message_auth': message_auth
+            }
 
-        self.username = response['username']
-        self.access_token = response['access_token']
+            return self.request('user/auth/', args=data)
 
-        self._auth_response = response
+        self._login('auth_user', username, login, options={'is_staff': is_staff, 'is_superuser': is_superuser})
 
         return self
 
+    def _login(self, method, user_key, login, use_token_store=True, options=None):
+        """
+        Set the credentials from a valid token of the token store or from login() (the auth request),
+        storing the new token. Return the auth response.
+        options: the login parameters a stored token must have been created with
+        """
+        token_store_key = None
+        if self.token_store is not None and use_token_store:
+            token_store_key = self.token_store.build_key(self.conf, method, user_key, options=options)
+            token = self.token_store.get(token_store_key, min_validity=self.token_refresh_margin)
+            if token is not None:
+                logger.debug(u"Reusing the stored token of %s", user_key)
+                self._token_store_key = token_store_key
+                self.set_credentials(token['username'], token['access_token'],
+                                     auth_response=token['auth_response'], expires_at=token['expires_at'])
+                return token['auth_response']
+
+        response = login()
+        expires_at = time.time() + self.token_ttl
+        self.set_credentials(response['username'], response['access_token'], auth_response=response, expires_at=expires_at)
+
+        self._token_store_key = token_store_key
+        if token_store_key is not None:
+            self.token_store.set(token_store_key, {
+                'username': response['username'],
+                'access_token': response['access_token'],
+                'auth_response': response,
+                'expires_at': expires_at,
+            })
+        return response
+
     def generate_messages_auth(self, data):
         email = data['email']
         first_name = data['first_name']
@@ -203,8 +236,7 @@ class IcebergAPI(IcebergRequestBase):
 
         response = self.request('user/sso/', args=data)
 
-        self.username = response['username']
-        self.access_token = response['access_token']
+        self.set_credentials(response['username'], response['access_token'])
 
         return response
 
@@ -212,47 +244,50 @@ class IcebergAPI(IcebergRequestBase):
         if not self.conf.ICEBERG_APPLICATION_NAMESPACE or not self.conf.ICEBERG_APPLICATION_SECRET_KEY:
             raise IcebergMissingApplicationSettingsError(self.conf.ICEBERG_ENV)
 
-        logger.debug(u"sso_user %s on application %s" % (email, self.conf.ICEBERG_APPLICATION_NAMESPACE))
-        timestamp = int(time.time())
-
         if birth_date and isinstance(birth_date, datetime.date):
             birth_date = birth_date.isoformat()
 
-        data = {
-            'application': self.conf.ICEBERG_APPLICATION_NAMESPACE,
-            'email': email,
-            'first_name': first_name,
-            'last_name': last_name,
-            'timestamp': timestamp,
-            'from_session_id': from_session_id,
-            'include_application_data': include_application_data,
-            'message_auth': self.generate_messages_auth({
+        def login():
+            logger.debug(u"sso_user %s on application %s" % (email, self.conf.ICEBERG_APPLICATION_NAMESPACE))
+            timestamp = int(time.time())
+
+            data = {
+                'application': self.conf.ICEBERG_APPLICATION_NAMESPACE,
                 'email': email,
                 'first_name': first_name,
                 'last_name': last_name,
                 'timestamp': timestamp,
-                'currency': currency,
                 'from_session_id': from_session_id,
-                'shipping_country': shipping_country,
-                'birth_date': birth_date
-            })
-        }
-
-        if shipping_country:
-            data['shipping_country'] = shipping_country
-
-        if currency:
-            data['currency'] = currency
-
-        if birth_date:
-            data['birth_date'] = birth_date
-
-        response = self.request('user/sso/', args=data)
-
-        self.username = response['username']
-        self.access_token = response['access_token']
-
-        self._auth_response = response
+                'include_application_data': include_application_data,
+                'message_auth': self.generate_messages_auth({
+                    'email': email,
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'timestamp': timestamp,
+                    'currency': currency,
+                    'from_session_id': from_session_id,
+                    'shipping_country': shipping_country,
+                    'birth_date': birth_date
+                })
+            }
+
+            if shipping_country:
+                data['shipping_country'] = shipping_country
+
+            if currency:
+                data['currency'] = currency
+
+            if birth_date:
+                data['birth_date'] = birth_date
+
+            return self.request('user/sso/', args=data)
+
+        # An anonymous session conversion can't reuse a token
+        self._login('sso_user', email, login, use_token_store=not from_session_id, options={
+            'currency': currency,
+            'shipping_country': shipping_country,
+            'include_application_data': include_application_data,
+        })
 
         return self
         # return response
@@ -271,15 +306,32 @@ class IcebergAPI(IcebergRequestBase):
         return locals()
     _sso_response = property(**_sso_response())
 
-    def send_image(self, path, image_path, method="post"):
-        mimetype, encoding = mimetypes.guess_type(image_path)
-        image_name = image_path.split("/")[-1]
-        image_info = ('image', (image_name, open(image_path, 'rb'), mimetype))
-        headers = {
-            'Accept-Language': self.lang,
-            'Authorization': self.get_auth_token()
-        }
-        return self.request(path, files=[image_info], method=method, headers=headers)
+    def send_image(self, path, image_path=None, method="post", image=None, filename=None, progress=None):
+        """
+        Upload an image as multipart/form-data, streamed chunk by chunk.
+
+        image_path: path of the image file (opened and closed here)
+        image: file-like object or bytes of the image, when there is no file (not closed here)
+        progress(bytes_sent, total_bytes, bytes_per_second): called while uploading
+        """
+        if image_path is not None:
+            image_file = MultipartFile(image_path, filename=filename, from_path=True)
+        elif image is not None:
+            image_file = MultipartFile(image, filename=filename)
+        else:
+            raise ValueError("image_path or image is required")
+
+        with MultipartEncoder({'image': image_file}, progress=progress) as body:
+            headers = {
+                'Accept-Language': self.lang,
+                'Authorization': self.get_auth_token(),
+                'Content-Type': body.content_type
+            }
+            start = time.time()
+            result = self.request(path, data=body, method=method, headers=headers)
+            elapsed = time.time() - start
+            logger.debug("Uploaded %s bytes in %.2f seconds (%.0f bytes/s)", body.len, elapsed, body.len / elapsed if elapsed else 0)
+            return result
 
     def get_element(self, resource, object_id):
         return self.request("%s/%s/" % (resource, object_id))
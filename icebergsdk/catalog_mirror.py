@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Local SQLite copy of API endpoints, to query them without requests.
+
+    mirror = CatalogMirror(api_handler, "/var/lib/myapp/catalog.db", endpoints=["product", "productoffer", "brand"])
+    mirror.sync()  # Initial load, then only the objects modified since the previous sync
+
+    offers, meta = mirror.search("productoffer", {"status": "active", "price__lte": 100, "order_by": "-price"})
+    brand = mirror.find(Brand, 12)
+
+The objects are returned as resources, detached from the api_handler objects: they are kept
+in an identity map of the mirror, so that offline results don't overwrite the live objects
+with older data. Their requests (fetch, save...) still go through api_handler.
+Filters use the JSON1 functions of SQLite (json_extract).
+Deleted objects are not detected by the incremental sync: call reset(endpoint) then sync() to reload an endpoint.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from icebergsdk.exceptions import IcebergObjectNotFound
+from icebergsdk.utils.batch_utils import DEFAULT_CONCURRENCY, run_in_pool
+from icebergsdk.utils.identity_map import IdentityMap
+from icebergsdk.utils.pagination import iter_objects
+
+logger = logging.getLogger('icebergsdk.catalog_mirror')
+
+LOOKUPS = {
+    'exact': '=',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+}
+
+
+def candidates(value):
+    """
+    Values to compare a filter value with: the query string filters give
+    numbers as strings, while the stored json keeps their type.
+    """
+    if isinstance(value, bool):
+        return [int(value)]
+    if isinstance(value, basestring):
+        for number_type in (int, float):
+            try:
+                return [value, number_type(value)]
+            except ValueError:
+                pass
+    return [value]
+
+
+def as_bool(value):
+    """
+    Boolean of a filter value, ex: isnull=false in the query string filters.
+    """
+    if isinstance(value, basestring):
+        return value.strip().lower() not in ('', '0', 'false', 'no', 'none')
+    return bool(value)
+
+
+class MirrorHandler(object):
+    """
+    Handler of the mirror objects: sends the requests with the api handler,
+    but has its own identity map.
+    """
+    def __init__(self, handler):
+        self._handler = handler
+        self._objects_store = IdentityMap()
+
+    def __getattr__(self, name):
+        return getattr(self._handler, name)
+
+
+class CatalogMirror(object):
+    """
+    The first sync of an endpoint loads all its pages, `concurrency` at a time.
+    The next ones list the objects with modified_field greater than the start
+    of the previous sync (modified_field__gt filter), minus sync_overlap seconds
+    for the clock differences with the API. The greatest modified_field value
+    seen isn't used: an object of an already loaded page may be modified
+    during the sync before the objects of the next pages.
+    """
+    def __init__(self, handler, path, endpoints=("product", "productoffer", "brand", "category"),
+                 page_size=100, concurrency=DEFAULT_CONCURRENCY, modified_field="last_modified", sync_overlap=5 * 60):
+        self.handler = handler
+        self.mirror_handler = MirrorHandler(handler)
+        self.path = path
+        self.endpoints = endpoints
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.modified_field = modified_field
+        self.sync_overlap = sync_overlap
+
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS mirror_objects ("
+                                    "endpoint TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, "
+                                    "PRIMARY KEY (endpoint, id))")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS mirror_state ("
+                                    "endpoint TEXT PRIMARY KEY, last_modified TEXT, synced_at REAL)")
+
+    def close(self):
+        self.connection.close()
+
+    ####
+    #   Sync
+    ####
+    def get_state(self, endpoint):
+        with self._lock:
+            row = self.connection.execute("SELECT last_modified, synced_at FROM mirror_state WHERE endpoint = ?",
+                                          (endpoint,)).fetchone()
+        return {'last_modified': row[0], 'synced_at': row[1]} if row is not None else None
+
+    def sync(self, endpoints=None):
+        """
+        Initial load or incremental sync of the endpoints. Return {endpoint: number of objects saved}
+        """
+        results = {}
+        for endpoint in (endpoints or self.endpoints):
+            state = self.get_state(endpoint)
+            if state is None:
+                results[endpoint] = self.initial_load(endpoint)
+            else:
+                results[endpoint] = self.incremental_sync(endpoint, state['last_modified'])
+        return results
+
+    def _sync_cursor(self):
+        """
+        modified_field__gt value for the next sync, taken before the current one starts
+        """
+        return (datetime.now(pytz.utc) - timedelta(seconds=self.sync_overlap)).isoformat()
+
+    def initial_load(self, endpoint):
+        path = "%s/" % endpoint
+        args = {'order_by': 'id'}  # Stable pages
+        cursor = self._sync_cursor()
+
+        first_page = self.handler.request(path, args=dict(args, offset=0, limit=self.page_size))
+        total_count = first_page['meta']['total_count']
+        self._save(endpoint, first_page['objects'])
+        count = len(first_page['objects'])
+
+        def get_page(offset):
+            return self.handler.request(path, args=dict(args, offset=offset, limit=self.page_size))['objects']
+
+        step = len(first_page['objects'])  # The API may return less objects than page_size
+        offsets = range(step, total_count, step) if step else []
+        for offset, objects, error in run_in_pool(get_page, offsets, concurrency=self.concurrency):
+            if error is not None:
+                raise error  # No state saved: the next sync loads the endpoint again
+            self._save(endpoint, objects)
+            count += len(objects)
+
+        self._save_state(endpoint, cursor)
+        logger.info("Loaded %s %s objects", count, endpoint)
+        return count
+
+    def incremental_sync(self, endpoint, last_modified):
+        args = {'order_by': self.modified_field}
+        if last_modified:
+            args['%s__gt' % self.modified_field] = last_modified
+        cursor = self._sync_cursor()
+
+        count = 0
+        batch = []
+        for element in iter_objects(self.handler, "%s/" % endpoint, args=args, page_size=self.page_size):
+            batch.append(element)
+            if len(batch) == self.page_size:
+                self._save(endpoint, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._save(endpoint, batch)
+            count += len(batch)
+
+        self._save_state(endpoint, cursor)
+        logger.info("Synced %s modified %s objects", count, endpoint)
+        return count
+
+    def _save(self, endpoint, objects):
+        with self._lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO mirror_objects (endpoint, id, data) VALUES (?, ?, ?)",
+                    [(endpoint, str(obj['id']), json.dumps(obj)) for obj in objects]
+                )
+
+    def _save_state(self, endpoint, last_modified):
+        with self._lock:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO mirror_state (endpoint, last_modified, synced_at) VALUES (?, ?, ?)",
+                    (endpoint, last_modified, time.time())
+                )
+
+    def reset(self, endpoint):
+        """
+        Forget an endpoint, the next sync loads it again
+        """
+        with self._lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM mirror_objects WHERE endpoint = ?", (endpoint,))
+                self.connection.execute("DELETE FROM mirror_state WHERE endpoint = ?", (endpoint,))
+
+    ####
+    #   Queries
+    ####
+    def _build_object(self, resource_class, data):
+        if resource_class is None:
+            from icebergsdk.resources.base import IcebergObject
+            resource_class = IcebergObject
+        return resource_class.findOrCreate(self.mirror_handler, json.loads(data))
+
+    def _endpoint(self, resource):
+        if isinstance(resource, basestring):
+            return resource, None
+        return resource.endpoint, resource
+
+    def find(self, resource, object_id):
+        """
+        resource: endpoint name or resource class
+        """
+        endpoint, resource_class = self._endpoint(resource)
+        with self._lock:
+            row = self.connection.execute("SELECT data FROM mirror_objects WHERE endpoint = ? AND id = ?",
+                                          (endpoint, str(object_id))).fetchone()
+        if row is None:
+            raise IcebergObjectNotFound()
+        return self._build_object(resource_class, row[0])
+
+    def _where(self, endpoint, args):
+        clauses = ["endpoint = ?"]
+        params = [endpoint]
+        for key, value in args.iteritems():
+            if key in ('order_by', 'limit', 'offset'):
+                continue
+            parts = key.split("__")
+            lookup = 'exact'
+            if len(parts) > 1 and (parts[-1] in LOOKUPS or parts[-1] in ('in', 'icontains', 'isnull')):
+                lookup = parts.pop()
+            field = "json_extract(data, '$.%s')" % ".".join(parts).replace("'", "")
+
+            if lookup == 'in':
+                values = value.split(",") if isinstance(value, basestring) else list(value)
+                values = sum([candidates(v) for v in values], [])
+                clauses.append("%s IN (%s)" % (field, ",".join("?" * len(values))))
+                params.extend(values)
+            elif lookup == 'icontains':
+                clauses.append("LOWER(%s) LIKE ?" % field)
+                params.append(u"%%%s%%" % value.lower())
+            elif lookup == 'isnull':
+                clauses.append("%s IS %sNULL" % (field, "" if as_bool(value) else "NOT "))
+            elif lookup == 'exact':
+                values = candidates(value)
+                clauses.append("%s IN (%s)" % (field, ",".join("?" * len(values))))
+                params.extend(values)
+            else:
+                clauses.append("%s %s ?" % (field, LOOKUPS[lookup]))
+                params.append(candidates(value)[-1])
+        return " AND ".join(clauses), params
+
+    def count(self, resource, args=None):
+        endpoint, resource_class = self._endpoint(resource)
+        where, params = self._where(endpoint, args or {})
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM mirror_objects WHERE %s" % where, params).fetchone()[0]
+
+    def search(self, resource, args=None):
+        """
+        Like search() on the API, with the filters: field, field__gt/gte/lt/lte/in/icontains/isnull,
+        nested fields (merchant__id), order_by ("-price" for descending), limit (default 20) and offset.
+        Return (objects, meta)
+        """
+        args = args or {}
+        endpoint, resource_class = self._endpoint(resource)
+        where, params = self._where(endpoint, args)
+
+        query = "SELECT data FROM mirror_objects WHERE %s" % where
+        order_by = args.get('order_by')
+        if order_by:
+            descending = order_by.startswith("-")
+            query += " ORDER BY json_extract(data, '$.%s') %s" % (
+                order_by.lstrip("-").replace("__", ".").replace("'", ""), "DESC" if descending else "ASC")
+        limit, offset = int(args.get('limit', 20)), int(args.get('offset', 0))
+        query += " LIMIT ? OFFSET ?"
+
+        with self._lock:
+            rows = self.connection.execute(query, params + [limit, offset]).fetchall()
+        meta = {'limit': limit, 'offset': offset, 'total_count': self.count(resource, args)}
+        return [self._build_object(resource_class, row[0]) for row in rows], meta
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Resumable exports of API endpoints.
+
+    export = Export(api_handler, "merchant_order", NDJSONSink("merchant_orders.ndjson"),
+                    filters={"status": "80"}, checkpoint=FileCheckpoint("merchant_orders.checkpoint"))
+    export.run()  # Started again after a crash, goes on from the last written page
+
+    # One file per day of 2015, 4 days exported at a time
+    report = PartitionedExport(api_handler, "order", "created_on", datetime(2015, 1, 1), datetime(2016, 1, 1),
+                               output_dir="exports", concurrency=4).run()
+"""
+import csv
+import json
+import logging
+import os
+from datetime import timedelta
+
+from icebergsdk.json_utils import DateTimeAwareJSONEncoder
+from icebergsdk.utils.batch_utils import BatchReport, DEFAULT_CONCURRENCY, run_in_pool
+from icebergsdk.utils.checkpoint import FileCheckpoint
+
+logger = logging.getLogger('icebergsdk.export')
+
+
+####
+#   Sinks
+####
+class FileSink(object):
+    """
+    File written page by page. The position after each page is saved in the
+    checkpoint, the file is truncated back to it when the export resumes, so
+    that a page written before a crash isn't written twice.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def open(self, position=0):
+        self.file = open(self.path, "ab")
+        self.file.truncate(position)
+        self.file.seek(position)
+
+    def write(self, obj):
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Write the pending data to the disk and return the position
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class NDJSONSink(FileSink):
+    """
+    One json document per line
+    """
+    def write(self, obj):
+        self.file.write(json.dumps(obj, cls=DateTimeAwareJSONEncoder))
+        self.file.write("\n")
+
+
+class CSVSink(FileSink):
+    """
+    One row per object with the given fields. Nested fields are written
+    "merchant.id", the missing ones are left empty.
+    """
+    def __init__(self, path, fields):
+        super(CSVSink, self).__init__(path)
+        self.fields = fields
+        self.writer = None
+
+    def open(self, position=0):
+        super(CSVSink, self).open(position)
+        self.writer = csv.writer(self.file)
+        if position == 0:
+            self.writer.writerow(self.fields)
+
+    def get_value(self, obj, field):
+        for step in field.split("."):
+            if not isinstance(obj, dict):
+                return ""
+            obj = obj.get(step)
+        if obj is None:
+            return ""
+        if isinstance(obj, (dict, list)):
+            return json.dumps(obj, cls=DateTimeAwareJSONEncoder)
+        if isinstance(obj, unicode):
+            return obj.encode("utf-8")
+        return obj
+
+    def write(self, obj):
+        self.writer.writerow([self.get_value(obj, field) for field in self.fields])
+
+
+####
+#   Export
+####
+class Export(object):
+    """
+    Write all the objects of an endpoint matching filters into a sink, page by page.
+
+    cursor="id": pages are requested with id__gt the last exported id (order_by id),
+    so objects created meanwhile don't shift the pages.
+    cursor="offset": pages are requested by offset, for endpoints which can't be filtered by id.
+    The export ends on an empty page or a page without meta.next, not on a short page:
+    the API may return less objects than page_size.
+
+    After each page, the sink is flushed and the cursor, the sink position and
+    the count are saved in the checkpoint (ex: FileCheckpoint). A finished export
+    is marked done and isn't run again until the checkpoint is cleared.
+    """
+    def __init__(self, handler, endpoint, sink, filters=None, page_size=100, checkpoint=None, cursor="id"):
+        self.handler = handler
+        self.endpoint = getattr(endpoint, 'endpoint', endpoint)  # Name or resource class
+        self.sink = sink
+        self.filters = filters or {}
+        self.page_size = page_size
+        self.checkpoint = checkpoint
+        self.cursor = cursor
+
+    def get_page(self, state):
+        args = dict(self.filters, limit=self.page_size)
+        if self.cursor == "id":
+            args['order_by'] = 'id'
+            if state.get('last_id') is not None:
+                args['id__gt'] = state['last_id']
+        else:
+            args['offset'] = state.get('offset', 0)
+        return self.handler.request("%s/" % self.endpoint, args=args)
+
+    def run(self):
+        """
+        Return the number of objects exported (including the ones of the previous runs)
+        """
+        state = self.checkpoint.load() if self.checkpoint is not None else {}
+        if state.get('done'):
+            logger.info("Export of %s already done", self.sink.path)
+            return state['count']
+
+        self.sink.open(state.get('position', 0))
+        try:
+            while True:
+                page = self.get_page(state)
+                objects = page['objects']
+                for obj in objects:
+                    self.sink.write(obj)
+
+                state['position'] = self.sink.flush()
+                state['count'] = state.get('count', 0) + len(objects)
+                if objects:
+                    state['last_id'] = objects[-1]['id']
+                state['offset'] = state.get('offset', 0) + len(objects)
+                state['done'] = not objects or page.get('meta', {}).get('next', "") is None
+                if self.checkpoint is not None:
+                    self.checkpoint.save(state)
+
+                if state['done']:
+                    break
+        finally:
+            self.sink.close()
+
+        logger.info("Exported %s %s objects to %s", state['count'], self.endpoint, self.sink.path)
+        return state['count']
+
+
+class PartitionedExport(object):
+    """
+    Export an endpoint in date range partitions ([start, start + step[, ...),
+    `concurrency` partitions at a time. Each partition is written in its own
+    file of output_dir, with its own checkpoint file.
+
+    format: "ndjson" or "csv" (csv_fields required)
+    """
+    def __init__(self, handler, endpoint, date_field, start, end, output_dir, step=timedelta(days=1),
+                 format="ndjson", csv_fields=None, filters=None, page_size=100, concurrency=DEFAULT_CONCURRENCY, cursor="id"):
+        if format == "csv" and not csv_fields:
+            raise ValueError("csv_fields is required for csv exports")
+        self.handler = handler
+        self.endpoint = getattr(endpoint, 'endpoint', endpoint)
+        self.date_field = date_field
+        self.start = start
+        self.end = end
+        self.output_dir = output_dir
+        self.step = step
+        self.format = format
+        self.csv_fields = csv_fields
+        self.filters = filters or {}
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.cursor = cursor
+
+    def partitions(self):
+        """
+        List of (start, end) date ranges
+        """
+        partitions = []
+        start = self.start
+        while start < self.end:
+            end = min(start + self.step, self.end)
+            partitions.append((start, end))
+            start = end
+        return partitions
+
+    def build_export(self, partition):
+        start, end = partition
+        path = os.path.join(self.output_dir, "%s-%s.%s" % (self.endpoint, start.strftime("%Y%m%d%H%M%S"), self.format))
+        if self.format == "csv":
+            sink = CSVSink(path, self.csv_fields)
+        else:
+            sink = NDJSONSink(path)
+
+        filters = dict(self.filters)
+        filters["%s__gte" % self.date_field] = start.isoformat()
+        filters["%s__lt" % self.date_field] = end.isoformat()
+        return Export(self.handler, self.endpoint, sink, filters=filters, page_size=self.page_size,
+                      checkpoint=FileCheckpoint("%s.checkpoint" % path), cursor=self.cursor)
+
+    def run(self):
+        """
+        Return a BatchReport (succeeded: the number of objects of each exported
+        partition, failed: [((start, end), error)]). Run it again to resume the failed partitions.
+        """
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        report = BatchReport()
+        for partition, count, error in run_in_pool(lambda partition: self.build_export(partition).run(),
+                                                   self.partitions(), concurrency=self.concurrency):
+            if error is not None:
+                logger.warning("Export of %s partition %s failed: %s", self.endpoint, partition, error)
+            report.add_outcome(partition, count, error)
+        return report
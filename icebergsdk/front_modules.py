@@ -1,13 +1,35 @@
 # -*- coding: utf-8 -*-
 import logging
+import threading
+import time
 
 from icebergsdk.mixins.request_mixin import IcebergRequestBase
+from icebergsdk.utils.batch_utils import BatchReport, DEFAULT_CONCURRENCY, run_in_pool
+from icebergsdk.utils.cache_utils import LRUCache, SingleFlight
+from icebergsdk.utils.instrumentation import emit
 
 logger = logging.getLogger('icebergsdk.frontmodules')
 
 
 class FrontModules(IcebergRequestBase):
-    cache_expire = 60 * 20  # 20 minutes
+    """
+    Modules data are cached in the process (local_cache, one per configuration)
+    and in the optional shared `cache` (ex: django cache).
+
+    Until cache_soft_expire, cached data are served as is. Between
+    cache_soft_expire and cache_hard_expire, they are still served but
+    refreshed by a background thread. After cache_hard_expire, the request
+    waits for the download. Concurrent downloads of the same data are coalesced.
+
+    cache_expire, the previous setting, is an alias of cache_soft_expire.
+    """
+    cache_soft_expire = 60 * 20  # 20 minutes
+    cache_hard_expire = 60 * 60 * 2  # 2 hours
+
+    local_cache_size = 32
+    _local_caches = {}  # By configuration, shared by its instances
+    _local_caches_lock = threading.Lock()
+    _downloads = SingleFlight()
 
     def __init__(self, *args, **kwargs):
         super(FrontModules, self).__init__(*args, **kwargs)
@@ -15,6 +37,53 @@ class FrontModules(IcebergRequestBase):
         self.lang = kwargs.get('lang', "en")
         self.debug = kwargs.get('debug', False)
         self.module_debug = kwargs.get('module_debug', self.debug)
+        if not isinstance(type(self).cache_expire, property):  # Subclass still setting cache_expire
+            self.cache_soft_expire = type(self).cache_expire
+
+    @property
+    def cache_expire(self):
+        return self.cache_soft_expire
+
+    @cache_expire.setter
+    def cache_expire(self, value):
+        self.cache_soft_expire = value
+
+    @classmethod
+    def warm_up(cls, langs, concurrency=DEFAULT_CONCURRENCY, force=False, **kwargs):
+        """
+        Load the modules data of the given langs concurrently, to fill the
+        local and shared caches at process start. kwargs are passed to FrontModules (conf, cache, debug...).
+        With force=True, the data are downloaded even if they are already cached.
+
+        Return a BatchReport (succeeded: the langs loaded, elapsed: duration in seconds).
+        The duration is also reported with the "frontmodules_warm_up" instrumentation event.
+
+        Usage:
+            report = FrontModules.warm_up(["en", "fr", "de"], cache=cache)
+            if report.has_errors(): ...
+        """
+        start = time.time()
+        langs = list(langs)  # Also reported in the event once loaded
+        kwargs.setdefault('session', cls.build_session(max(concurrency, 1)))
+
+        def load(lang):
+            front_modules = cls(lang=lang, **kwargs)
+            if force:
+                cache_key = front_modules.cache_key
+                front_modules._downloads.do(cache_key, front_modules.download_modules_data, cache_key)
+            else:
+                front_modules.modules_data
+            return lang
+
+        report = BatchReport()
+        for lang, result, error in run_in_pool(load, langs, concurrency):
+            if error is not None:
+                logger.warning("Cant load front modules data for lang %s: %s", lang, error)
+            report.add_outcome(lang, result, error)
+
+        report.elapsed = time.time() - start
+        emit("frontmodules_warm_up", langs=langs, elapsed=report.elapsed, failed=[lang for lang, error in report.failed])
+        return report
 
     def get_module_data(self, module_name):
         return self.modules_data['modules'][module_name]
@@ -22,11 +91,21 @@ class FrontModules(IcebergRequestBase):
     ####
     #   Loader
     ####
+    @property
+    def local_cache(self):
+        with self._local_caches_lock:
+            cache = self._local_caches.get(self.conf)
+            if cache is None:
+                cache = self._local_caches[self.conf] = LRUCache(max_size=self.local_cache_size)
+        return cache
+
     @property
     def cache_key(self):
-        return "icebergsdk:frontmodule:data:%s:%s:%s" % (
+        # v2: {'data', 'fetched_at'} entries, the previous versions read the data from the unversioned key
+        return "icebergsdk:frontmodule:data:v2:%s:%s:%s:%s" % (
             self.lang,
             self.conf.ICEBERG_ENV,
+            self.conf.ICEBERG_MODULES_URL,
             self.debug,
         )
 
@@ -35,22 +114,52 @@ class FrontModules(IcebergRequestBase):
         """
         Helper to fetch Iceberg client side javascript templates
         """
-        # if hasattr(self, "_modules_data_%s" % self.lang):
-        #     return getattr(self, "_modules_data_%s" % self.lang)
+        cache_key = self.cache_key
+        entry = self.get_cached_entry(cache_key)
+        if entry is not None:
+            age = time.time() - entry['fetched_at']
+            if age < self.cache_soft_expire:
+                return entry['data']
+            if age < self.cache_hard_expire:
+                self.refresh_in_background(cache_key)
+                return entry['data']
 
-        if self.cache:
-            data = self.cache.get(self.cache_key, False)
-            if data:
-                # setattr(self, '_modules_data_%s' % self.lang, data)
-                return data
+        return self._downloads.do(cache_key, self.download_modules_data, cache_key)
 
+    def get_cached_entry(self, cache_key):
+        """
+        Return {'data': ..., 'fetched_at': timestamp} from the local cache, then the shared cache
+        """
+        entry = self.local_cache.get(cache_key)
+        if entry is None and self.cache:
+            entry = self.cache.get(cache_key, None)
+            if entry:
+                self.local_cache.set(cache_key, entry)
+        return entry or None
+
+    def download_modules_data(self, cache_key):
         data = self.request(self.conf.ICEBERG_MODULES_URL, args={
             "lang": self.lang,
             "enviro": self.conf.ICEBERG_ENV,
             "debug": self.module_debug
-        })  # Do to, add lang
-        # setattr(self, '_modules_data_%s' % self.lang, data)
+        })
+        entry = {'data': data, 'fetched_at': time.time()}
+        self.local_cache.set(cache_key, entry)
         if self.cache:
-            self.cache.set(self.cache_key, data, self.cache_expire)
+            self.cache.set(cache_key, entry, self.cache_hard_expire)
 
         return data
+
+    def refresh_in_background(self, cache_key):
+        if self._downloads.in_flight(cache_key):
+            return
+
+        def refresh():
+            try:
+                self._downloads.do(cache_key, self.download_modules_data, cache_key)
+            except Exception:
+                logger.exception("Cant refresh front modules data %s", cache_key)
+
+        thread = threading.Thread(target=refresh, name="icebergsdk-frontmodules-refresh")
+        thread.daemon = True
+        thread.start()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Authenticated handlers for many users.
+
+    pool = HandlerPool(conf=ConfigurationSandbox)
+    pool.start()  # Refresh the tokens in background before they expire
+
+    api_handler = pool.sso_user_handler("user@example.com", first_name="John", last_name="Doe")
+    api_handler.Cart.mine()
+"""
+import logging
+import threading
+import time
+
+from icebergsdk.api import IcebergAPI
+from icebergsdk.conf import Configuration
+from icebergsdk.mixins.request_mixin import IcebergRequestBase
+from icebergsdk.utils.cache_utils import LRUCache, SingleFlight
+from icebergsdk.utils.identity_map import IdentityMap
+
+logger = logging.getLogger('icebergsdk.handler_pool')
+
+
+class HandlerPool(object):
+    """
+    IcebergAPI handlers by (application namespace, user), authenticated once
+    and reused until their token expires (token_ttl seconds).
+    With a token_store (see icebergsdk.token_store), the tokens are also shared
+    with the other processes.
+
+    All the handlers share one requests session (pool_size connections) and
+    get their identity map from identity_map_factory. Each user keeps their
+    own identity map, since the objects are bound to the handler which loaded them.
+    The max_handlers most recently used handlers are kept.
+
+    Concurrent authentications of the same user are coalesced. Once start()ed,
+    a background thread authenticates again, every refresh_interval seconds, the
+    users whose token expires in less than refresh_margin seconds.
+    """
+    def __init__(self, conf=Configuration, token_ttl=12 * 3600, refresh_margin=10 * 60, refresh_interval=60,
+                 max_handlers=1000, pool_size=10, identity_map_factory=IdentityMap, handler_class=IcebergAPI,
+                 **handler_kwargs):
+        self.conf = conf
+        self.token_ttl = token_ttl
+        self.refresh_margin = refresh_margin
+        self.refresh_interval = refresh_interval
+        self.identity_map_factory = identity_map_factory
+        self.handler_class = handler_class
+        self.handler_kwargs = handler_kwargs
+        self.handler_kwargs.setdefault('token_ttl', token_ttl)
+        self.handler_kwargs.setdefault('token_refresh_margin', refresh_margin)
+        self.session = IcebergRequestBase.build_session(pool_size)
+
+        self._entries = LRUCache(max_size=max_handlers)
+        self._authentications = SingleFlight()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def cache_key(self, user_key):
+        return (self.conf.ICEBERG_APPLICATION_NAMESPACE, user_key)
+
+    def new_handler(self):
+        handler = self.handler_class(conf=self.conf, session=self.session, **self.handler_kwargs)
+        handler._objects_store = self.identity_map_factory()
+        return handler
+
+    ####
+    #   Handlers
+    ####
+    def get_handler(self, user_key, authenticate):
+        """
+        Return the handler of user_key, authenticated by authenticate(handler) when it has no valid token
+        """
+        key = self.cache_key(user_key)
+        entry = self._entries.get(key)
+        if entry is None or self._expires_within(entry, 0):
+            handler = entry['handler'] if entry is not None else None
+            entry = self._authentications.do(key, self._authenticate, key, authenticate, handler)
+        return entry['handler']
+
+    def sso_user_handler(self, email, first_name=None, last_name=None, **kwargs):
+        """
+        Handler of a user of the application, authenticated with IcebergAPI.sso_user
+        """
+        return self.get_handler(email, lambda handler: handler.sso_user(
+            email=email, first_name=first_name, last_name=last_name, **kwargs))
+
+    def auth_user_handler(self, username, email, **kwargs):
+        """
+        Handler of a user, authenticated with IcebergAPI.auth_user (Iceberg Staff)
+        """
+        return self.get_handler(username, lambda handler: handler.auth_user(username, email, **kwargs))
+
+    def invalidate(self, user_key):
+        """
+        Forget the token of user_key, ex: when it was revoked
+        """
+        self._entries.delete(self.cache_key(user_key))
+
+    def clear(self):
+        self._entries.clear()
+
+    def _authenticate(self, key, authenticate, handler=None):
+        """
+        Authenticate with a new handler, then update the credentials of the
+        existing handler at once, so it can be used meanwhile.
+        """
+        auth_handler = self.new_handler()
+        authenticate(auth_handler)
+        if handler is None:
+            handler = auth_handler
+        else:
+            handler.set_credentials(auth_handler.username, auth_handler.access_token,
+                                    auth_response=getattr(auth_handler, '_auth_response', None),
+                                    expires_at=auth_handler.token_expires_at)
+            handler._token_store_key = auth_handler._token_store_key
+
+        entry = {
+            'handler': handler,
+            'authenticate': authenticate,
+        }
+        self._entries.set(key, entry)
+        return entry
+
+    def _expires_within(self, entry, seconds):
+        """
+        Whether the token of the entry expires in less than seconds (or was refused)
+        """
+        expires_at = entry['handler'].token_expires_at
+        return expires_at is None or expires_at <= time.time() + seconds
+
+    ####
+    #   Background refresh
+    ####
+    def refresh_expiring(self):
+        """
+        Authenticate again the users whose token expires soon. Return the number of refreshed tokens.
+        """
+        refreshed = 0
+        for key, entry in self._entries.items():
+            if not self._expires_within(entry, self.refresh_margin):
+                continue
+            try:
+                self._authentications.do(key, self._authenticate, key, entry['authenticate'], entry['handler'])
+                refreshed += 1
+            except Exception:
+                logger.exception("Cant refresh the token of %s, will retry", key[1])
+        return refreshed
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="icebergsdk-handler-pool")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.refresh_expiring()
+            except Exception:
+                logger.exception("Error in handler pool refresh")
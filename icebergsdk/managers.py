@@ -1,3 +1,5 @@
+from icebergsdk.queryset import QuerySet
+from icebergsdk.utils.batch_utils import DEFAULT_CONCURRENCY
 
 
 class ResourceManager(object):
@@ -24,12 +26,38 @@ class ResourceManager(object):
     def all(self, args=None):
         return self.resource_class.all(self.api_handler, args=args)
 
+    def query(self, page_size=100):
+        return QuerySet(self.resource_class, self.api_handler, page_size=page_size)
+
+    def filter(self, **filters):
+        return self.query().filter(**filters)
+
+    def order_by(self, *fields):
+        return self.query().order_by(*fields)
+
     def save(self):
         return self.resource_class.save(self.api_handler)
 
+    def save_many(self, objects, concurrency=DEFAULT_CONCURRENCY, return_data=True):
+        return self.resource_class.save_many(self.api_handler, objects, concurrency=concurrency, return_data=return_data)
+
     def delete(self):
         return self.resource_class.delete(self.api_handler)
 
+    def delete_many(self, objects_or_ids, concurrency=DEFAULT_CONCURRENCY, bulk=False, bulk_size=100):
+        return self.resource_class.delete_many(self.api_handler, objects_or_ids, concurrency=concurrency,
+                                               bulk=bulk, bulk_size=bulk_size)
+
+
+
+class TransitionResourceManager(ResourceManager):
+    """
+    Manager of the resources declaring state transitions (ex: MerchantOrder)
+    """
+
+    def transition_many(self, objects, action, concurrency=DEFAULT_CONCURRENCY):
+        return self.resource_class.transition_many(self.api_handler, objects, action, concurrency=concurrency)
+
 
 class UserResourceManager(ResourceManager):
 
@@ -43,6 +71,13 @@ class StoreResourceManager(ResourceManager):
         return self.resource_class.mine(self.api_handler, args=args)
 
 
+class ProductOfferResourceManager(ResourceManager):
+
+    def add_images(self, images, concurrency=DEFAULT_CONCURRENCY, retries=2, retry_delay=1):
+        return self.resource_class.add_images(self.api_handler, images, concurrency=concurrency,
+                                              retries=retries, retry_delay=retry_delay)
+
+
 class CartResourceManager(ResourceManager):
 
     def mine(self):
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
 import logging, requests, json
+import cookielib
+import threading
 
 from icebergsdk.conf import Configuration
 from icebergsdk.exceptions import IcebergError, IcebergAPIError, IcebergServerError, IcebergClientError
 from icebergsdk.exceptions import IcebergClientUnauthorizedError, IcebergObjectNotFound
 
 from icebergsdk.json_utils import DateTimeAwareJSONEncoder
+from icebergsdk.utils.batch_utils import RateLimiter
 
 logger = logging.getLogger('icebergsdk.request')
 
@@ -20,25 +23,91 @@ class IcebergRequestBase(object):
             Configuration, ConfigurationSandbox or custom conf
         """
         self.conf = kwargs.get('conf', Configuration)
-        self.username = kwargs.get('username', None)
-        self.access_token = kwargs.get('access_token', None)
+        self._auth_lock = threading.Lock()
+        self._credentials = (kwargs.get('username', None), kwargs.get('access_token', None))
+
+        # token_store (see icebergsdk.token_store): reuse the valid tokens of previous processes in sso_user/auth_user
+        self.token_store = kwargs.get('token_store', None)
+        self.token_ttl = kwargs.get('token_ttl', 12 * 3600)  # Considered validity of the new tokens
+        self.token_refresh_margin = kwargs.get('token_refresh_margin', 10 * 60)  # Don't reuse the tokens expiring sooner
+        self.token_expires_at = None
+        self._token_store_key = None
         self.timeout = kwargs.get('timeout', None)
         self.lang = kwargs.get('lang', self.conf.ICEBERG_DEFAULT_LANG)
+        self.session = kwargs.get('session', None) or self.build_session(kwargs.get('pool_size', 10))
 
+        # rate_limit: max number of requests per second, shared by the threads using this handler
+        self.rate_limiter = kwargs.get('rate_limiter', None)
+        if self.rate_limiter is None and kwargs.get('rate_limit', None):
+            self.rate_limiter = RateLimiter(kwargs['rate_limit'])
+
+    @classmethod
+    def build_session(cls, pool_size=10):
+        """
+        Session keeping up to pool_size connections alive, to be shared between threads.
+        Cookies are not kept: the API is authenticated with the Authorization header.
+        """
+        session = requests.Session()
+        session.cookies.set_policy(cookielib.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    ####
+    #   Credentials
+    #   (username, access_token) are replaced together, so that the threads
+    #   sharing the handler never see the username of a user with the token of another one.
+    ####
+    def set_credentials(self, username, access_token, auth_response=None, expires_at=None):
+        with self._auth_lock:
+            self._credentials = (username, access_token)
+            self.token_expires_at = expires_at
+            if auth_response is not None:
+                self._auth_response = auth_response
+
+    def invalidate_token(self):
+        """
+        The token was refused: consider it expired and remove it from the token store
+        """
+        access_token = self.access_token
+        self.token_expires_at = 0
+        if self.token_store is not None and self._token_store_key is not None:
+            self.token_store.delete(self._token_store_key, access_token=access_token)
+
+    def _get_username(self):
+        return self._credentials[0]
+
+    def _set_username(self, username):
+        with self._auth_lock:
+            self._credentials = (username, self._credentials[1])
+
+    username = property(_get_username, _set_username)
+
+    def _get_access_token(self):
+        return self._credentials[1]
+
+    def _set_access_token(self, access_token):
+        with self._auth_lock:
+            self._credentials = (self._credentials[0], access_token)
+
+    access_token = property(_get_access_token, _set_access_token)
 
     def get_auth_token(self):
-        if self.username == "Anonymous":
-            return '%s %s:%s:%s' % (self.conf.ICEBERG_AUTH_HEADER, self.username, self.conf.ICEBERG_APPLICATION_NAMESPACE, self.access_token)
+        username, access_token = self._credentials
+        if username == "Anonymous":
+            return '%s %s:%s:%s' % (self.conf.ICEBERG_AUTH_HEADER, username, self.conf.ICEBERG_APPLICATION_NAMESPACE, access_token)
         else:
-            return '%s %s:%s' % (self.conf.ICEBERG_AUTH_HEADER, self.username, self.access_token)
+            return '%s %s:%s' % (self.conf.ICEBERG_AUTH_HEADER, username, access_token)
 
     def get_anonymous_session_id(self):
         """
         Used for anonymous convertion to user
         """
-        if self.username != "Anonymous":
+        username, access_token = self._credentials
+        if username != "Anonymous":
             raise IcebergError('User is not anonymous')
-        return self.access_token
+        return access_token
 
 
     def _safe_log(self, logger_function, message, *args):
@@ -72,16 +141,49 @@ class IcebergRequestBase(object):
         logger_function(message, *safe_args)
 
 
-    def request(self, path, args = None, post_args = None, files = None, method = None, headers = None):
+    def get_headers(self):
+        return {
+            'Content-Type': 'application/json',
+            'Accept-Language': self.lang,
+            'Authorization': self.get_auth_token()
+        }
+
+    def request(self, path, args = None, post_args = None, files = None, method = None, headers = None, data = None):
+        response = self.send_request(path, args=args, post_args=post_args, files=files, method=method, headers=headers, data=data)
+
+        if response.content:
+            return response.json()
+        else:
+            return "No Content"
+
+    def conditional_request(self, path, etag = None, args = None):
+        """
+        GET request sending If-None-Match: etag
+
+        Return (data, etag). data is None when the resource didn't change since etag.
+        """
+        headers = self.get_headers()
+        if etag:
+            headers['If-None-Match'] = etag
+
+        response = self.send_request(path, args=args, headers=headers)
+
+        if response.status_code == 304:
+            return None, etag
+        data = response.json() if response.content else "No Content"
+        return data, response.headers.get('ETag', None)
+
+    def send_request(self, path, args = None, post_args = None, files = None, method = None, headers = None, data = None):
+        """
+        Send the request and check the response status. Return the requests response.
+
+        data: raw body (string or file-like object read chunk by chunk), sent instead of post_args
+        """
         args = args or {}
         method = method or "GET"
 
         if headers is None:
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept-Language': self.lang,
-                'Authorization': self.get_auth_token()
-            }
+            headers = self.get_headers()
         # store = requests.get('http://api.local.iceberg-marketplace.com:8000/v1/merchant/', params = {'slug': store_slug}, headers = headers)
 
         if '//' not in path:
@@ -102,18 +204,23 @@ class IcebergRequestBase(object):
             url = url.replace('https://api.iceberg', 'http://api.sandbox.iceberg')
         # End Hack
 
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+
         self._safe_log(logger.debug, 'REQUEST %s - %s - %s - GET PARAMS: %s - POST PARAMS: %s', method, url, headers, args, post_args)
         try:
             if post_args:
                 post_args = json.dumps(post_args, cls=DateTimeAwareJSONEncoder, ensure_ascii=False)
-
-            response = requests.request(method,
-                                        url,
-                                        timeout=self.timeout,
-                                        params=args,
-                                        data=post_args,
-                                        files=files,
-                                        headers=headers)
+            if data is not None:
+                post_args = data
+
+            response = self.session.request(method,
+                                            url,
+                                            timeout=self.timeout,
+                                            params=args,
+                                            data=post_args,
+                                            files=files,
+                                            headers=headers)
         except requests.HTTPError as e:
             self._safe_log(logger.debug, 'RESPONSE %s - %s -  %s', method, url, e.read())
             response = json.loads(e.read())
@@ -129,6 +236,7 @@ class IcebergRequestBase(object):
             logger.exception('ERROR in response printing')
 
         if response.status_code == 401:
+            self.invalidate_token()
             raise IcebergClientUnauthorizedError()
             
         elif 400 <= response.status_code < 500:
@@ -139,9 +247,6 @@ class IcebergRequestBase(object):
 
         elif 500 <= response.status_code <= 600:
             raise IcebergServerError(response)
-        
-        if response.content:
-            return response.json()
-        else:
-            return "No Content"
+
+        return response
 
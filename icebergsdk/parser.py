@@ -57,12 +57,81 @@ class XMLParser(object):
 
 
     def etree_to_dict(self, t, avoid_xml_double_dict=True):
+        """
+        Convert an etree element to a dict, without recursion.
+
+        Same output as etree_to_dict_recursive, but deep feeds no longer hit
+        the recursion limit. The children values are grouped in the dict that
+        becomes the node value, so no temporary structure is built per node.
+        """
+        # Stack entries: [element, children iterator, grouped children values, repeated tags]
+        stack = [[t, iter(t), None, None]]
+        value = None
+        while stack:
+            entry = stack[-1]
+            for child in entry[1]:
+                stack.append([child, iter(child), None, None])
+                break
+            else:
+                stack.pop()
+                node, _, grouped, repeated = entry
+                attrib = node.attrib
+
+                if grouped is not None:
+                    value = grouped
+                    # like the recursive version, the flag only applies to the root children
+                    if avoid_xml_double_dict or stack:
+                        for k, v in value.iteritems():
+                            ## "images":{"image":[image_array]} >> "images":[image_array]
+                            if type(v) == dict and len(v) == 1 and (repeated is None or k not in repeated):
+                                for real_k in v:
+                                    if k[:-1] == real_k:
+                                        value[k] = v[real_k]
+                elif attrib:
+                    value = {}
+                else:
+                    value = None
+
+                if attrib:
+                    for k, v in attrib.iteritems():
+                        value['@' + k] = v
+
+                text = node.text
+                if text:
+                    text = text.strip()
+                    if grouped is not None or attrib:
+                        if text:
+                            value['#text'] = text
+                    else:
+                        value = text
+
+                if stack:
+                    parent = stack[-1]
+                    tag = node.tag
+                    if parent[2] is None:
+                        parent[2] = {tag: value}
+                    elif tag not in parent[2]:
+                        parent[2][tag] = value
+                    elif parent[3] is not None and tag in parent[3]:
+                        parent[2][tag].append(value)
+                    else:
+                        parent[2][tag] = [parent[2][tag], value]
+                        if parent[3] is None:
+                            parent[3] = set()
+                        parent[3].add(tag)
+
+        return {t.tag: value}
+
+    def etree_to_dict_recursive(self, t, avoid_xml_double_dict=True):
+        """
+        Previous recursive implementation, kept as a reference for etree_to_dict
+        """
         from collections import defaultdict
         d = {t.tag: {} if t.attrib else None}
         children = list(t)
         if children:
             dd = defaultdict(list)
-            for dc in map(self. etree_to_dict, children):
+            for dc in map(self.etree_to_dict_recursive, children):
                 for k, v in dc.iteritems():
                     dd[k].append(v)
 
@@ -87,9 +156,3 @@ class XMLParser(object):
             else:
                 d[t.tag] = text
         return d
-
-
-
-
-
-
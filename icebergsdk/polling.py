@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import threading
+import time
+
+from icebergsdk.utils.instrumentation import emit
+
+logger = logging.getLogger('icebergsdk.polling')
+
+
+class PollingStrategy(object):
+    """
+    Poll until a condition is met, with exponential backoff and a hard deadline.
+
+    The interval starts at initial_interval and is multiplied by backoff_factor after
+    each poll, up to max_interval, +/- jitter (ratio) to spread concurrent pollers.
+    The last sleep is shortened so that max_wait is never overshot.
+    max_polls optionally limits the number of polls.
+
+    Each poll() reports "polling" to the instrumentation hooks (name, polls, elapsed, met).
+    """
+    def __init__(self, initial_interval=1, max_interval=30, backoff_factor=2, jitter=0.1, max_wait=60, max_polls=None):
+        self.initial_interval = initial_interval
+        self.max_interval = max(max_interval, initial_interval)
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.max_wait = max_wait
+        self.max_polls = max_polls
+
+    def poll(self, check, is_met, is_terminal=None, name="poll"):
+        """
+        Call check() until is_met(value), is_terminal(value) (early exit), the deadline or max_polls.
+        Return (met, last value)
+        """
+        start = time.time()
+        deadline = start + self.max_wait
+        interval = self.initial_interval
+        polls = 0
+
+        while True:
+            value = check()
+            polls += 1
+            met = is_met(value)
+            if met or (is_terminal is not None and is_terminal(value)):
+                break
+
+            now = time.time()
+            if now >= deadline or (self.max_polls and polls >= self.max_polls):
+                break
+
+            delay = interval * (1 + random.uniform(-self.jitter, self.jitter))
+            logger.debug("%s: condition not met after %s polls, waiting %.2f seconds", name, polls, delay)
+            time.sleep(max(0, min(delay, deadline - now)))
+            interval = min(interval * self.backoff_factor, self.max_interval)
+
+        emit("polling", name=name, polls=polls, elapsed=time.time() - start, met=met)
+        return met, value
+
+
+class WatchFuture(object):
+    """
+    Pending result of a watch, resolved by a ResourceWatcher.
+
+    result() returns True when the condition was met, False when max_wait was reached.
+    """
+    def __init__(self, predicate, max_wait, obj=None, fetch=None):
+        self.obj = obj
+        self.fetch = fetch
+        self.predicate = predicate
+        self.started_at = time.time()
+        self.deadline = self.started_at + max_wait
+        self.value = None  # Last value checked (obj or the fetch result)
+        self.polls = 0
+
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise RuntimeError("Watch not resolved after %s seconds" % timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _resolve(self, result=None, exception=None):
+        with self._lock:
+            if self.done():
+                return
+            self._result = result
+            self._exception = exception
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        emit("polling", name="watcher", polls=self.polls, elapsed=time.time() - self.started_at, met=bool(result))
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception("Error in watch callback")
+
+
+class ResourceWatcher(object):
+    """
+    Wait for conditions on many objects with a few requests.
+
+    The watched objects are refreshed with one listing request per endpoint
+    (id__in filter, batch_size ids at a time) each round, instead of a
+    fetch() per object. The polling interval starts at initial_interval,
+    grows by backoff_factor (up to max_interval) while nothing changes and
+    goes back to initial_interval when a watch is resolved.
+
+    Usage:
+        watcher = ResourceWatcher(api_handler)
+        futures = [watcher.watch_value(offer, "status", "active") for offer in offers]
+        watcher.run_until_complete()  # or watcher.start() to poll from a background thread
+        results = [future.result() for future in futures]
+    """
+    def __init__(self, handler, initial_interval=1, max_interval=30, backoff_factor=2, batch_size=50):
+        self.handler = handler
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.batch_size = batch_size
+        self.interval = initial_interval
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def watch(self, obj, predicate, max_wait=60):
+        """
+        Resolve when predicate(obj) is true, obj being refreshed from the API
+        """
+        return self._add(WatchFuture(predicate, max_wait, obj=obj))
+
+    def watch_value(self, obj, value_name, expected_value, max_wait=60):
+        """
+        Resolve when obj.<value_name> equals expected_value
+        """
+        return self.watch(obj, lambda obj: getattr(obj, value_name, None) == expected_value, max_wait=max_wait)
+
+    def watch_callable(self, fetch, predicate, max_wait=60):
+        """
+        Resolve when predicate(fetch()) is true.
+        For conditions which can't be checked with a listing (channel storage, webhook triggers...)
+        """
+        return self._add(WatchFuture(predicate, max_wait, fetch=fetch))
+
+    def _add(self, future):
+        with self._lock:
+            self._pending.append(future)
+        self.interval = self.initial_interval
+        return future
+
+    @property
+    def pending(self):
+        with self._lock:
+            return list(self._pending)
+
+    def poll(self):
+        """
+        Refresh the watched values once and resolve the met conditions.
+        Return the number of resolved watches.
+        """
+        pending = self.pending
+        self._refresh_objects([future for future in pending if future.obj is not None])
+
+        resolved = 0
+        now = time.time()
+        for future in pending:
+            future.polls += 1
+            try:
+                if future.fetch is not None:
+                    future.value = future.fetch()
+                else:
+                    future.value = future.obj
+                if future.predicate(future.value):
+                    future._resolve(True)
+                elif now >= future.deadline:
+                    logger.warn(u"Waited until deadline, condition still not met for %r", future.value)
+                    future._resolve(False)
+            except Exception as err:
+                future._resolve(exception=err)
+
+            if future.done():
+                resolved += 1
+
+        with self._lock:
+            self._pending = [future for future in self._pending if not future.done()]
+
+        if resolved:
+            self.interval = self.initial_interval
+        else:
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+
+        return resolved
+
+    def _refresh_objects(self, futures):
+        by_endpoint = {}
+        for future in futures:
+            obj = future.obj
+            by_endpoint.setdefault(obj.endpoint, {}).setdefault(str(obj.id), {})[id(obj)] = obj
+
+        for endpoint, objects_by_id in by_endpoint.iteritems():
+            object_ids = objects_by_id.keys()
+            for i in xrange(0, len(object_ids), self.batch_size):
+                chunk = object_ids[i:i + self.batch_size]
+                try:
+                    data = self.handler.request("%s/" % endpoint, args={
+                        'id__in': ",".join(chunk),
+                        'limit': len(chunk),
+                    })
+                except Exception:
+                    logger.exception("Cant refresh watched %s objects, will retry", endpoint)
+                    continue
+
+                for element in data['objects']:
+                    for obj in objects_by_id.get(str(element.get('id')), {}).itervalues():
+                        obj._load_attributes_from_response(**element)
+
+    def _sleep_time(self):
+        """
+        Current interval, without going past the next deadline
+        """
+        pending = self.pending
+        if not pending:
+            return self.interval
+        next_deadline = min(future.deadline for future in pending)
+        return max(0, min(self.interval, next_deadline - time.time()))
+
+    def run_until_complete(self, futures=None):
+        """
+        Poll from the current thread until the given futures (default: all the watches) are resolved
+        """
+        futures = futures if futures is not None else self.pending
+        while True:
+            self.poll()
+            if all(future.done() for future in futures):
+                return futures
+            time.sleep(self._sleep_time())
+
+    def start(self):
+        """
+        Poll from a background thread, until stop()
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="icebergsdk-watcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self.pending:
+                try:
+                    self.poll()
+                except Exception:
+                    logger.exception("Error in watcher polling")
+                self._stop_event.wait(self._sleep_time())
+            else:
+                self._stop_event.wait(self.initial_interval)
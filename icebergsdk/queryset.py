@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+from icebergsdk.exceptions import IcebergMultipleObjectsReturned, IcebergObjectNotFound
+
+
+class QuerySet(object):
+    """
+    Lazy listing of a resource, built by chaining filters:
+
+        offers = api_handler.ProductOffer.filter(status="active").order_by("-price")[100:200]
+        offers.count()  # One request reading meta.total_count
+        for offer in offers:  # Pages requested while iterating, then kept
+            ...
+
+    Slices are mapped onto offset/limit. The objects are kept once fetched,
+    so iterating again or indexing doesn't send new requests.
+    """
+    def __init__(self, resource_class, handler, args=None, start=0, stop=None, page_size=100):
+        self.resource_class = resource_class
+        self.handler = handler
+        self.args = args or {}
+        self.start = start
+        self.stop = stop
+        self.page_size = page_size
+
+        self._result_cache = []
+        self._exhausted = False
+        self._count = None
+
+    def _clone(self, **changes):
+        kwargs = {
+            'args': dict(self.args),
+            'start': self.start,
+            'stop': self.stop,
+            'page_size': self.page_size,
+        }
+        kwargs.update(changes)
+        return self.__class__(self.resource_class, self.handler, **kwargs)
+
+    ####
+    #   Chaining
+    ####
+    def all(self):
+        return self._clone()
+
+    def filter(self, **filters):
+        """
+        API filters, ex: filter(status="active", price__lte=100)
+        """
+        args = dict(self.args)
+        args.update(filters)
+        return self._clone(args=args)
+
+    def order_by(self, *fields):
+        """
+        order_by("-price"), order_by("merchant", "price")
+        """
+        args = dict(self.args)
+        if fields:
+            args['order_by'] = fields[0] if len(fields) == 1 else list(fields)
+        else:
+            args.pop('order_by', None)
+        return self._clone(args=args)
+
+    ####
+    #   Requests
+    ####
+    def _request(self, offset, limit):
+        args = dict(self.args, offset=offset, limit=limit)
+        return self.handler.request("%s/" % self.resource_class.endpoint, args=args)
+
+    def _fetch_next_page(self):
+        offset = self.start + len(self._result_cache)
+        limit = self.page_size
+        if self.stop is not None:
+            limit = min(limit, self.stop - offset)
+        if limit <= 0:
+            self._exhausted = True
+            return
+
+        data = self._request(offset, limit)
+        objects = [self.resource_class.findOrCreate(self.handler, element) for element in data['objects']]
+        self._result_cache.extend(objects)
+        total_count = data.get('meta', {}).get('total_count')
+        if total_count is not None and self._count is None:
+            self._count = self._sliced_count(total_count)
+        if not objects or not data.get('meta', {}).get('next', True):  # The API may return less objects than limit
+            self._exhausted = True
+
+    def _fetch_all(self):
+        while not self._exhausted:
+            self._fetch_next_page()
+
+    def _sliced_count(self, total_count):
+        stop = total_count if self.stop is None else min(self.stop, total_count)
+        return max(0, stop - self.start)
+
+    ####
+    #   Evaluation
+    ####
+    def count(self):
+        """
+        Number of objects, from meta.total_count of a limit=1 request
+        (limit=0 means no limit for the API) when the objects aren't fetched yet.
+        """
+        if self._exhausted:
+            return len(self._result_cache)
+        if self._count is None:
+            data = self._request(0, 1)
+            self._count = self._sliced_count(data['meta']['total_count'])
+        return self._count
+
+    def __iter__(self):
+        index = 0
+        while True:
+            if index < len(self._result_cache):
+                yield self._result_cache[index]
+                index += 1
+            elif self._exhausted:
+                return
+            else:
+                self._fetch_next_page()
+
+    def __len__(self):
+        self._fetch_all()
+        return len(self._result_cache)
+
+    def __nonzero__(self):
+        if not self._result_cache and not self._exhausted:
+            self._fetch_next_page()
+        return bool(self._result_cache)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step is not None:
+                raise ValueError("Slices with a step are not supported")
+            if (key.start is not None and key.start < 0) or (key.stop is not None and key.stop < 0):
+                raise ValueError("Negative indexing is not supported")
+
+            start = self.start + (key.start or 0)
+            stop = self.start + key.stop if key.stop is not None else self.stop
+            if self.stop is not None and stop is not None:
+                stop = min(stop, self.stop)
+
+            queryset = self._clone(start=start, stop=stop)
+            if self._exhausted:
+                queryset._result_cache = self._result_cache[key]
+                queryset._exhausted = True
+            return queryset
+
+        if key < 0:
+            raise ValueError("Negative indexing is not supported")
+        if key < len(self._result_cache):
+            return self._result_cache[key]
+        if self._exhausted or (self.stop is not None and self.start + key >= self.stop):
+            raise IndexError(key)
+
+        data = self._request(self.start + key, 1)
+        if not data['objects']:
+            raise IndexError(key)
+        return self.resource_class.findOrCreate(self.handler, data['objects'][0])
+
+    def first(self):
+        try:
+            return self[0]
+        except IndexError:
+            return None
+
+    def get(self, **filters):
+        """
+        The only object matching the filters
+        """
+        results = list(self.filter(**filters)[:2])
+        if len(results) > 1:
+            raise IcebergMultipleObjectsReturned()
+        elif len(results) == 0:
+            raise IcebergObjectNotFound()
+        return results[0]
+
+    def __repr__(self):
+        return "<QuerySet %s %s [%s:%s]>" % (self.resource_class.__name__, self.args, self.start, self.stop or "")
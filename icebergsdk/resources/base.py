@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
-import warnings, sys, json, logging, time
-import weakref  # Means that if there is no other value, it will be removed
+import warnings, sys, json, logging
 import pytz
 from datetime import datetime, date
 from dateutil import parser as date_parser
@@ -8,7 +7,9 @@ from decimal import Decimal
 logger = logging.getLogger('icebergsdk.resource')
 
 from icebergsdk.exceptions import IcebergNoHandlerError, IcebergReadOnlyError,\
-    IcebergMultipleObjectsReturned, IcebergObjectNotFound
+    IcebergMultipleObjectsReturned, IcebergObjectNotFound, IcebergClientError, IcebergTransitionError
+from icebergsdk.polling import PollingStrategy
+from icebergsdk.utils.batch_utils import BatchReport, DEFAULT_CONCURRENCY, run_in_pool
 
 
 """
@@ -316,16 +317,7 @@ class IcebergObject(dict):
             else:
                 key = str(data['id'])
 
-            if not data_type in handler._objects_store: # New type collectore
-                handler._objects_store[data_type] = weakref.WeakValueDictionary()
-                obj = obj_cls(handler=handler)
-                handler._objects_store[data_type][key] = obj
-            else:
-                if key in handler._objects_store[data_type]:
-                    obj = handler._objects_store[data_type][key]
-                else:
-                    obj = obj_cls(handler=handler)
-                    handler._objects_store[data_type][key] = obj
+            obj = handler._objects_store.get_or_create(data_type, key, lambda: obj_cls(handler=handler))
 
 
         return obj._load_attributes_from_response(**data)
@@ -380,14 +372,22 @@ class IcebergObject(dict):
         raise NotImplementedError()
 
 
-    def fetch(self, return_meta=False):
+    def fetch(self, return_meta=False, conditional=False):
         """
         Resets the model's state from the server
+
+        conditional: send the ETag of the previous conditional fetch, the object
+        is left as is when the server answers it didn't change.
         """
         if not self._handler:
             raise IcebergNoHandlerError()
 
-        data = self._handler.request(self.resource_uri)
+        if conditional:
+            data, self._etag = self._handler.conditional_request(self.resource_uri, getattr(self, '_etag', None))
+            if data is None: # Not modified
+                return (self, {}) if return_meta else self
+        else:
+            data = self._handler.request(self.resource_uri)
         meta = data.pop('meta', {})
 
         self._load_attributes_from_response(**data)
@@ -406,31 +406,40 @@ class IcebergObject(dict):
         raise IcebergReadOnlyError()
 
 
-    def wait_for_value(self, value_name, expected_value, max_wait=60, retry_every=5):
+    def wait_for_value(self, value_name, expected_value, max_wait=60, retry_every=5, terminal_values=None, conditional=False):
         """ 
         Returns True if 'value_name' equals 'expected_value' before 'max_wait' seconds else False
+
+        The object is fetched every 'retry_every' seconds at first, then less and less often.
+        terminal_values: stop waiting if 'value_name' takes one of these values
+        conditional: use conditional fetches (see fetch)
         """
-        self.fetch()
-        timeout = time.time() + max_wait
-        while time.time() < timeout  and not getattr(self, value_name) == expected_value:
-            logger.debug("Waiting %s seconds for value '%s' to change to '%s'" %
-                (retry_every, value_name, expected_value)
-            )
-            time.sleep(retry_every)
-            self.fetch()
+        met, obj = PollingStrategy(initial_interval=retry_every, max_wait=max_wait).poll(
+            lambda: self.fetch(conditional=conditional),
+            lambda obj: getattr(obj, value_name) == expected_value,
+            is_terminal=(lambda obj: getattr(obj, value_name) in terminal_values) if terminal_values else None,
+            name="wait_for_value"
+        )
 
-        if getattr(self, value_name) == expected_value:
-            return True
-        else:
+        if not met:
             logger.warn(
                 u"Waited %s seconds, value '%s' is still '%s' (!=%s)" % 
                 (max_wait, value_name, getattr(self, value_name), expected_value)
             )
-            return False
+        return met
+
+
+NATIVE_TYPES = (int, long, float, bool, type(None))
 
 
 def dict_force_text(anything):
-    if isinstance(anything, str): ## ex: anything = 'étoile' in a coding: utf-8 file
+    anything_type = type(anything)
+    if anything_type in NATIVE_TYPES: ## fast path, nothing to encode
+        return anything
+    elif anything_type == str: ## ex: anything = 'étoile' in a coding: utf-8 file
+        anything.decode("utf-8") ## only check it is valid utf-8, no need to encode it again
+        return anything
+    elif isinstance(anything, str):
         return anything.decode("utf-8").encode("utf-8")
     elif isinstance(anything, unicode): ## ex: anything = u'étoile'
         return anything.encode("utf-8")
@@ -446,36 +455,134 @@ def dict_force_text(anything):
     else: 
         return anything
 
+
+MUTABLE_TYPES = (list, dict)
+
+
+def comparable_value(value):
+    """
+    Copy of an attribute value, as compared to detect changes.
+    Related objects are compared by resource_uri, lists and dicts are copied
+    so that in place modifications are detected.
+    """
+    value_type = type(value)
+    if value_type in NATIVE_TYPES or value_type in (str, unicode):
+        return value
+    elif isinstance(value, IcebergObject):
+        return getattr(value, 'resource_uri', None) or id(value)
+    elif value_type == list:
+        return [comparable_value(elem) for elem in value]
+    elif value_type == dict:
+        return dict((key, comparable_value(elem)) for key, elem in value.iteritems())
+    else:
+        return value
+
+
 class UpdateableIcebergObject(IcebergObject):
+    transitions = () # Names of the state transition methods, usable with transition_many
+
+    def _get_original_values(self):
+        """
+        Values as last loaded from (or saved to) the API, by attribute name.
+
+        Only the lists and dicts are copied when loaded, to detect their in place
+        modifications. The other values are kept when first assigned.
+        """
+        if '_original_values' not in self.__dict__:
+            self._original_values = {}
+        return self._original_values
+
+    def _get_loaded_fields(self):
+        """
+        Names of the attributes loaded from (or saved to) the API
+        """
+        if '_loaded_fields' not in self.__dict__:
+            self._loaded_fields = set()
+        return self._loaded_fields
+
+    def _set_loaded(self, key):
+        value = self.__dict__[key]
+        if type(value) in MUTABLE_TYPES:
+            self._get_original_values()[key] = comparable_value(value)
+        else:
+            self._get_original_values().pop(key, None)
+        self._get_loaded_fields().add(key)
+
+    def __setattr__(self, k, v):
+        if k[0] != '_' and k in self._get_loaded_fields():
+            original_values = self._get_original_values()
+            if k not in original_values:
+                original_values[k] = comparable_value(self.__dict__.get(k))
+        super(UpdateableIcebergObject, self).__setattr__(k, v)
+
+    def _load_attributes_from_response(self, **response):
+        super(UpdateableIcebergObject, self)._load_attributes_from_response(**response)
+
+        for key in response:
+            if key in self.__dict__:
+                self._set_loaded(key)
+
+        return self
+
+    def changed_fields(self):
+        """
+        Return the names of the attributes whose value differs from the one loaded from the API
+        (assigned or modified in place)
+        """
+        original_values = self._get_original_values()
+        loaded_fields = self._get_loaded_fields()
+        changed = []
+        for k in set(self._unsaved_values).union(original_values):
+            if k == 'id' or k == '_previous_metadata':
+                continue
+            try:
+                v = getattr(self, k)
+            except AttributeError:
+                continue
+
+            if k in loaded_fields and k not in original_values:
+                continue  # Still the loaded value
+            if k in original_values:
+                try:
+                    if comparable_value(v) == original_values[k]:
+                        continue
+                except TypeError: ## ex: naive and aware datetimes
+                    pass
+            changed.append(k)
+        return changed
+
+    def has_changed(self):
+        return len(self.changed_fields()) > 0
 
     def serialize(self, obj):
         params = {}
-        if obj._unsaved_values:
-            for k in obj._unsaved_values:
-                if k == 'id' or k == '_previous_metadata':
-                    continue
-                v = getattr(obj, k)
-
-                if isinstance(v, IcebergObject):
-                    params[k] = v.get_resource_uri()
-                elif type(v) == list:
-
-                    res = []
-                    for elem in v:
-                        if isinstance(elem, IcebergObject):
-                            res.append(elem.get_resource_uri())
-                        else:
-                            res.append(elem)
-                    params[k] = res
-                else:
-                    params[k] = v # if v is not None else ""
-        
-        params = dict_force_text(params)
-        
+        for k in obj.changed_fields():
+            v = getattr(obj, k)
+
+            if isinstance(v, IcebergObject):
+                params[k] = v.get_resource_uri()
+            elif type(v) == list:
+
+                res = []
+                for elem in v:
+                    if isinstance(elem, IcebergObject):
+                        res.append(elem.get_resource_uri())
+                    else:
+                        res.append(dict_force_text(elem))
+                params[k] = res
+            else:
+                params[k] = dict_force_text(v) # if v is not None else ""
+
         return params
 
 
-    def save(self, handler = None):
+    def save(self, handler = None, return_data = True):
+        """
+        Create or update the object.
+
+        return_data: ask the API to return the saved object, which is then reloaded.
+        Always done on creation, to get the id of the new object.
+        """
         if not handler:
             if not self._handler:
                 raise IcebergNoHandlerError()
@@ -485,15 +592,23 @@ class UpdateableIcebergObject(IcebergObject):
         if self.is_new():
             method = "POST"
             path = "%s/" % self.endpoint
+            return_data = True
         else:
             method = "PUT"
             path = self.resource_uri
-        if "?" in path:
-            path += "&return_data=1"
-        else:
-            path += "?return_data=1"
-        res = handler.request(path, post_args = self.serialize(self), method = method)
-        self._load_attributes_from_response(**res)
+        if return_data:
+            if "?" in path:
+                path += "&return_data=1"
+            else:
+                path += "?return_data=1"
+        post_args = self.serialize(self)
+        res = handler.request(path, post_args = post_args, method = method)
+
+        for k in post_args:
+            if k in self.__dict__:
+                self._set_loaded(k)
+        if type(res) == dict:
+            self._load_attributes_from_response(**res)
 
         # Clean
         self._unsaved_values = set()
@@ -501,6 +616,34 @@ class UpdateableIcebergObject(IcebergObject):
         return self
 
 
+    @classmethod
+    def save_many(cls, handler, objects, concurrency = DEFAULT_CONCURRENCY, return_data = True):
+        """
+        Save objects concurrently. Unchanged objects are skipped.
+
+        Errors don't stop the batch, they are collected in the returned BatchReport.
+        return_data=False makes lighter responses for the updates.
+        """
+        if not handler:
+            raise IcebergNoHandlerError()
+
+        report = BatchReport()
+        to_save = []
+        for obj in objects:
+            if obj.is_new() or obj.has_changed():
+                to_save.append(obj)
+            else:
+                report.skipped.append(obj)
+
+        def save_object(obj):
+            return obj.save(handler = handler, return_data = return_data)
+
+        for obj, result, error in run_in_pool(save_object, to_save, concurrency = concurrency):
+            report.add_outcome(obj, result, error)
+
+        return report
+
+
     def delete(self, handler = None):
         if not handler:
             if not self._handler:
@@ -509,6 +652,106 @@ class UpdateableIcebergObject(IcebergObject):
             handler = self._handler
                 
         handler.request(self.resource_uri, post_args = {}, method = "DELETE")
+        self.remove_from_objects_store(handler, self.endpoint, self.id)
         # Clean
         self.__dict__ = {}
         self._unsaved_values = set()
+
+
+    @classmethod
+    def remove_from_objects_store(cls, handler, data_type, object_id):
+        """
+        Forget a deleted object in the handler relationship store
+        """
+        handler._objects_store.remove(data_type, str(object_id))
+
+
+    @classmethod
+    def delete_many(cls, handler, objects_or_ids, concurrency = DEFAULT_CONCURRENCY, bulk = False, bulk_size = 100):
+        """
+        Delete objects concurrently. Ids are taken as ids of cls objects.
+
+        bulk: delete with PATCH requests on the list endpoints ("deleted_objects"),
+        bulk_size objects at a time, for the resources allowing it.
+
+        Errors don't stop the batch. Return a BatchReport, with the deleted objects/ids in succeeded.
+        """
+        if not handler:
+            raise IcebergNoHandlerError()
+
+        report = BatchReport()
+
+        if bulk:
+            by_endpoint = {}
+            for elem in objects_or_ids:
+                if isinstance(elem, IcebergObject):
+                    endpoint, object_id = elem.endpoint, elem.id
+                else:
+                    endpoint, object_id = cls.endpoint, elem
+                by_endpoint.setdefault(endpoint, []).append((elem, object_id))
+
+            chunks = []
+            for endpoint, elems in by_endpoint.iteritems():
+                for i in xrange(0, len(elems), bulk_size):
+                    chunks.append((endpoint, elems[i:i + bulk_size]))
+
+            def delete_chunk(chunk):
+                endpoint, elems = chunk
+                handler.request("%s/" % endpoint, method = "PATCH", post_args = {
+                    "objects": [],
+                    "deleted_objects": ["/v1/%s/%s/" % (endpoint, object_id) for elem, object_id in elems]
+                })
+                for elem, object_id in elems:
+                    cls.remove_from_objects_store(handler, endpoint, object_id)
+                    if isinstance(elem, IcebergObject):
+                        elem.__dict__ = {}
+                        elem._unsaved_values = set()
+
+            for chunk, result, error in run_in_pool(delete_chunk, chunks, concurrency = concurrency):
+                for elem, object_id in chunk[1]:
+                    report.add_outcome(elem, elem, error)
+            return report
+
+        def delete_one(elem):
+            if isinstance(elem, IcebergObject):
+                elem.delete(handler = handler)
+            else:
+                handler.request("/v1/%s/%s/" % (cls.endpoint, elem), post_args = {}, method = "DELETE")
+                cls.remove_from_objects_store(handler, cls.endpoint, elem)
+            return elem
+
+        for elem, result, error in run_in_pool(delete_one, objects_or_ids, concurrency = concurrency):
+            report.add_outcome(elem, result, error)
+
+        return report
+
+
+    @classmethod
+    def transition_many(cls, handler, objects, action, concurrency = DEFAULT_CONCURRENCY):
+        """
+        Apply a state transition (ex: "confirm") to objects concurrently.
+        Each object is reloaded from the action response.
+
+        Errors don't stop the batch. Return a BatchReport, refused transitions
+        are reported as IcebergTransitionError.
+        """
+        if not handler:
+            raise IcebergNoHandlerError()
+        if not cls.transitions:
+            raise ValueError("%s has no state transitions" % cls.__name__)
+        if action not in cls.transitions:
+            raise ValueError("Unknown transition '%s' for %s, should be one of %s" % (action, cls.__name__, cls.transitions))
+
+        def apply_transition(obj):
+            try:
+                return getattr(obj, action)()
+            except IcebergClientError as err:
+                transition_error = IcebergTransitionError(u"%s %s: %s" % (action, obj.resource_uri, err))
+                transition_error.original_error = err
+                raise transition_error
+
+        report = BatchReport()
+        for obj, result, error in run_in_pool(apply_transition, objects, concurrency = concurrency):
+            report.add_outcome(obj, result, error)
+
+        return report
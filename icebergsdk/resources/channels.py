@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
-import time
 from icebergsdk.resources.base import UpdateableIcebergObject, IcebergObject, IcebergObjectNotFound, IcebergMultipleObjectsReturned
-import pytz
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from icebergsdk.polling import PollingStrategy
+from icebergsdk.utils.algolia_utils import algolia_index_cache
+from icebergsdk.utils.batch_utils import DEFAULT_CONCURRENCY, run_in_pool
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
 import logging
 logger = logging.getLogger('icebergsdk.resource')
 
+ALGOLIA_GET_OBJECTS_MAX = 1000 # Max number of objects by Algolia get_objects request
+
 class ProductChannelLogEvent(IcebergObject):
     endpoint = 'product_channel_log_event'
 
@@ -51,6 +54,73 @@ class ProductChannel(UpdateableIcebergObject):
             products.append(UpdateableIcebergObject.findOrCreate(self._handler, element))
         return products
 
+    def iter_products(self, page_size=100, parallel=1, raw_result=False, offset=0, checkpoint=None):
+        """
+        Iterate over all the products of the channel storage.
+
+        The next pages are fetched while the current one is consumed, `parallel` at a time.
+        Each page starts where the previous one ended (the API may return less
+        products than page_size), the iteration ends on an empty page or a page without meta.next.
+        checkpoint (ex: FileCheckpoint): the offset is saved after each page and the
+        iteration starts from the saved offset, to resume an interrupted export.
+        A finished iteration is marked done and isn't run again until the checkpoint is cleared.
+        """
+        if checkpoint is not None:
+            state = checkpoint.load()
+            if state.get('done'):
+                return
+            offset = state.get('offset', offset)
+
+        def get_page(page_offset):
+            return self.request("%s%s/" % (self.resource_uri, 'viewer'), method = "get", args={
+                'offset': page_offset,
+                'limit': page_size,
+            })
+
+        pool = ThreadPool(parallel)
+        try:
+            in_flight = deque()
+            step = page_size  # Expected number of products by page, to fetch the next pages in advance
+            fetch_offset = offset
+
+            while True:
+                while len(in_flight) < parallel:
+                    in_flight.append((fetch_offset, pool.apply_async(get_page, (fetch_offset,))))
+                    fetch_offset += step
+
+                page_offset, page_result = in_flight.popleft()
+                if page_offset != offset:  # Fetched in advance with a wrong page size
+                    in_flight.clear()
+                    fetch_offset = offset
+                    continue
+
+                result = page_result.get()
+                if isinstance(result, dict):
+                    page = result.get('objects', [])
+                    last_page = not page or result.get('meta', {}).get('next') is None
+                else:
+                    page = result
+                    last_page = not page
+                offset += len(page)
+                if page and len(page) != step:
+                    step = len(page)
+                    in_flight.clear()
+                    fetch_offset = offset
+
+                for element in page:
+                    if raw_result:
+                        yield element
+                    else:
+                        yield UpdateableIcebergObject.findOrCreate(self._handler, element)
+
+                if checkpoint is not None:
+                    checkpoint.save({'offset': offset, 'done': last_page})
+                if last_page:
+                    break
+        finally:
+            pool.terminate()
+            pool.join()
+
     def get_product(self, product_id, raw_result=False):
         """
         Get product from channel storage
@@ -66,55 +136,38 @@ class ProductChannel(UpdateableIcebergObject):
         else:
             return UpdateableIcebergObject.findOrCreate(self._handler, result[0])
 
-    def storage_wait_for_value(self, product_id, value_name, expected_value, max_wait=60, retry_every=5):
+    def storage_wait_for_value(self, product_id, value_name, expected_value, max_wait=60, retry_every=5, terminal_values=None):
         """ 
         Returns True if 'value_name' equals 'expected_value' before 'max_wait' seconds else False
+        (see PollingStrategy for the polling frequency)
         """
         def get_value_from_path(data, path_to_value):
             for path_step in path_to_value.split("."):
                 data = data.get(path_step,{})
             return data
 
-        data = self.get_product(product_id, raw_result=True)
-        timeout = time.time() + max_wait
-        actual_value = get_value_from_path(data, value_name)
-        while time.time() < timeout  and not actual_value == expected_value:
-            logger.debug("Waiting %s seconds for value '%s' to change to '%s'" %
-                (retry_every, value_name, expected_value)
-            )
-            time.sleep(retry_every)
-            data = self.get_product(product_id, raw_result=True)
-            actual_value = get_value_from_path(data, value_name)
+        met, actual_value = PollingStrategy(initial_interval=retry_every, max_wait=max_wait).poll(
+            lambda: get_value_from_path(self.get_product(product_id, raw_result=True), value_name),
+            lambda actual_value: actual_value == expected_value,
+            is_terminal=(lambda actual_value: actual_value in terminal_values) if terminal_values else None,
+            name="storage_wait_for_value"
+        )
 
-        if actual_value == expected_value:
-            return True
-        else:
+        if not met:
             logger.warn(
                 u"Waited %s seconds, value '%s' is still '%s' (!=%s)" % 
                 (max_wait, value_name, actual_value, expected_value)
             )
-            return False
+        return met
+
+    _algolia_index_cache = algolia_index_cache
 
     @property
     def algolia_index(self):
-        to_refetch = self.algolia_api_key_expiration_date < datetime.now(pytz.utc)+relativedelta(minutes=20)
-        if to_refetch:
-            self.fetch()
-        if not hasattr(self, "_algolia_index") or to_refetch:
-            try:
-                from algoliasearch import algoliasearch
-            except ImportError:
-                raise Exception("Please install algoliasearch requirement")
-            
-            ## now returned by api
-            # algolia_application_id = os.getenv('ALGOLIA_APPLICATION_ID', None)
-            # if not algolia_application_id:
-            #     raise Exception("Please define ALGOLIA_APPLICATION_ID environment variable")
-
-            client = algoliasearch.Client(self.algolia_application_id, self.algolia_api_key)
-            self._algolia_index = client.initIndex(self.algolia_index_name)
-
-        return self._algolia_index
+        """
+        Algolia index of the channel, shared by the process (see AlgoliaIndexCache)
+        """
+        return self._algolia_index_cache.get_index(self)
 
 
     def algolia_search(self, query, search_options=None):
@@ -129,10 +182,78 @@ class ProductChannel(UpdateableIcebergObject):
             products.append(Product.findOrCreate(self._handler, element))
         return products, result
 
+    def algolia_browse(self, query="", filters=None, raw_result=False, hits_per_page=1000, browse_options=None):
+        """
+        Iterate over all the hits matching query and filters (Algolia filters syntax).
+
+        Uses the Algolia browse cursor, so there is no deep pagination limit, and only
+        one page of hits is kept in memory. Hits are hydrated as they are consumed.
+        """
+        from icebergsdk.resources import Product
+        params = dict(browse_options or {})
+        params['query'] = query
+        params['hitsPerPage'] = hits_per_page
+        if filters:
+            params['filters'] = filters
+
+        cursor = None
+        while True:
+            result = self.algolia_index.browse_from(params, cursor)
+            for element in result.get('hits', []):
+                if raw_result:
+                    yield element
+                else:
+                    yield Product.findOrCreate(self._handler, element)
+
+            cursor = result.get('cursor', None)
+            if not cursor:
+                break
+
     def algolia_fetch(self, product):
         data = self.algolia_index.get_object(product.id)
         return product._load_attributes_from_response(**data)
 
+    def _algolia_get_objects(self, product_ids, chunk_size, concurrency):
+        """
+        Algolia multiple objects retrieval, by chunks of chunk_size ids fetched concurrently.
+        Return the objects data in the product_ids order, None for the missing ones.
+        """
+        index = self.algolia_index
+        chunks = [product_ids[i:i + chunk_size] for i in xrange(0, len(product_ids), chunk_size)]
+
+        results = []
+        for chunk, result, error in run_in_pool(lambda chunk: index.get_objects(chunk)['results'], chunks, concurrency=concurrency):
+            if error is not None:
+                raise error
+            results.extend(result)
+        return results
+
+    def algolia_fetch_many(self, products, chunk_size=ALGOLIA_GET_OBJECTS_MAX, concurrency=DEFAULT_CONCURRENCY):
+        """
+        algolia_fetch for many products, with a few requests
+        """
+        results = self._algolia_get_objects([product.id for product in products], chunk_size, concurrency)
+        for product, data in zip(products, results):
+            if data is not None:
+                product._load_attributes_from_response(**data)
+        return products
+
+    def algolia_find_many(self, product_ids, raw_result=False, chunk_size=ALGOLIA_GET_OBJECTS_MAX, concurrency=DEFAULT_CONCURRENCY):
+        """
+        algolia_find for many products, with a few requests.
+        Products not found in the index are skipped.
+        """
+        from icebergsdk.resources import Product
+        res = []
+        for data in self._algolia_get_objects(list(product_ids), chunk_size, concurrency):
+            if data is None:
+                continue
+            if raw_result:
+                res.append(data)
+            else:
+                res.append(Product.findOrCreate(self._handler, data))
+        return res
+
     def algolia_find(self, product_id, raw_result=False):
         from icebergsdk.resources import Product
         data = self.algolia_index.get_object(product_id)
@@ -142,9 +263,10 @@ class ProductChannel(UpdateableIcebergObject):
             return Product.findOrCreate(self._handler, data)
 
 
-    def algolia_wait_for_value(self, product_id, value_name, expected_value, max_wait=60, retry_every=5, process_functions=None):
+    def algolia_wait_for_value(self, product_id, value_name, expected_value, max_wait=60, retry_every=5, process_functions=None, terminal_values=None):
         """ 
         Returns True if 'value_name' equals 'expected_value' before 'max_wait' seconds else False
+        (see PollingStrategy for the polling frequency)
         """
         def get_value_from_path(data, path_to_value, process_functions=None):
             for path_step in path_to_value.split("."):
@@ -155,27 +277,16 @@ class ProductChannel(UpdateableIcebergObject):
 
             return data
 
-        data = self.algolia_find(product_id, raw_result=True)
-        timeout = time.time() + max_wait
-        actual_value = get_value_from_path(data, value_name, process_functions)
-        logger.debug("First value for '%s'= %s" % (value_name, actual_value))
-        while time.time() < timeout  and not actual_value == expected_value:
-            logger.debug("Waiting %s seconds for value '%s' to change to '%s'" %
-                (retry_every, value_name, expected_value)
-            )
-            time.sleep(retry_every)
-            data = self.algolia_find(product_id, raw_result=True)
-            actual_value = get_value_from_path(data, value_name, process_functions)
+        met, actual_value = PollingStrategy(initial_interval=retry_every, max_wait=max_wait).poll(
+            lambda: get_value_from_path(self.algolia_find(product_id, raw_result=True), value_name, process_functions),
+            lambda actual_value: actual_value == expected_value,
+            is_terminal=(lambda actual_value: actual_value in terminal_values) if terminal_values else None,
+            name="algolia_wait_for_value"
+        )
 
-        if actual_value == expected_value:
-            return True
-        else:
+        if not met:
             logger.warn(
                 u"Waited %s seconds, value '%s' is still '%s' (!=%s)" % 
                 (max_wait, value_name, actual_value, expected_value)
             )
-            return False
-
-
-
-
+        return met
@@ -5,6 +5,7 @@ from icebergsdk.resources.base import UpdateableIcebergObject
 
 class OrderItem(UpdateableIcebergObject):
     endpoint = 'order_item'
+    transitions = ('cancel', 'confirm', 'send')
 
     def cancel(self):
         data = self.request("%s%s/" % (self.resource_uri, 'cancel'), method="post")
@@ -21,6 +22,7 @@ class OrderItem(UpdateableIcebergObject):
 
 class MerchantOrder(UpdateableIcebergObject):
     endpoint = 'merchant_order'
+    transitions = ('cancel', 'confirm', 'send')
 
     def cancel(self):
         data = self.request("%s%s/" % (self.resource_uri, 'cancel'), method="post")
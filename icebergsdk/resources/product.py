@@ -1,7 +1,19 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import logging
 import os
+import time
+
+import requests
+
+from icebergsdk.exceptions import IcebergNoHandlerError
 from icebergsdk.resources.base import UpdateableIcebergObject, IcebergObject
+from icebergsdk.utils.batch_utils import BatchReport, DEFAULT_CONCURRENCY, run_in_pool
+from icebergsdk.utils.image_server_utils import build_resized_image_url, build_resized_image_urls,\
+    check_process_mode, clean_image_url
+
+logger = logging.getLogger('icebergsdk.resource')
 
 """
 Todo: Add addToCart method to ProductOffer and ProductVariation
@@ -27,32 +39,182 @@ class ProductOffer(UpdateableIcebergObject):
         data = self.request("%s%s/" % (self.resource_uri, 'deactivate'), method="post")
         return self._load_attributes_from_response(**data)
 
-    def add_image(self, image_path):
+    def add_image(self, image_path=None, image=None, filename=None, progress=None):
+        """
+        Upload an image from a file path, or from a file-like object/bytes (image)
+        """
         data = self.send_image(
             path="%s%s/" % (self.resource_uri, 'add_image'),
-            image_path=image_path
+            image_path=image_path,
+            image=image,
+            filename=filename,
+            progress=progress
         )
         return ProductOfferImage()._load_attributes_from_response(**data)
 
+    @classmethod
+    def add_images(cls, handler, images, concurrency = DEFAULT_CONCURRENCY, retries = 2, retry_delay = 1):
+        """
+        Upload images concurrently.
+
+        images: list of (offer, image). image is a file path, a file-like object or the
+        image bytes as a bytearray. A path which isn't an existing file is reported as failed,
+        like a file-like object given for several images (it can't be read concurrently).
+        The same content is uploaded once per offer, the duplicates are skipped.
+
+        The uploads are POST requests which may have created the image even when
+        they failed with a server error or a timeout: only the connection timeouts
+        (nothing sent) are retried `retries` times, waiting retry_delay, then twice longer...
+
+        Return a BatchReport (succeeded: the created ProductOfferImage objects,
+        failed: [((offer, image), error)], skipped: the duplicated (offer, image))
+        """
+        if not handler:
+            raise IcebergNoHandlerError()
+
+        report = BatchReport()
+        to_hash = []
+        file_objects = set()
+        for offer, image in images:
+            if hasattr(image, 'read'):
+                if id(image) in file_objects:
+                    report.add_outcome((offer, image), None,
+                                       ValueError("The same file-like object is given for several images"))
+                    continue
+                file_objects.add(id(image))
+            to_hash.append((offer, image))
+
+        to_upload = []
+        uploaded_hashes = set()
+        for (offer, image), content_hash, error in run_in_pool(_image_hash, to_hash, concurrency = concurrency):
+            if error is not None:
+                report.add_outcome((offer, image), None, error)
+            elif (offer.resource_uri, content_hash) in uploaded_hashes:
+                report.skipped.append((offer, image))
+            else:
+                uploaded_hashes.add((offer.resource_uri, content_hash))
+                to_upload.append((offer, image))
+
+        def upload(item):
+            offer, image = item
+            if isinstance(image, basestring):
+                kwargs = {'image_path': image}
+            else:
+                kwargs = {'image': image}
+                position = image.tell() if hasattr(image, 'tell') else None
+
+            for attempt in xrange(retries + 1):
+                try:
+                    return offer.add_image(**kwargs)
+                except requests.ConnectTimeout as err:  # Only when the request wasn't sent, requests>=2.4
+                    if attempt == retries:
+                        raise
+                    logger.warning("Image upload for %s failed (%s), retrying", offer.resource_uri, err)
+                    time.sleep(retry_delay * 2 ** attempt)
+                    if 'image' in kwargs and position is not None:
+                        image.seek(position)
+
+        for item, result, error in run_in_pool(upload, to_upload, concurrency = concurrency):
+            report.add_outcome(item, result, error)
+
+        return report
+
+
+def _is_image_path(image):
+    try:
+        return os.path.isfile(image)
+    except (TypeError, ValueError):  # Bytes with null characters
+        return False
+
+
+def _image_hash(item):
+    """
+    sha1 of the image content, read by chunks
+    """
+    offer, image = item
+    sha1 = hashlib.sha1()
+    if isinstance(image, basestring):
+        if not _is_image_path(image):
+            raise IOError("No image file %s" % image[:200])
+        with open(image, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(64 * 1024), b""):
+                sha1.update(chunk)
+    elif hasattr(image, 'read'):
+        position = image.tell()
+        for chunk in iter(lambda: image.read(64 * 1024), b""):
+            sha1.update(chunk)
+        image.seek(position)
+    elif isinstance(image, bytearray):
+        sha1.update(image)
+    else:
+        raise TypeError("image must be a file path, a file-like object or a bytearray, not %s" % type(image).__name__)
+    return sha1.hexdigest()
+
 
 class ProductVariation(UpdateableIcebergObject):
     endpoint = 'product_variation'
 
-IMG_THUMBNAIL_WIDTH = os.getenv('ICEBERG_IMG_THUMBNAIL_WIDTH', 150)
-IMG_THUMBNAIL_HEIGHT = os.getenv('ICEBERG_IMG_THUMBNAIL_HEIGHT', 150)
-IMG_MEDIUM_WIDTH = os.getenv('ICEBERG_IMG_MEDIUM_WIDTH', 600)
-IMG_MEDIUM_HEIGHT = os.getenv('ICEBERG_IMG_MEDIUM_HEIGHT', 600)
-IMG_ZOOM_WIDTH = os.getenv('ICEBERG_IMG_ZOOM_WIDTH', 1024)
-IMG_ZOOM_HEIGHT = os.getenv('ICEBERG_IMG_ZOOM_HEIGHT', 1024)
+def _int_env(name, default):
+    return int(os.getenv(name, default))
+
+IMG_THUMBNAIL_WIDTH = _int_env('ICEBERG_IMG_THUMBNAIL_WIDTH', 150)
+IMG_THUMBNAIL_HEIGHT = _int_env('ICEBERG_IMG_THUMBNAIL_HEIGHT', 150)
+IMG_MEDIUM_WIDTH = _int_env('ICEBERG_IMG_MEDIUM_WIDTH', 600)
+IMG_MEDIUM_HEIGHT = _int_env('ICEBERG_IMG_MEDIUM_HEIGHT', 600)
+IMG_ZOOM_WIDTH = _int_env('ICEBERG_IMG_ZOOM_WIDTH', 1024)
+IMG_ZOOM_HEIGHT = _int_env('ICEBERG_IMG_ZOOM_HEIGHT', 1024)
+
+# name: (width, height, process_mode)
+IMAGE_VARIANTS = {
+    "thumbnail_crop": (IMG_THUMBNAIL_WIDTH, IMG_THUMBNAIL_HEIGHT, "crop"),
+    "thumbnail_fit": (IMG_THUMBNAIL_WIDTH, IMG_THUMBNAIL_HEIGHT, "fit"),
+    "medium_crop": (IMG_MEDIUM_WIDTH, IMG_MEDIUM_HEIGHT, "crop"),
+    "medium_fit": (IMG_MEDIUM_WIDTH, IMG_MEDIUM_HEIGHT, "fit"),
+    "zoom_crop": (IMG_ZOOM_WIDTH, IMG_ZOOM_HEIGHT, "crop"),
+    "zoom_fit": (IMG_ZOOM_WIDTH, IMG_ZOOM_HEIGHT, "fit"),
+}
 
 
 class Image(UpdateableIcebergObject):
     endpoint = 'image'
 
+    @property
+    def cleaned_url(self):
+        """
+        Origin url in the image server format, computed once per url
+        """
+        cached = getattr(self, '_cleaned_url', None)
+        if cached is None or cached[0] != self.url:
+            cached = self._cleaned_url = (self.url, clean_image_url(self.url))
+        return cached[1]
+
     def build_resized_image_url(self, width, height, process_mode="crop"):
-        from icebergsdk.utils.image_server_utils import build_resized_image_url
         image_server_url = self._handler.conf.IMAGE_SERVER_URL
-        return build_resized_image_url(image_server_url, self.url, width, height, process_mode)
+        return build_resized_image_url(image_server_url, self.url, width, height, process_mode, cleaned_url=self.cleaned_url)
+
+    def variant_urls(self, variants=None):
+        """
+        Return {variant name: url} for the variants (default: IMAGE_VARIANTS)
+        """
+        return self.build_variant_urls([self], variants)[0]
+
+    @classmethod
+    def build_variant_urls(cls, images, variants=None):
+        """
+        Resized urls of all the variants of a list of images, ex: to render a products grid.
+        variants: {name: (width, height, process_mode)}, default: IMAGE_VARIANTS
+
+        Return a list of {variant name: url}, in the images order
+        """
+        variants = variants or IMAGE_VARIANTS
+        for width, height, process_mode in variants.itervalues():
+            check_process_mode(process_mode)
+
+        urls = []
+        for image in images:
+            image_server_url = image._handler.conf.IMAGE_SERVER_URL
+            urls.append(build_resized_image_urls(image_server_url, image.url, variants, cleaned_url=image.cleaned_url))
+        return urls
 
     def thumbnail_crop_url(self):
         return self.build_resized_image_url(width=IMG_THUMBNAIL_WIDTH, height=IMG_THUMBNAIL_HEIGHT, process_mode="crop")
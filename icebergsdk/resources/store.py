@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
-import time
+import logging
 
 from icebergsdk.resources.base import IcebergObject, UpdateableIcebergObject
+from icebergsdk.polling import PollingStrategy
 from icebergsdk.exceptions import IcebergNoHandlerError
 
+logger = logging.getLogger('icebergsdk.resource')
+
 
 class Store(UpdateableIcebergObject):
     endpoint = 'merchant'
@@ -96,15 +99,23 @@ class Store(UpdateableIcebergObject):
         return self.get_list(MerchantFeed.endpoint, args=filters)
 
     def wait_for_active_offers(self, number_of_active_offers_expected=1, max_number_of_checks=10, check_every_seconds=5):
-        active_offers = []
-        # looping to wait for the webhook to be active_offered
-        number_of_attempts = 0
-        while number_of_attempts < max_number_of_checks and len(active_offers) < number_of_active_offers_expected:
-            if number_of_attempts > 0:
-                time.sleep(check_every_seconds)  # check every X seconds except the 1st time
-            active_offers = self.product_offers(params={"status": "active"})
-            number_of_attempts += 1
-        print "number_of_attempts = %s, active_offers=%s" % (number_of_attempts, active_offers)
+        """
+        Wait for at least number_of_active_offers_expected active offers, and return them
+        checking every check_every_seconds, at most max_number_of_checks times
+        """
+        strategy = PollingStrategy(
+            initial_interval=check_every_seconds,
+            backoff_factor=1,  # Keep the number of checks within max_wait
+            jitter=0,
+            max_wait=max_number_of_checks * check_every_seconds,
+            max_polls=max_number_of_checks
+        )
+        met, active_offers = strategy.poll(
+            lambda: self.product_offers(params={"status": "active"}),
+            lambda active_offers: len(active_offers) >= number_of_active_offers_expected,
+            name="wait_for_active_offers"
+        )
+        logger.debug("%s active_offers (expected %s)", len(active_offers), number_of_active_offers_expected)
         return active_offers
 
     @property
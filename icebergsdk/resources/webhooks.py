@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 import os
-import time
+import logging
 from icebergsdk.resources.base import IcebergObject, UpdateableIcebergObject
+from icebergsdk.polling import PollingStrategy
+
+logger = logging.getLogger('icebergsdk.resource')
 
 if os.getenv('ICEBERG_DEBUG', False):
     MAX_NUMBER_OF_CHECKS = 2
@@ -27,15 +30,23 @@ class Webhook(UpdateableIcebergObject):
 
 
     def wait_for_triggers(self, number_of_triggers_expected=1, max_number_of_checks=MAX_NUMBER_OF_CHECKS, check_every_seconds=CHECK_EVERY_SECONDS):
-        webhook_triggers = []
-        ## looping to wait for the webhook to be triggered
-        number_of_attempts = 0
-        while number_of_attempts<max_number_of_checks and len(webhook_triggers)<number_of_triggers_expected:
-            if number_of_attempts > 0:
-                time.sleep(check_every_seconds) ## check every X seconds except the 1st time
-            webhook_triggers = self.triggers(status="succeeded")
-            number_of_attempts += 1
-        print "number_of_attempts = %s, %s webhook_triggers (expected %s)" % (number_of_attempts, len(webhook_triggers), number_of_triggers_expected)
+        """
+        Wait for at least number_of_triggers_expected succeeded triggers, and return them
+        checking every check_every_seconds, at most max_number_of_checks times
+        """
+        strategy = PollingStrategy(
+            initial_interval=check_every_seconds,
+            backoff_factor=1,  # Keep the number of checks within max_wait
+            jitter=0,
+            max_wait=max_number_of_checks * check_every_seconds,
+            max_polls=max_number_of_checks
+        )
+        met, webhook_triggers = strategy.poll(
+            lambda: self.triggers(status="succeeded"),
+            lambda webhook_triggers: len(webhook_triggers) >= number_of_triggers_expected,
+            name="wait_for_triggers"
+        )
+        logger.debug("%s webhook_triggers (expected %s)", len(webhook_triggers), number_of_triggers_expected)
         return webhook_triggers
 
 class WebhookTrigger(IcebergObject):
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Access tokens shared between processes, so that fresh handlers reuse the
+valid tokens instead of authenticating again.
+
+    token_store = SQLiteTokenStore("/var/run/myapp/iceberg_tokens.db", encryption_key=settings.TOKENS_KEY)
+    api_handler = IcebergAPI(token_store=token_store)
+    api_handler.sso_user(email="user@example.com")  # Authenticates only if there is no valid stored token
+
+A stored token is removed when a request made with it gets a 401 (IcebergClientUnauthorizedError).
+encryption_key is a Fernet key (Fernet.generate_key()), it needs the cryptography requirement.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes
+    fcntl = None
+
+logger = logging.getLogger('icebergsdk.token_store')
+
+
+def build_fernet(encryption_key):
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        raise Exception("Please install cryptography requirement")
+    return Fernet(encryption_key)
+
+
+class TokenStore(object):
+    """
+    Tokens by key: {"username": ..., "access_token": ..., "auth_response": {...}, "expires_at": timestamp}
+    Subclasses implement _load, _save and delete.
+
+    delete(key, access_token) only removes the token if it is still access_token,
+    so that a refused token doesn't remove the new one stored meanwhile by another process.
+    """
+    def __init__(self, encryption_key=None):
+        self.fernet = build_fernet(encryption_key) if encryption_key else None
+
+    def build_key(self, conf, method, user_key, options=None):
+        """
+        Key of the tokens of a user for an API and application. options are the
+        login parameters changing the token rights or the auth response (ex: is_staff).
+        ICEBERG_API_URL is used rather than ICEBERG_ENV, which the debug configurations share with prod/sandbox.
+        """
+        key = "%s|%s|%s|%s" % (conf.ICEBERG_API_URL, conf.ICEBERG_APPLICATION_NAMESPACE, method, user_key)
+        if options:
+            key += "|" + ";".join("%s=%s" % (name, options[name]) for name in sorted(options))
+        return key
+
+    def encode(self, token):
+        value = json.dumps(token)
+        if self.fernet is not None:
+            value = self.fernet.encrypt(value)
+        return value
+
+    def decode(self, value):
+        try:
+            if self.fernet is not None:
+                value = self.fernet.decrypt(str(value))
+            return json.loads(value)
+        except Exception:
+            logger.warning("Cant read a stored token, ignoring it")
+            return None
+
+    def get(self, key, min_validity=0):
+        """
+        Return the token stored for key if it is still valid in min_validity seconds, else None
+        """
+        token = self._load(key)
+        if token is None or token['expires_at'] <= time.time() + min_validity:
+            return None
+        return token
+
+    def set(self, key, token):
+        self._save(key, token)
+
+    def _load(self, key):
+        raise NotImplementedError()
+
+    def _save(self, key, token):
+        raise NotImplementedError()
+
+    def delete(self, key, access_token=None):
+        raise NotImplementedError()
+
+    def _is_deletable(self, value, access_token):
+        if access_token is None:
+            return True
+        token = self.decode(value)
+        return token is None or token['access_token'] == access_token
+
+
+class FileTokenStore(TokenStore):
+    """
+    Tokens in a JSON file (read/written by 0600), locked between threads and processes.
+    """
+    def __init__(self, path, encryption_key=None):
+        super(FileTokenStore, self).__init__(encryption_key=encryption_key)
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            lock_file = os.open("%s.lock" % self.path, os.O_RDWR | os.O_CREAT, 0600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                os.close(lock_file)
+
+    def _read_all(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as store_file:
+            try:
+                return json.load(store_file)
+            except ValueError:
+                logger.warning("Invalid token store %s, ignoring it", self.path)
+                return {}
+
+    def _write_all(self, values):
+        tmp_path = "%s.tmp" % self.path
+        store_file = os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), "w")
+        with store_file:
+            json.dump(values, store_file)
+        os.rename(tmp_path, self.path)
+
+    def _load(self, key):
+        with self._locked():
+            value = self._read_all().get(key)
+        return self.decode(value) if value is not None else None
+
+    def _save(self, key, token):
+        value = self.encode(token)
+        with self._locked():
+            values = self._read_all()
+            now = time.time()
+            for stored_key in values.keys():  # Purge the expired tokens
+                stored = self.decode(values[stored_key])
+                if stored is None or stored['expires_at'] <= now:
+                    del values[stored_key]
+            values[key] = value
+            self._write_all(values)
+
+    def delete(self, key, access_token=None):
+        with self._locked():
+            values = self._read_all()
+            if key in values and self._is_deletable(values[key], access_token):
+                del values[key]
+                self._write_all(values)
+
+
+class SQLiteTokenStore(TokenStore):
+    """
+    Tokens in a SQLite database, which handles the locking between processes.
+    """
+    def __init__(self, path, encryption_key=None, timeout=10):
+        super(SQLiteTokenStore, self).__init__(encryption_key=encryption_key)
+        self.path = path
+        self.timeout = timeout
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS iceberg_tokens "
+                                   "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        finally:
+            connection.close()
+        os.chmod(path, 0600)
+
+    def _connect(self):
+        # One connection per call: connections can't be shared between threads
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def _load(self, key):
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT value FROM iceberg_tokens WHERE key = ?", (key,)).fetchone()
+        finally:
+            connection.close()
+        return self.decode(row[0]) if row is not None else None
+
+    def _save(self, key, token):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM iceberg_tokens WHERE expires_at <= ?", (time.time(),))
+                connection.execute("INSERT OR REPLACE INTO iceberg_tokens (key, value, expires_at) VALUES (?, ?, ?)",
+                                   (key, self.encode(token), token['expires_at']))
+        finally:
+            connection.close()
+
+    def delete(self, key, access_token=None):
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT value FROM iceberg_tokens WHERE key = ?", (key,)).fetchone()
+            if row is None or not self._is_deletable(row[0], access_token):
+                return
+            with connection:
+                # Unless another process replaced the token since it was read
+                connection.execute("DELETE FROM iceberg_tokens WHERE key = ? AND value = ?", (key, row[0]))
+        finally:
+            connection.close()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from datetime import datetime
+
+import pytz
+
+logger = logging.getLogger('icebergsdk.algolia')
+
+
+def build_algolia_client(application_id, api_key):
+    try:
+        from algoliasearch import algoliasearch
+    except ImportError:
+        raise Exception("Please install algoliasearch requirement")
+    return algoliasearch.Client(application_id, api_key)
+
+
+class AlgoliaIndexCache(object):
+    """
+    Algolia indexes of the product channels, shared by the whole process.
+
+    Indexes are kept by API and channel, so every ProductChannel instance of a
+    channel (and every thread) reuses the same client and connections. Only the
+    index and its key expiration are kept: refreshing the key goes through the
+    channel asking for the index, with its own handler.
+
+    refresh_margin seconds before the key expires, the index is still returned
+    while the asking channel is fetched again in a background thread to get a
+    new key, so callers don't wait for it. Once the key is expired, the caller
+    refreshes it. Only one thread builds or refreshes the index of a channel at a time.
+    """
+    def __init__(self, refresh_margin=20 * 60, client_factory=build_algolia_client):
+        self.refresh_margin = refresh_margin
+        self.client_factory = client_factory
+        self._entries = {}
+        self._locks = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def cache_key(self, channel):
+        conf = channel._handler.conf
+        return (conf.ICEBERG_API_URL_FULL, conf.ICEBERG_ENV, conf.ICEBERG_APPLICATION_NAMESPACE, channel.resource_uri)
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _seconds_before_expiration(self, expiration_date):
+        if not expiration_date:
+            return None
+        return (expiration_date - datetime.now(pytz.utc)).total_seconds()
+
+    def _is_expiring(self, expiration_date, margin=None):
+        seconds_before_expiration = self._seconds_before_expiration(expiration_date)
+        if margin is None:
+            margin = self.refresh_margin
+        return seconds_before_expiration is not None and seconds_before_expiration <= margin
+
+    def get_index(self, channel):
+        key = self.cache_key(channel)
+        entry = self._entries.get(key)
+        if entry is not None and not self._is_expiring(entry['expiration_date']):
+            return entry['index']
+        if entry is not None and not self._is_expiring(entry['expiration_date'], margin=0):
+            self._refresh_in_background(key, channel)
+            return entry['index']
+
+        with self._key_lock(key):
+            entry = self._entries.get(key)  # may have been built by another thread meanwhile
+            if entry is None or self._is_expiring(entry['expiration_date'], margin=0):
+                entry = self._build_entry(key, channel)
+        return entry['index']
+
+    def _build_entry(self, key, channel):
+        """
+        Build the index from the channel data, fetched again if its key is expiring. Called with the key lock.
+        """
+        if self._is_expiring(getattr(channel, 'algolia_api_key_expiration_date', None)):
+            channel.fetch()
+        client = self.client_factory(channel.algolia_application_id, channel.algolia_api_key)
+        entry = {
+            'index': client.initIndex(channel.algolia_index_name),
+            'expiration_date': getattr(channel, 'algolia_api_key_expiration_date', None),
+        }
+        self._entries[key] = entry
+        return entry
+
+    def _refresh_in_background(self, key, channel):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        thread = threading.Thread(target=self._refresh, args=(key, channel))
+        thread.daemon = True
+        thread.start()
+
+    def _refresh(self, key, channel):
+        try:
+            with self._key_lock(key):
+                entry = self._entries.get(key)
+                if entry is None or self._is_expiring(entry['expiration_date']):
+                    self._build_entry(key, channel)
+        except Exception:
+            logger.exception("Cant refresh the Algolia API key of %s, will retry on next use", key[1])
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+algolia_index_cache = AlgoliaIndexCache()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+logger = logging.getLogger('icebergsdk.batch')
+
+DEFAULT_CONCURRENCY = 10
+
+
+class BatchReport(object):
+    """
+    Result of a batch operation.
+
+    succeeded: results of the successful calls
+    failed: list of (item, exception) for the calls that raised
+    skipped: items that didn't need any call
+    elapsed: duration of the batch in seconds, when measured
+    """
+    def __init__(self):
+        self.succeeded = []
+        self.failed = []
+        self.skipped = []
+        self.elapsed = None
+
+    @property
+    def errors(self):
+        return [error for item, error in self.failed]
+
+    def has_errors(self):
+        return len(self.failed) > 0
+
+    def add_outcome(self, item, result, error):
+        if error is None:
+            self.succeeded.append(result)
+        else:
+            self.failed.append((item, error))
+
+    def __repr__(self):
+        return "<BatchReport succeeded=%s failed=%s skipped=%s>" % (
+            len(self.succeeded), len(self.failed), len(self.skipped))
+
+
+class RateLimiter(object):
+    """
+    Allow at most `rate` calls per second, shared between threads.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next_call = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until the next call is allowed
+        """
+        with self._lock:
+            now = time.time()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_in_pool(func, items, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Call func on every item with a bounded pool of threads.
+
+    Yields (item, result, exception) in the items order. An exception raised by
+    func doesn't stop the batch, it is returned in place of the result.
+    With concurrency <= 1, the items are processed sequentially in the current thread.
+    """
+    def call(item):
+        try:
+            return item, func(item), None
+        except Exception as err:
+            logger.debug(u"Batch call failed for %r", item, exc_info=True)
+            return item, None, err
+
+    if concurrency <= 1:
+        for item in items:
+            yield call(item)
+        return
+
+    pool = ThreadPool(concurrency)
+    try:
+        for outcome in pool.imap(call, items):
+            yield outcome
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    In-process cache keeping the max_size most recently used keys. Thread safe.
+    """
+    def __init__(self, max_size=100):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self._data[key] = value  # Most recently used
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """
+        Snapshot of the (key, value) pairs, from the least recently used
+        """
+        with self._lock:
+            return self._data.items()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls for the same key: the first caller runs the function,
+    the others wait for its result (or exception).
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, key):
+        return key in self._calls
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'event': threading.Event(), 'result': None, 'error': None}
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = func(*args, **kwargs)
+            return call['result']
+        except Exception as err:
+            call['error'] = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
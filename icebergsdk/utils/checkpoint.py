@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+
+
+class FileCheckpoint(object):
+    """
+    Small JSON state saved in a file, to resume an interrupted iteration/export.
+
+    The file is replaced atomically, so a crash while saving keeps the previous state.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Return the saved state, {} if there is none
+        """
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def save(self, state):
+        with self._lock:
+            tmp_path = "%s.tmp" % self.path
+            with open(tmp_path, "w") as checkpoint_file:
+                json.dump(state, checkpoint_file)
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+            os.rename(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
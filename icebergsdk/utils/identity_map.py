@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import weakref
+
+
+class IdentityMap(object):
+    """
+    Resource objects by data type and id, weakly referenced, so that a resource
+    is represented by a single object per handler. Safe to share between threads:
+    each data type has its own lock.
+
+    Reading keeps the former dict of WeakValueDictionary interface:
+        identity_map["productoffer"]["1"], identity_map.get("productoffer")
+    """
+    def __init__(self):
+        self._entries = {}  # data type: (store, lock), read with a single lookup
+        self._lock = threading.Lock()
+
+    def _store_and_lock(self, data_type):
+        entry = self._entries.get(data_type)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(data_type)
+                if entry is None:
+                    entry = self._entries[data_type] = (weakref.WeakValueDictionary(), threading.Lock())
+        return entry
+
+    def get_or_create(self, data_type, key, factory):
+        """
+        Return the object stored for key, or store and return factory()
+        """
+        store, lock = self._store_and_lock(data_type)
+        with lock:
+            obj = store.get(key)
+            if obj is None:
+                obj = factory()
+                store[key] = obj
+            return obj
+
+    def remove(self, data_type, key):
+        entry = self._entries.get(data_type)
+        if entry is not None:
+            store, lock = entry
+            with lock:
+                store.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+    def get(self, data_type, default=None):
+        entry = self._entries.get(data_type)
+        return entry[0] if entry is not None else default
+
+    def __getitem__(self, data_type):
+        return self._entries[data_type][0]
+
+    def __contains__(self, data_type):
+        return data_type in self._entries
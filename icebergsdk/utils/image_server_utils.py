@@ -1,20 +1,50 @@
 # -*- coding: utf-8 -*-
 
+SUPPORTED_MODES = ("crop", "fit", "fitfill")
 
-def build_resized_image_url(image_server_url, original_url, width, height, process_mode="fitfill"):
+
+def check_process_mode(process_mode):
+    if process_mode not in SUPPORTED_MODES:
+        raise Exception("unkwnown process mode '%s'. should be one of %s" % (process_mode, list(SUPPORTED_MODES)))
+
+
+def clean_image_url(original_url):
+    """
+    Origin url without protocol nor //, as expected by the image server
+    """
+    return original_url.replace("http://","").replace("https://","").replace("//","")
+
+
+def build_resized_image_url(image_server_url, original_url, width, height, process_mode="fitfill", cleaned_url=None):
     """
     Convert an image url to the appropriate image server format to get a resized version of the image.
     Needs attributes : width, height and process_mode.
     NB: the original_url needs to be publicly accessible (as it will be downloaded by the image server).
-    """
-    SUPPORTED_MODES = ["crop", "fit", "fitfill"]
 
-    if process_mode not in SUPPORTED_MODES:
-        raise Exception("unkwnown process mode '%s'. should be one of %s" % (process_mode, SUPPORTED_MODES))
+    cleaned_url: clean_image_url(original_url), when already computed
+    """
+    check_process_mode(process_mode)
 
     if not image_server_url:
         ## no image server, returning the origin url
         return original_url
-     
-    cleaned_url = original_url.replace("http://","").replace("https://","").replace("//","") ## no protocol nor //
-    return "%s/ext/%s/%sx%s/%s" % (image_server_url, process_mode, width, height, cleaned_url)
\ No newline at end of file
+
+    cleaned_url = cleaned_url or clean_image_url(original_url)
+    return "%s/ext/%s/%sx%s/%s" % (image_server_url, process_mode, width, height, cleaned_url)
+
+
+def build_resized_image_urls(image_server_url, original_url, variants, cleaned_url=None):
+    """
+    Resized urls of an image for each variant.
+    variants: {name: (width, height, process_mode)}, process modes already checked
+
+    Return {name: url}
+    """
+    if not image_server_url:
+        return dict((name, original_url) for name in variants)
+
+    cleaned_url = cleaned_url or clean_image_url(original_url)
+    return dict(
+        (name, "%s/ext/%s/%sx%s/%s" % (image_server_url, process_mode, width, height, cleaned_url))
+        for name, (width, height, process_mode) in variants.iteritems()
+    )
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation hooks.
+
+Register callbacks to receive measures from the SDK, ex: to send them to statsd.
+
+    def on_polling(event_name, data):
+        statsd.timing("iceberg.%s" % data["name"], data["elapsed"])
+
+    register_hook("polling", on_polling)
+
+Events:
+    polling: name, polls (number of requests), elapsed (seconds), met (condition met or not)
+    frontmodules_warm_up: langs, elapsed (seconds), failed (langs which couldn't be loaded)
+"""
+import logging
+import threading
+
+logger = logging.getLogger('icebergsdk.instrumentation')
+
+_hooks = {}
+_hooks_lock = threading.Lock()
+
+
+def register_hook(event_name, callback):
+    """
+    callback(event_name, data) will be called on each event_name event
+    """
+    with _hooks_lock:
+        _hooks.setdefault(event_name, []).append(callback)
+
+
+def unregister_hook(event_name, callback):
+    with _hooks_lock:
+        if callback in _hooks.get(event_name, []):
+            _hooks[event_name].remove(callback)
+
+
+def emit(event_name, **data):
+    """
+    Call the callbacks registered for event_name. Their errors are logged, not raised.
+    """
+    callbacks = _hooks.get(event_name)
+    if not callbacks:
+        return
+    for callback in list(callbacks):
+        try:
+            callback(event_name, data)
+        except Exception:
+            logger.exception("Error in %s hook %s", event_name, callback)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import mimetypes
+import os
+import time
+import uuid
+from io import BytesIO
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MultipartFile(object):
+    """
+    File part of a multipart body. source is a path, a file-like object or the bytes of the file.
+
+    A file opened from a path is closed by close(), a file-like object is left to its owner.
+    """
+    def __init__(self, source, filename=None, content_type=None, from_path=False):
+        self._owned = False
+        if from_path:
+            filename = filename or os.path.basename(source)
+            self.fileobj = open(source, 'rb')
+            self._owned = True
+        elif isinstance(source, (str, bytearray)):
+            self.fileobj = BytesIO(source)
+        else:
+            self.fileobj = source
+
+        self.filename = filename or os.path.basename(getattr(source, 'name', None) or "image")
+        if isinstance(self.filename, unicode):
+            self.filename = self.filename.encode('utf-8')
+        self.content_type = content_type or mimetypes.guess_type(self.filename)[0] or "application/octet-stream"
+        self.size = self._remaining_size()
+
+    def _remaining_size(self):
+        try:
+            position = self.fileobj.tell()
+            self.fileobj.seek(0, os.SEEK_END)
+            size = self.fileobj.tell() - position
+            self.fileobj.seek(position)
+            return size
+        except (AttributeError, IOError, ValueError):
+            # Not seekable: keep the content in memory to know its size
+            self.fileobj = BytesIO(self.fileobj.read())
+            return len(self.fileobj.getvalue())
+
+    def read(self, size):
+        return self.fileobj.read(size)
+
+    def close(self):
+        if self._owned:
+            self.fileobj.close()
+
+
+class MultipartEncoder(object):
+    """
+    File-like multipart/form-data body, read chunk by chunk by requests
+    instead of being built in memory.
+
+    progress(bytes_sent, total_bytes, bytes_per_second) is called after each chunk.
+    """
+    def __init__(self, files, fields=None, progress=None, chunk_size=CHUNK_SIZE):
+        """
+        files: {field_name: MultipartFile}
+        fields: {field_name: value} for the non file fields
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary=%s" % self.boundary
+        self.files = files
+        self.progress = progress
+        self.chunk_size = chunk_size
+
+        self._parts = []
+        for name, value in (fields or {}).iteritems():
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            self._parts.append('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n' % (
+                self.boundary, name, value))
+        for name, multipart_file in files.iteritems():
+            self._parts.append('--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\nContent-Type: %s\r\n\r\n' % (
+                self.boundary, name, multipart_file.filename.replace('"', '\\"'), multipart_file.content_type))
+            self._parts.append(multipart_file)
+            self._parts.append('\r\n')
+        self._parts.append('--%s--\r\n' % self.boundary)
+
+        self.len = sum(len(part) if isinstance(part, str) else part.size for part in self._parts)
+        self.bytes_sent = 0
+        self._started_at = None
+        self._buffers = [BytesIO(part) if isinstance(part, str) else part for part in self._parts]
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        if self._started_at is None:
+            self._started_at = time.time()
+        if size is None or size < 0:
+            size = self.len - self.bytes_sent
+
+        chunks = []
+        remaining = size
+        while remaining > 0 and self._buffers:
+            chunk = self._buffers[0].read(min(remaining, self.chunk_size))
+            if not chunk:
+                self._buffers.pop(0)
+                continue
+            chunks.append(chunk)
+            remaining -= len(chunk)
+
+        data = b"".join(chunks)
+        if data:
+            self.bytes_sent += len(data)
+            if self.progress is not None:
+                elapsed = time.time() - self._started_at
+                self.progress(self.bytes_sent, self.len, self.bytes_sent / elapsed if elapsed > 0 else None)
+        return data
+
+    def close(self):
+        for multipart_file in self.files.itervalues():
+            multipart_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
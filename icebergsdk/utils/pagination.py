@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+
+def iter_pages(handler, path, args=None, page_size=100, offset=0):
+    """
+    Yield (offset, objects) for each page of a listing endpoint, following the
+    offset until an empty page or an empty meta.next. A short page doesn't end
+    the listing: the API may return less objects than page_size.
+    """
+    args = dict(args or {})
+    while True:
+        args.update({'offset': offset, 'limit': page_size})
+        data = handler.request(path, args=args)
+        objects = data.get('objects', [])
+        yield offset, objects
+
+        offset += len(objects)
+        if not objects or not data.get('meta', {}).get('next', True):
+            return
+
+
+def iter_objects(handler, path, args=None, page_size=100, offset=0):
+    """
+    Yield the raw objects of all the pages of a listing endpoint
+    """
+    for page_offset, objects in iter_pages(handler, path, args=args, page_size=page_size, offset=offset):
+        for obj in objects:
+            yield obj
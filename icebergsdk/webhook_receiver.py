@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Receive the webhooks pushed by Iceberg.
+
+    receiver = WebhookReceiver(handler=api_handler, secret_key=conf.ICEBERG_APPLICATION_SECRET_KEY)
+
+    @receiver.on("merchant_order_confirmed")
+    def on_confirmed(event):
+        print event.resource.status
+
+    receiver.start()
+    serve(receiver, port=8000)  # Or mount receiver as a WSGI application
+
+Expected requests: POST, json body
+    {
+        "trigger_id": 12,  # or "id", or the X-Iceberg-Trigger-Id header
+        "event": "merchant_order_confirmed",
+        "data": {"id": 1, "resource_uri": "/v1/merchant_order/1/", ...}
+    }
+signed with the X-Iceberg-Signature header: HMAC-SHA1 hexdigest of the raw body with the secret key.
+This signature scheme is an assumption of this module, not a documented Iceberg API: check it
+against the webhooks actually received, and change signature_header/verify_signature if needed.
+
+secret_key is required: unsigned webhooks would be hydrated into the handler objects.
+allow_unsigned=True accepts them anyway (ex: local tests), the signature isn't checked then.
+
+Responses:
+    202 queued, 200 already received (duplicated trigger id), 400 invalid body,
+    403 wrong signature, 405 not a POST, 503 queue full (retry later).
+"""
+import hashlib
+import hmac
+import json
+import logging
+import threading
+from Queue import Queue, Full
+from wsgiref.simple_server import make_server
+
+from icebergsdk.utils.cache_utils import LRUCache
+
+logger = logging.getLogger('icebergsdk.webhook_receiver')
+
+
+class WebhookEvent(object):
+    """
+    Received webhook. resource is the hydrated Iceberg object, when a handler is given.
+    """
+    def __init__(self, trigger_id, event, payload, data=None, resource=None):
+        self.trigger_id = trigger_id
+        self.event = event
+        self.payload = payload
+        self.data = data
+        self.resource = resource
+
+    def __repr__(self):
+        return "<WebhookEvent %s trigger=%s>" % (self.event, self.trigger_id)
+
+
+class WebhookReceiver(object):
+    """
+    WSGI application verifying and queuing the webhooks, dispatched to the
+    callbacks by `workers` threads. When queue_size webhooks are waiting, the
+    next ones are refused with a 503 so Iceberg retries them later.
+    The last dedupe_size trigger ids are kept to ignore the retries of already received webhooks:
+    an id is kept while its webhook is queued or processed, and forgotten when
+    a callback fails so that the webhook is processed again if delivered again.
+    """
+    signature_header = "HTTP_X_ICEBERG_SIGNATURE"
+    trigger_id_header = "HTTP_X_ICEBERG_TRIGGER_ID"
+
+    def __init__(self, handler=None, secret_key=None, workers=4, queue_size=100, dedupe_size=10000, retry_after=30,
+                 allow_unsigned=False):
+        if not secret_key and not allow_unsigned:
+            raise ValueError("secret_key is required to verify the webhooks (or pass allow_unsigned=True)")
+        self.handler = handler
+        self.secret_key = secret_key
+        self.allow_unsigned = allow_unsigned
+        self.workers = workers
+        self.retry_after = retry_after
+        self.queue = Queue(maxsize=queue_size)
+        self._callbacks = {}
+        self._received = LRUCache(max_size=dedupe_size)
+        self._received_lock = threading.Lock()
+        self._threads = []
+
+    ####
+    #   Callbacks
+    ####
+    def register(self, event_name, callback):
+        """
+        callback(event) is called for each event_name webhook. Use "*" for all the events.
+        """
+        self._callbacks.setdefault(event_name, []).append(callback)
+
+    def on(self, event_name):
+        """
+        Decorator version of register()
+        """
+        def decorator(callback):
+            self.register(event_name, callback)
+            return callback
+        return decorator
+
+    def dispatch(self, event):
+        """
+        Call the callbacks of the event, return False if one of them failed
+        """
+        succeeded = True
+        for callback in self._callbacks.get(event.event, []) + self._callbacks.get("*", []):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Error in webhook callback %s for %r", callback, event)
+                succeeded = False
+        return succeeded
+
+    ####
+    #   Reception
+    ####
+    def verify_signature(self, body, signature):
+        if self.allow_unsigned:
+            return True
+        if not signature:
+            return False
+        expected = hmac.new(str(self.secret_key), body, digestmod=hashlib.sha1).hexdigest()
+        return hmac.compare_digest(expected, str(signature))
+
+    def build_event(self, payload, trigger_id=None):
+        data = payload.get("data")
+        resource = None
+        if self.handler is not None and isinstance(data, dict) and data.get("resource_uri"):
+            from icebergsdk.resources import get_class_from_resource_uri
+            try:
+                resource = get_class_from_resource_uri(data["resource_uri"]).findOrCreate(self.handler, data)
+            except NotImplementedError:
+                logger.warning("Unknown resource %s in webhook", data["resource_uri"])
+
+        return WebhookEvent(
+            trigger_id=trigger_id or payload.get("trigger_id") or payload.get("id"),
+            event=payload.get("event"),
+            payload=payload,
+            data=data,
+            resource=resource
+        )
+
+    def receive(self, body, signature=None, trigger_id=None):
+        """
+        Verify and queue a webhook. Return (HTTP status, message).
+        """
+        if not self.verify_signature(body, signature):
+            return 403, "Invalid signature"
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400, "Invalid json"
+        if not isinstance(payload, dict):
+            return 400, "Invalid payload"
+
+        trigger_id = trigger_id or payload.get("trigger_id") or payload.get("id")
+        if trigger_id is not None:
+            with self._received_lock:
+                if self._received.get(str(trigger_id)):
+                    return 200, "Already received"
+                self._received.set(str(trigger_id), True)
+
+        try:
+            self.queue.put_nowait((payload, trigger_id))
+        except Full:
+            self._forget(trigger_id)  # Accept the retry
+            return 503, "Too many webhooks waiting"
+
+        return 202, "Queued"
+
+    def __call__(self, environ, start_response):
+        if environ.get("REQUEST_METHOD") != "POST":
+            status, message = 405, "Method not allowed"
+        else:
+            try:
+                length = int(environ.get("CONTENT_LENGTH") or 0)
+            except ValueError:
+                length = 0
+            body = environ["wsgi.input"].read(length)
+            status, message = self.receive(
+                body,
+                signature=environ.get(self.signature_header),
+                trigger_id=environ.get(self.trigger_id_header)
+            )
+
+        headers = [("Content-Type", "text/plain")]
+        if status == 503:
+            headers.append(("Retry-After", str(self.retry_after)))
+        start_response("%s %s" % (status, message), headers)
+        return [message]
+
+    ####
+    #   Workers
+    ####
+    def start(self):
+        if self._threads:
+            return
+        for i in xrange(self.workers):
+            thread = threading.Thread(target=self._work, name="icebergsdk-webhook-%s" % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Process the queued webhooks and stop the workers
+        """
+        for thread in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def join(self):
+        """
+        Wait for the queued webhooks to be processed
+        """
+        self.queue.join()
+
+    def _forget(self, trigger_id):
+        if trigger_id is not None:
+            with self._received_lock:
+                self._received.delete(str(trigger_id))
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                payload, trigger_id = item
+                try:
+                    succeeded = self.dispatch(self.build_event(payload, trigger_id))
+                except Exception:
+                    logger.exception("Cant process webhook %r", item)
+                    succeeded = False
+                if not succeeded:
+                    self._forget(trigger_id)
+            finally:
+                self.queue.task_done()
+
+
+def serve(receiver, host="0.0.0.0", port=8000):
+    """
+    Run the receiver with the standard library WSGI server, until interrupted
+    """
+    receiver.start()
+    server = make_server(host, port, receiver)
+    logger.info("Listening for webhooks on %s:%s", host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        receiver.stop()
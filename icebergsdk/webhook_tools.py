@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+Tools to triage the webhook deliveries of an application.
+
+    scanner = WebhookScanner(api_handler, application=application, statuses=["failed"])
+    stats = WebhookStats()
+    with open("failed_triggers.ndjson", "w") as output:
+        export_ndjson(stats.collect(scanner.scan()), output)
+    print stats.as_rows()
+
+    receiver = WebhookReceiver(handler=api_handler, secret_key=secret_key)  # With its callbacks registered
+    replayer = WebhookReplayer(api_handler, deliver=lambda trigger: receiver.dispatch(receiver.build_event(trigger['payload'], trigger['id'])),
+                               application=application, created_after=outage_start, rate_limit=5,
+                               checkpoint=FileCheckpoint("replay.json"))
+    report = replayer.replay()
+"""
+import json
+import logging
+import math
+import threading
+from Queue import Empty, Full, Queue
+
+from dateutil import parser as date_parser
+from dateutil.tz import tzutc
+
+from icebergsdk.json_utils import DateTimeAwareJSONEncoder
+from icebergsdk.utils.batch_utils import BatchReport, DEFAULT_CONCURRENCY, RateLimiter, run_in_pool
+from icebergsdk.utils.pagination import iter_objects, iter_pages
+
+logger = logging.getLogger('icebergsdk.webhook_tools')
+
+
+class WebhookScanner(object):
+    """
+    Stream the triggers of all the webhooks of an application, with their attempts.
+
+    The webhooks are scanned `concurrency` at a time: their triggers are listed
+    page by page, for each status of `statuses` (None: all), with the attempts of
+    each trigger. A single webhook is scanned with the attempts of the triggers of
+    a page fetched `concurrency` at a time instead.
+
+    The records are yielded as the pages arrive, the ones of different webhooks
+    interleaved. At most buffer_size records wait to be consumed (default: page_size * concurrency).
+
+    Each record is a dict:
+        {"webhook_id": 1, "event": "new_merchant_available", "status": "failed",
+         "trigger": {raw trigger}, "attempts": [raw attempts]}
+    """
+    def __init__(self, handler, application=None, statuses=("failed",), page_size=100,
+                 concurrency=DEFAULT_CONCURRENCY, with_attempts=True, filters=None, webhook_ids=None, events=None,
+                 buffer_size=None):
+        self.handler = handler
+        self.application = application
+        self.webhook_ids = webhook_ids  # Only scan these webhooks
+        self.events = events  # Only scan the webhooks of these events
+        self.statuses = statuses
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.with_attempts = with_attempts
+        self.filters = filters or {}  # Extra filters of the triggers listing
+        self.buffer_size = buffer_size or page_size * max(concurrency, 1)
+
+    def webhooks(self):
+        """
+        Raw data of the webhooks of the application (all the webhooks the handler can see without application)
+        """
+        args = {}
+        if self.application is not None:
+            args['application'] = getattr(self.application, 'id', self.application)
+
+        webhooks = []
+        for webhook in iter_objects(self.handler, "webhook/", args=args, page_size=self.page_size):
+            if self.webhook_ids is not None and webhook.get('id') not in self.webhook_ids:
+                continue
+            if self.events is not None and webhook.get('event') not in self.events:
+                continue
+            webhooks.append(webhook)
+        return webhooks
+
+    def get_attempts(self, trigger):
+        return list(iter_objects(self.handler, "%sattempts/" % trigger['resource_uri'], page_size=self.page_size))
+
+    def scan(self):
+        webhooks = self.webhooks()
+        if len(webhooks) == 1:
+            for record in self.scan_webhook(webhooks[0]):
+                yield record
+            return
+
+        for record in self._scan_concurrently(webhooks):
+            yield record
+
+    def _scan_concurrently(self, webhooks):
+        pending = Queue()
+        for webhook in webhooks:
+            pending.put(webhook)
+        records = Queue(maxsize=self.buffer_size)
+        stop = threading.Event()
+        finished = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    records.put(item, timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        def work():
+            try:
+                while not stop.is_set():
+                    try:
+                        webhook = pending.get_nowait()
+                    except Empty:
+                        return
+                    for record in self.scan_webhook(webhook, concurrency=1):
+                        put(record)
+                        if stop.is_set():
+                            return
+            except Exception as err:
+                put(err)
+            finally:
+                put(finished)
+
+        workers = [threading.Thread(target=work, name="icebergsdk-webhook-scan-%s" % i)
+                   for i in xrange(min(max(self.concurrency, 1), len(webhooks)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        try:
+            running = len(workers)
+            while running:
+                item = records.get()
+                if item is finished:
+                    running -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()  # Also when the consumer stops early
+
+    def scan_webhook(self, webhook, concurrency=None):
+        """
+        Records of a webhook, with the attempts fetched `concurrency` (default: self.concurrency) at a time
+        """
+        if concurrency is None:
+            concurrency = self.concurrency
+        for status in (self.statuses or [None]):
+            args = dict(self.filters)
+            if status is not None:
+                args['status'] = status
+
+            path = "%striggers/" % webhook['resource_uri']
+            for offset, triggers in iter_pages(self.handler, path, args=args, page_size=self.page_size):
+                if self.with_attempts:
+                    outcomes = run_in_pool(self.get_attempts, triggers, concurrency)
+                else:
+                    outcomes = ((trigger, [], None) for trigger in triggers)
+
+                for trigger, attempts, error in outcomes:
+                    if error is not None:
+                        logger.warning("Cant get attempts of trigger %s: %s", trigger.get('id'), error)
+                        attempts = None
+                    yield {
+                        "webhook_id": webhook.get('id'),
+                        "event": webhook.get('event'),
+                        "status": trigger.get('status', status),
+                        "trigger": trigger,
+                        "attempts": attempts,
+                    }
+
+
+class WebhookStats(object):
+    """
+    Failure counts and attempt latencies per (webhook_id, event).
+
+    latency_field: attempt field holding its duration
+    """
+    def __init__(self, latency_field="response_time", failed_statuses=("failed",)):
+        self.latency_field = latency_field
+        self.failed_statuses = failed_statuses
+        self._stats = {}
+
+    def add(self, record):
+        stats = self._stats.setdefault((record['webhook_id'], record['event']), {
+            "triggers": 0,
+            "failed_triggers": 0,
+            "attempts": 0,
+            "latencies": [],
+        })
+        stats["triggers"] += 1
+        if record['status'] in self.failed_statuses:
+            stats["failed_triggers"] += 1
+        for attempt in record['attempts'] or []:
+            stats["attempts"] += 1
+            latency = attempt.get(self.latency_field)
+            if latency is not None:
+                stats["latencies"].append(float(latency))
+
+    def collect(self, records):
+        """
+        Aggregate the records while passing them through
+        """
+        for record in records:
+            self.add(record)
+            yield record
+
+    def as_rows(self):
+        """
+        One dict per (webhook_id, event), sorted by decreasing number of failed triggers
+        """
+        rows = []
+        for (webhook_id, event), stats in self._stats.iteritems():
+            latencies = sorted(stats["latencies"])
+            rows.append({
+                "webhook_id": webhook_id,
+                "event": event,
+                "triggers": stats["triggers"],
+                "failed_triggers": stats["failed_triggers"],
+                "attempts": stats["attempts"],
+                "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+                "latency_p50": percentile(latencies, 50),
+                "latency_p95": percentile(latencies, 95),
+                "latency_max": latencies[-1] if latencies else None,
+            })
+        return sorted(rows, key=lambda row: (-row["failed_triggers"], row["webhook_id"]))
+
+
+class WebhookReplayer(object):
+    """
+    Process again the triggers matching a filter (webhooks, events, statuses,
+    filters of the triggers listing, created_after/created_before), `concurrency` at a time.
+
+    The API has no documented endpoint to have a trigger delivered again by Iceberg:
+    the triggers are replayed locally, deliver(trigger) gets each raw trigger (its
+    "payload" is the webhook body), ex: to dispatch it to the callbacks of a WebhookReceiver.
+
+    The matching triggers are all listed before the first delivery.
+    created_after (included) and created_before (excluded) are compared to the
+    created_on of the triggers once listed, the API having no such filter;
+    naive datetimes are taken as UTC.
+    rate_limit: max deliveries per second.
+    checkpoint (ex: FileCheckpoint): the replayed trigger ids are saved every
+    checkpoint_every deliveries, and skipped when the replay is started again.
+    progress(done, total, report) is called after each delivery.
+    """
+    def __init__(self, handler, deliver, application=None, webhook_ids=None, events=None, statuses=("failed",),
+                 filters=None, created_after=None, created_before=None, concurrency=DEFAULT_CONCURRENCY,
+                 rate_limit=None, checkpoint=None, checkpoint_every=50, progress=None, page_size=100):
+        self.handler = handler
+        self.deliver = deliver
+        self.created_after = _as_utc(created_after) if created_after is not None else None
+        self.created_before = _as_utc(created_before) if created_before is not None else None
+        self.scanner = WebhookScanner(handler, application=application, statuses=statuses, page_size=page_size,
+                                      with_attempts=False, filters=filters, webhook_ids=webhook_ids, events=events)
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.progress = progress
+
+    def triggers(self):
+        return [record['trigger'] for record in self.scanner.scan() if self.in_period(record['trigger'])]
+
+    def in_period(self, trigger):
+        if self.created_after is None and self.created_before is None:
+            return True
+        if not trigger.get('created_on'):
+            return False
+        created_on = _as_utc(trigger['created_on'])
+        if self.created_after is not None and created_on < self.created_after:
+            return False
+        if self.created_before is not None and created_on >= self.created_before:
+            return False
+        return True
+
+    def replay_trigger(self, trigger):
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+        self.deliver(trigger)
+        return trigger['id']
+
+    def replay(self):
+        """
+        Return a BatchReport (succeeded: the replayed trigger ids, skipped: the
+        triggers already replayed according to the checkpoint)
+        """
+        replayed = set()
+        if self.checkpoint is not None:
+            replayed = set(self.checkpoint.load().get('replayed', []))
+
+        report = BatchReport()
+        to_replay = []
+        for trigger in self.triggers():
+            if trigger['id'] in replayed:
+                report.skipped.append(trigger)
+            else:
+                to_replay.append(trigger)
+
+        total = len(to_replay)
+        logger.info("Replaying %s webhook triggers (%s already replayed)", total, len(report.skipped))
+        done = 0
+        for trigger, trigger_id, error in run_in_pool(self.replay_trigger, to_replay, self.concurrency):
+            report.add_outcome(trigger, trigger_id, error)
+            if error is None:
+                replayed.add(trigger_id)
+            else:
+                logger.warning("Cant replay webhook trigger %s: %s", trigger.get('id'), error)
+
+            done += 1
+            if self.checkpoint is not None and (done % self.checkpoint_every == 0 or done == total):
+                self.checkpoint.save({'replayed': sorted(replayed)})
+            if self.progress is not None:
+                self.progress(done, total, report)
+
+        return report
+
+
+def _as_utc(value):
+    """
+    Aware UTC datetime of a datetime or an ISO 8601 string (naive ones taken as UTC)
+    """
+    if not hasattr(value, 'tzinfo'):
+        value = date_parser.parse(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=tzutc())
+    return value.astimezone(tzutc())
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values))) - 1
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+def export_ndjson(records, fileobj):
+    """
+    Write one json document per line. Return the number of records written.
+    """
+    count = 0
+    for record in records:
+        fileobj.write(json.dumps(record, cls=DateTimeAwareJSONEncoder))
+        fileobj.write("\n")
+        count += 1
+    return count
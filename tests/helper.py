@@ -10,6 +10,7 @@ from icebergsdk.api import IcebergAPI
 
 from helpers.objects_shortcuts_mixin import IcebergObjectCreateMixin
 from icebergsdk.exceptions import IcebergClientError
+from icebergsdk.resources.base import UpdateableIcebergObject
 
 def get_api_handler():
     if os.getenv('ICEBERG_DEBUG', False):
@@ -40,14 +41,10 @@ class IcebergUnitTestCase(unittest.TestCase, IcebergObjectCreateMixin):
             api_handler = get_api_handler()
             api_handler.auth_user(username="staff_iceberg", email="staff@izberg-marketplace.com", is_staff = True) # Connect as staff
             fail_silently = True
-            for obj in cls._objects_to_delete:
-                try:
-                    obj.delete(handler = api_handler)
-                    # print "obj %s deleted" % obj
-                except:
-                    if not fail_silently:
-                        raise
-                    # print "couldnt delete obj %s" % obj
+            # one at a time, in order, as some objects depend on the previous ones
+            report = UpdateableIcebergObject.delete_many(api_handler, cls._objects_to_delete, concurrency = 1)
+            if report.has_errors() and not fail_silently:
+                raise report.errors[0]
 
 
     def setUp(self):
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from icebergsdk.api import IcebergAPI
+from icebergsdk.conf import ConfigurationDebug
+
+
+class FakeIcebergAPI(IcebergAPI):
+    """
+    Handler answering requests with a local function instead of the API.
+
+    responder(method, path, args, post_args) returns the response data or raises.
+    Every request is recorded in self.requests as (method, path, args, post_args).
+    """
+    def __init__(self, responder=None, *args, **kwargs):
+        kwargs.setdefault('conf', ConfigurationDebug)
+        super(FakeIcebergAPI, self).__init__(*args, **kwargs)
+        self.responder = responder
+        self.requests = []
+        self._requests_lock = threading.Lock()
+
+    def request(self, path, args=None, post_args=None, files=None, method=None, headers=None, data=None):
+        method = (method or "GET").upper()
+        with self._requests_lock:
+            self.requests.append((method, path, args, post_args))
+        return self.responder(method, path, args, post_args)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.exceptions import IcebergClientError, IcebergTransitionError
+from icebergsdk.utils.batch_utils import RateLimiter
+
+
+def offer_data(offer_id, **kwargs):
+    data = {
+        "id": offer_id,
+        "resource_uri": "/v1/productoffer/%s/" % offer_id,
+        "price": "10.00",
+        "sku": "sku-%s" % offer_id,
+    }
+    data.update(kwargs)
+    return data
+
+
+class SaveManyTest(unittest.TestCase):
+    def setUp(self):
+        def responder(method, path, args, post_args):
+            offer_id = path.split("/")[3]
+            if offer_id == "3":
+                raise IcebergClientError()
+            if "return_data=1" in path:
+                return offer_data(offer_id, **post_args)
+            return "No Content"
+
+        self.api_handler = FakeIcebergAPI(responder)
+        self.offers = [self.api_handler.ProductOffer.findOrCreate(offer_data(i)) for i in xrange(1, 5)]
+
+    def test_save_many(self):
+        """
+        Only changed objects are saved, failures don't stop the batch
+        """
+        for offer in self.offers[:3]:
+            offer.price = "20.00"
+
+        report = self.api_handler.ProductOffer.save_many(self.offers, concurrency=3)
+
+        self.assertEqual(len(report.succeeded), 2)
+        self.assertEqual(report.skipped, [self.offers[3]])
+        self.assertEqual(len(report.failed), 1)
+        self.assertEqual(report.failed[0][0], self.offers[2])
+        self.assertTrue(isinstance(report.errors[0], IcebergClientError))
+        self.assertEqual(len(self.api_handler.requests), 3)
+        for method, path, args, post_args in self.api_handler.requests:
+            self.assertEqual(method, "PUT")
+            self.assertEqual(post_args, {"price": "20.00"})
+        self.assertFalse(self.offers[0].has_changed())
+
+    def test_save_many_without_return_data(self):
+        self.offers[0].price = "20.00"
+
+        report = self.api_handler.ProductOffer.save_many(self.offers[:1], return_data=False)
+
+        self.assertFalse(report.has_errors())
+        self.assertEqual(self.api_handler.requests[0][1], "/v1/productoffer/1/")
+
+
+class DeleteManyTest(unittest.TestCase):
+    def setUp(self):
+        def responder(method, path, args, post_args):
+            if path == "/v1/productoffer/3/":
+                raise IcebergClientError()
+            return "No Content"
+
+        self.api_handler = FakeIcebergAPI(responder)
+        self.offers = [self.api_handler.ProductOffer.findOrCreate(offer_data(i)) for i in xrange(1, 4)]
+
+    def test_delete_many(self):
+        """
+        Objects and ids are deleted, failures are reported
+        """
+        report = self.api_handler.ProductOffer.delete_many([self.offers[0], 2, self.offers[2]], concurrency=2)
+
+        self.assertEqual(report.succeeded, [self.offers[0], 2])
+        self.assertEqual(report.failed[0][0], self.offers[2])
+        self.assertEqual(
+            sorted(path for method, path, args, post_args in self.api_handler.requests),
+            ["/v1/productoffer/1/", "/v1/productoffer/2/", "/v1/productoffer/3/"]
+        )
+        objects_store = self.api_handler._objects_store["productoffer"]
+        self.assertNotIn("1", objects_store)
+        self.assertNotIn("2", objects_store)
+        self.assertIn("3", objects_store)
+
+    def test_bulk_delete(self):
+        report = self.api_handler.ProductOffer.delete_many([self.offers[0], self.offers[1]], bulk=True)
+
+        self.assertFalse(report.has_errors())
+        self.assertEqual(self.api_handler.requests, [
+            ("PATCH", "productoffer/", None, {
+                "objects": [],
+                "deleted_objects": ["/v1/productoffer/1/", "/v1/productoffer/2/"]
+            })
+        ])
+        self.assertNotIn("1", self.api_handler._objects_store["productoffer"])
+
+
+class TransitionManyTest(unittest.TestCase):
+    def setUp(self):
+        def responder(method, path, args, post_args):
+            order_id = path.split("/")[3]
+            if order_id == "2":
+                raise IcebergClientError()
+            return {"id": int(order_id), "resource_uri": "/v1/merchant_order/%s/" % order_id, "status": "confirmed"}
+
+        self.api_handler = FakeIcebergAPI(responder)
+        self.orders = [
+            self.api_handler.MerchantOrder.findOrCreate({
+                "id": i, "resource_uri": "/v1/merchant_order/%s/" % i, "status": "authorized"
+            })
+            for i in xrange(1, 4)
+        ]
+
+    def test_transition_many(self):
+        report = self.api_handler.MerchantOrder.transition_many(self.orders, 'confirm', concurrency=3)
+
+        self.assertEqual(report.succeeded, [self.orders[0], self.orders[2]])
+        self.assertEqual(self.orders[0].status, "confirmed")
+        self.assertEqual(self.orders[1].status, "authorized")
+        self.assertEqual(report.failed[0][0], self.orders[1])
+        self.assertTrue(isinstance(report.errors[0], IcebergTransitionError))
+        self.assertIn(("POST", "/v1/merchant_order/1/confirm/", None, None), self.api_handler.requests)
+
+    def test_unknown_transition(self):
+        self.assertRaises(ValueError, self.api_handler.MerchantOrder.transition_many, self.orders, 'delete')
+        self.assertFalse(hasattr(self.api_handler.Brand, 'transition_many'))
+        self.assertRaises(ValueError, self.api_handler.Brand.resource_class.transition_many, self.api_handler, [], 'confirm')
+
+    def test_rate_limiter(self):
+        rate_limiter = RateLimiter(100)
+        start = time.time()
+        for i in xrange(11):
+            rate_limiter.wait()
+        self.assertTrue(time.time() - start >= 0.1)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+import pytz
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.catalog_mirror import CatalogMirror
+from icebergsdk.exceptions import IcebergObjectNotFound
+from icebergsdk.resources import Brand, ProductOffer
+
+
+def now():
+    return datetime.now(pytz.utc).isoformat()
+
+
+def offer(offer_id, price, last_modified, status="active", name=None):
+    return {
+        "id": offer_id,
+        "resource_uri": "/v1/productoffer/%s/" % offer_id,
+        "price": price,
+        "status": status,
+        "name": name or "Offer %s" % offer_id,
+        "merchant": {"id": offer_id % 2, "resource_uri": "/v1/merchant/%s/" % (offer_id % 2)},
+        "last_modified": last_modified,
+    }
+
+
+class FakeCatalog(object):
+    def __init__(self):
+        self.objects = {
+            "productoffer": [offer(i, i * 10, "2015-01-%02dT00:00:00" % i) for i in range(1, 26)],
+            "brand": [{"id": 1, "resource_uri": "/v1/brand/1/", "name": "Brand", "last_modified": "2015-01-01T00:00:00"}],
+        }
+        self.on_request = None
+        self.max_limit = None
+
+    def __call__(self, method, path, args, post_args):
+        if path.startswith("/v1/"):  # Object fetch
+            endpoint, object_id = path.strip("/").split("/")[1:]
+            return [obj for obj in self.objects[endpoint] if str(obj["id"]) == object_id][0]
+        if self.on_request is not None:
+            self.on_request(args.get("offset"))
+        objects = list(self.objects[path.strip("/")])
+        modified_after = args.get("last_modified__gt")
+        if modified_after:
+            objects = [obj for obj in objects if obj["last_modified"] > modified_after]
+        order_by = args.get("order_by")
+        objects.sort(key=lambda obj: obj[order_by])
+        offset, limit = args["offset"], min(args["limit"], self.max_limit or args["limit"])
+        return {
+            "meta": {"total_count": len(objects), "next": "next" if offset + limit < len(objects) else None},
+            "objects": objects[offset:offset + limit],
+        }
+
+
+class TestCatalogMirror(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.catalog = FakeCatalog()
+        self.handler = FakeIcebergAPI(self.catalog)
+        self.mirror = CatalogMirror(self.handler, os.path.join(self.tmp_dir, "catalog.db"),
+                                    endpoints=["productoffer", "brand"], page_size=10, concurrency=3)
+
+    def tearDown(self):
+        self.mirror.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_initial_load(self):
+        self.assertEqual(self.mirror.sync(), {"productoffer": 25, "brand": 1})
+        offsets = sorted(args["offset"] for method, path, args, post_args in self.handler.requests if path == "productoffer/")
+        self.assertEqual(offsets, [0, 10, 20])
+        self.assertEqual(self.mirror.count("productoffer"), 25)
+
+    def test_incremental_sync(self):
+        sync_start = now()
+        self.mirror.sync()
+        cursor = self.mirror.get_state("productoffer")["last_modified"]
+        self.assertTrue(cursor < sync_start)  # sync start minus the overlap
+
+        self.catalog.objects["productoffer"][0] = offer(1, 5, now(), name="Updated")
+        self.catalog.objects["productoffer"].append(offer(26, 260, now()))
+        del self.handler.requests[:]
+
+        self.mirror.sync_overlap = 0
+        self.assertEqual(self.mirror.sync(["productoffer"]), {"productoffer": 2})
+        self.assertEqual(self.handler.requests[0][2]["last_modified__gt"], cursor)
+        self.assertEqual(self.mirror.find("productoffer", 1).name, "Updated")
+        self.assertEqual(self.mirror.count("productoffer"), 26)
+        time.sleep(0.01)
+        self.assertEqual(self.mirror.sync(["productoffer"]), {"productoffer": 0})
+
+    def test_page_size_capped_by_api(self):
+        self.catalog.max_limit = 4
+        self.assertEqual(self.mirror.sync(["productoffer"]), {"productoffer": 25})
+        offsets = sorted(args["offset"] for method, path, args, post_args in self.handler.requests)
+        self.assertEqual(offsets, range(0, 25, 4))
+
+        for i in range(6):
+            self.catalog.objects["productoffer"][i] = offer(i + 1, 5, now(), name="Updated")
+        self.mirror.sync_overlap = 0
+        self.assertEqual(self.mirror.sync(["productoffer"]), {"productoffer": 6})
+        offers, meta = self.mirror.search("productoffer", {"name": "Updated"})
+        self.assertEqual(meta["total_count"], 6)
+
+    def test_modified_during_initial_load(self):
+        """
+        An object of a loaded page modified during the load, before an object of a later page
+        """
+        def modify(offset):
+            if offset == 10:
+                self.catalog.objects["productoffer"][0] = offer(1, 5, now(), name="Updated")
+            elif offset == 20:
+                time.sleep(0.01)
+                self.catalog.objects["productoffer"][24] = offer(25, 5, now(), name="Updated")
+        self.catalog.on_request = modify
+        self.mirror.concurrency = 1
+
+        self.mirror.sync(["productoffer"])
+        self.assertEqual(self.mirror.find("productoffer", 1).name, "Offer 1")
+        self.assertEqual(self.mirror.find("productoffer", 25).name, "Updated")
+
+        self.catalog.on_request = None
+        self.mirror.sync(["productoffer"])
+        self.assertEqual(self.mirror.find("productoffer", 1).name, "Updated")
+
+    def test_queries(self):
+        self.mirror.sync()
+        del self.handler.requests[:]
+
+        offers, meta = self.mirror.search(ProductOffer, {"price__lte": 100, "merchant__id": 1, "order_by": "-price", "limit": 3})
+        self.assertEqual([obj.id for obj in offers], [9, 7, 5])
+        self.assertEqual(meta["total_count"], 5)
+        self.assertTrue(all(isinstance(obj, ProductOffer) for obj in offers))
+
+        offers, meta = self.mirror.search("productoffer", {"id__in": "3,4", "name__icontains": "OFFER"})
+        self.assertEqual(sorted(obj.id for obj in offers), [3, 4])
+
+        self.assertEqual(self.mirror.search("productoffer", {"name__isnull": "false"})[1]["total_count"], 25)
+        self.assertEqual(self.mirror.search("productoffer", {"name__isnull": "true"})[1]["total_count"], 0)
+        self.assertEqual(self.mirror.search("productoffer", {"description__isnull": "0"})[1]["total_count"], 0)
+
+        brand = self.mirror.find(Brand, 1)
+        self.assertTrue(isinstance(brand, Brand))
+        self.assertIs(brand, self.mirror.find("brand", 1))  # Mirror identity map
+        self.assertRaises(IcebergObjectNotFound, self.mirror.find, Brand, 2)
+        self.assertEqual(self.handler.requests, [])
+
+    def test_objects_detached_from_handler(self):
+        self.mirror.sync()
+        live_offer = self.handler.ProductOffer.findOrCreate(offer(1, 15, now(), name="Live"))
+
+        mirror_offer = self.mirror.find(ProductOffer, 1)
+        self.assertIsNot(mirror_offer, live_offer)
+        self.assertEqual(mirror_offer.name, "Offer 1")
+        self.assertEqual(live_offer.name, "Live")
+        self.assertIs(self.handler.ProductOffer.findOrCreate({"id": 1, "resource_uri": "/v1/productoffer/1/"}), live_offer)
+
+        # Requests still go through the handler
+        mirror_offer.fetch()
+        self.assertEqual(self.handler.requests[-1][1], "/v1/productoffer/1/")
+
+    def test_reset(self):
+        self.mirror.sync()
+        self.mirror.reset("productoffer")
+        self.assertEqual(self.mirror.count("productoffer"), 0)
+        self.assertEqual(self.mirror.sync(["productoffer"]), {"productoffer": 25})
+
+
+if __name__ == '__main__':
+    unittest.main()
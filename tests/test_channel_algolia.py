@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import pytz
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.conf import Configuration, ConfigurationDebugSandbox
+from icebergsdk.utils.algolia_utils import AlgoliaIndexCache
+
+
+class FakeAlgoliaClient(object):
+    def __init__(self, index, api_key):
+        self.index = index
+        self.api_key = api_key
+
+    def initIndex(self, index_name):
+        return self.index
+
+
+class FakeAlgoliaIndex(object):
+    """
+    Local index implementing the parts of algoliasearch Index used by ProductChannel
+    """
+    def __init__(self, objects):
+        self.objects = dict((str(obj["objectID"]), obj) for obj in objects)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_object(self, object_id):
+        with self._lock:
+            self.calls.append(("get_object", object_id))
+        return self.objects[str(object_id)]
+
+    def get_objects(self, object_ids):
+        with self._lock:
+            self.calls.append(("get_objects", list(object_ids)))
+        return {"results": [self.objects.get(str(object_id)) for object_id in object_ids]}
+
+    def browse_from(self, params, cursor=None):
+        """
+        Supports a query on the name and "attribute:value" filters joined by AND
+        """
+        with self._lock:
+            self.calls.append(("browse_from", cursor))
+        hits = sorted(self.objects.values(), key=lambda obj: obj["id"])
+        hits = [hit for hit in hits if params.get("query", "").lower() in hit["name"].lower()]
+        for condition in filter(None, params.get("filters", "").split(" AND ")):
+            attribute, value = condition.split(":")
+            hits = [hit for hit in hits if str(hit.get(attribute)) == value]
+
+        start = int(cursor or 0)
+        end = start + params["hitsPerPage"]
+        result = {"hits": hits[start:end]}
+        if end < len(hits):
+            result["cursor"] = str(end)
+        return result
+
+
+def product_data(product_id):
+    return {
+        "objectID": str(product_id),
+        "id": product_id,
+        "resource_uri": "/v1/product/%s/" % product_id,
+        "name": "Product %s" % product_id,
+        "gender": "W" if product_id % 2 else "M",
+    }
+
+
+def channel_data(expiration_date, api_key="key-1"):
+    return {
+        "id": 1,
+        "resource_uri": "/v1/product_channel/1/",
+        "algolia_application_id": "APP",
+        "algolia_api_key": api_key,
+        "algolia_index_name": "channel_1",
+        "algolia_api_key_expiration_date": expiration_date.isoformat(),
+    }
+
+
+class ChannelAlgoliaTest(unittest.TestCase):
+    def setUp(self):
+        self.api_handler = FakeIcebergAPI()
+        self.channel = self.api_handler.ProductChannel.findOrCreate(
+            channel_data(datetime(2100, 1, 1, tzinfo=pytz.utc))
+        )
+        self.index = FakeAlgoliaIndex([product_data(i) for i in xrange(1, 26)])
+        self.channel._algolia_index_cache = AlgoliaIndexCache(
+            client_factory=lambda application_id, api_key: FakeAlgoliaClient(self.index, api_key)
+        )
+
+    def tearDown(self):
+        self.channel._algolia_index_cache.clear()
+
+    def test_find_many(self):
+        products = self.channel.algolia_find_many(range(1, 31), chunk_size=10, concurrency=3)
+
+        self.assertEqual([product.id for product in products], range(1, 26))
+        self.assertEqual(products[0].name, "Product 1")
+        self.assertEqual([call[0] for call in self.index.calls], ["get_objects"] * 3)
+        # hydrated in the handler identity map
+        self.assertTrue(products[0] is self.api_handler.Product.findOrCreate(product_data(1)))
+
+    def test_fetch_many(self):
+        products = [self.api_handler.Product.findOrCreate({"id": i, "resource_uri": "/v1/product/%s/" % i})
+                    for i in (3, 4, 50)]
+        self.channel.algolia_fetch_many(products)
+
+        self.assertEqual(products[0].name, "Product 3")
+        self.assertEqual(products[1].name, "Product 4")
+        self.assertFalse(hasattr(products[2], "name"))
+        self.assertEqual(len(self.index.calls), 1)
+
+    def test_browse(self):
+        products = self.channel.algolia_browse("product", filters="gender:W", hits_per_page=5)
+        first_product = next(products)
+        self.assertEqual(first_product.id, 1)
+        self.assertEqual(len(self.index.calls), 1)  # pages are fetched lazily
+
+        self.assertEqual([product.id for product in products], range(3, 26, 2))
+        self.assertEqual(len(self.index.calls), 3)
+
+    def test_browse_raw(self):
+        hits = list(self.channel.algolia_browse("Product 2", raw_result=True, hits_per_page=3))
+        self.assertEqual([hit["id"] for hit in hits], [2] + range(20, 26))
+
+
+class AlgoliaIndexCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.api_keys = iter(["key-2", "key-3"])
+
+        def responder(method, path, args, post_args):
+            time.sleep(0.05)
+            return channel_data(datetime.now(pytz.utc) + timedelta(minutes=30), api_key=next(self.api_keys))
+
+        self.api_handler = FakeIcebergAPI(responder)
+        self.clients = []
+
+        def client_factory(application_id, api_key):
+            client = FakeAlgoliaClient(FakeAlgoliaIndex([]), api_key)
+            self.clients.append(client)
+            return client
+
+        self.cache = AlgoliaIndexCache(refresh_margin=20 * 60, client_factory=client_factory)
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def test_shared_index(self):
+        channel = self.api_handler.ProductChannel.findOrCreate(channel_data(datetime(2100, 1, 1, tzinfo=pytz.utc)))
+        other_channel = self.api_handler.ProductChannel()
+        other_channel._load_attributes_from_response(**channel_data(datetime(2100, 1, 1, tzinfo=pytz.utc)))
+
+        self.assertTrue(self.cache.get_index(channel) is self.cache.get_index(other_channel))
+        self.assertEqual(len(self.clients), 1)
+        self.assertEqual(self.api_handler.requests, [])
+
+    def test_single_flight_refresh(self):
+        """
+        An expiring key is refreshed once, whatever the number of threads asking for the index
+        """
+        channel = self.api_handler.ProductChannel.findOrCreate(
+            channel_data(datetime.now(pytz.utc) + timedelta(minutes=5))
+        )
+        indexes = []
+        threads = [threading.Thread(target=lambda: indexes.append(self.cache.get_index(channel))) for i in xrange(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.api_handler.requests), 1)
+        self.assertEqual([client.api_key for client in self.clients], ["key-2"])
+        self.assertEqual(len(set(id(index) for index in indexes)), 1)
+
+    def test_background_refresh(self):
+        channel = self.api_handler.ProductChannel.findOrCreate(
+            channel_data(datetime.now(pytz.utc) + timedelta(minutes=20, seconds=0.2))
+        )
+        index = self.cache.get_index(channel)
+        self.assertEqual(self.api_handler.requests, [])
+
+        time.sleep(0.3)
+        # Expiring: the current index is returned, the asking channel is fetched in the background
+        self.assertTrue(self.cache.get_index(channel) is index)
+        time.sleep(0.3)
+        self.assertEqual(len(self.api_handler.requests), 1)
+        self.assertEqual([client.api_key for client in self.clients], ["key-1", "key-2"])
+        self.assertEqual(channel.algolia_api_key, "key-2")
+        self.assertFalse(self.cache.get_index(channel) is index)
+
+    def test_refresh_with_asking_handler(self):
+        """
+        The cache doesn't keep the channel (nor its handler): the channel asking refreshes the key
+        """
+        channel = self.api_handler.ProductChannel.findOrCreate(channel_data(datetime(2100, 1, 1, tzinfo=pytz.utc)))
+        self.cache.get_index(channel)
+        self.cache._entries.values()[0]['expiration_date'] = datetime.now(pytz.utc) - timedelta(seconds=1)
+
+        other_handler = FakeIcebergAPI(lambda *args: channel_data(datetime.now(pytz.utc) + timedelta(hours=1)))
+        other_channel = other_handler.ProductChannel.findOrCreate(
+            channel_data(datetime.now(pytz.utc) - timedelta(minutes=1))
+        )
+        self.cache.get_index(other_channel)
+
+        self.assertEqual(self.api_handler.requests, [])
+        self.assertEqual(len(other_handler.requests), 1)
+
+    def test_cache_key_by_api(self):
+        channel = self.api_handler.ProductChannel.findOrCreate(channel_data(datetime(2100, 1, 1, tzinfo=pytz.utc)))
+        prod_handler = FakeIcebergAPI(conf=Configuration)
+        prod_channel = prod_handler.ProductChannel.findOrCreate(channel_data(datetime(2100, 1, 1, tzinfo=pytz.utc)))
+
+        self.assertEqual(channel._handler.conf.ICEBERG_ENV, prod_channel._handler.conf.ICEBERG_ENV)
+        self.assertFalse(self.cache.get_index(channel) is self.cache.get_index(prod_channel))
+        self.assertEqual(len(self.clients), 2)
+
+    def test_cache_key_by_environment(self):
+        channel = self.api_handler.ProductChannel.findOrCreate(channel_data(datetime(2100, 1, 1, tzinfo=pytz.utc)))
+        sandbox_handler = FakeIcebergAPI(conf=ConfigurationDebugSandbox)
+        sandbox_channel = sandbox_handler.ProductChannel.findOrCreate(channel_data(datetime(2100, 1, 1, tzinfo=pytz.utc)))
+
+        self.assertEqual(channel._handler.conf.ICEBERG_API_URL_FULL, sandbox_channel._handler.conf.ICEBERG_API_URL_FULL)
+        self.assertFalse(self.cache.get_index(channel) is self.cache.get_index(sandbox_channel))
+        self.assertEqual(len(self.clients), 2)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.utils.checkpoint import FileCheckpoint
+
+
+class ChannelIterProductsTest(unittest.TestCase):
+    def setUp(self):
+        self.number_of_products = 45
+
+        def responder(method, path, args, post_args):
+            end = min(args['offset'] + args['limit'], self.number_of_products)
+            return [
+                {"id": i, "resource_uri": "/v1/product/%s/" % i, "name": "Product %s" % i}
+                for i in xrange(args['offset'], end)
+            ]
+
+        self.api_handler = FakeIcebergAPI(responder)
+        self.channel = self.api_handler.ProductChannel.findOrCreate({
+            "id": 1, "resource_uri": "/v1/product_channel/1/"
+        })
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_iter_products(self):
+        products = list(self.channel.iter_products(page_size=10, parallel=3))
+        self.assertEqual([product.id for product in products], range(45))
+        self.assertEqual(products[0].name, "Product 0")
+        self.assertEqual(products[0].__class__.__name__, "Product")
+
+    def test_iter_raw_products(self):
+        products = list(self.channel.iter_products(page_size=15, raw_result=True))
+        self.assertEqual([product["id"] for product in products], range(45))
+        self.assertEqual(type(products[0]), dict)
+
+    def test_resume_from_checkpoint(self):
+        checkpoint = FileCheckpoint(os.path.join(self.tmp_dir, "export.json"))
+
+        products = self.channel.iter_products(page_size=10, raw_result=True, checkpoint=checkpoint)
+        for i in xrange(25):  # interrupted in the 3rd page
+            next(products)
+        products.close()
+        self.assertEqual(checkpoint.load(), {"offset": 20, "done": False})
+
+        resumed = list(self.channel.iter_products(page_size=10, raw_result=True, checkpoint=checkpoint))
+        self.assertEqual([product["id"] for product in resumed], range(20, 45))
+        self.assertEqual(checkpoint.load(), {"offset": 45, "done": True})
+        self.assertEqual(list(self.channel.iter_products(page_size=10, checkpoint=checkpoint)), [])
+
+    def test_page_size_capped_by_api(self):
+        responder = self.api_handler.responder
+
+        def capped_responder(method, path, args, post_args):
+            return responder(method, path, dict(args, limit=min(args['limit'], 7)), post_args)
+
+        self.api_handler.responder = capped_responder
+        products = list(self.channel.iter_products(page_size=10, parallel=3, raw_result=True))
+        self.assertEqual([product["id"] for product in products], range(45))
+
+    def test_meta_next(self):
+        def listing_responder(method, path, args, post_args):
+            objects = [{"id": i, "resource_uri": "/v1/product/%s/" % i} for i in xrange(args['offset'], min(args['offset'] + args['limit'], 25))]
+            return {"meta": {"next": "next" if args['offset'] + args['limit'] < 25 else None}, "objects": objects}
+
+        self.api_handler.responder = listing_responder
+        products = list(self.channel.iter_products(page_size=10, raw_result=True))
+        self.assertEqual([product["id"] for product in products], range(25))
+        self.assertEqual([request[2]['offset'] for request in self.api_handler.requests], [0, 10, 20])
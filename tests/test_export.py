@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.export import CSVSink, Export, NDJSONSink, PartitionedExport
+from icebergsdk.resources import MerchantOrder
+from icebergsdk.utils.checkpoint import FileCheckpoint
+
+ORDERS = [{
+    "id": i,
+    "resource_uri": "/v1/merchant_order/%s/" % i,
+    "status": "80",
+    "amount": i * 10,
+    "user": {"id": 100 + i, "username": u"user-é%s" % i},
+    "created_on": (datetime(2015, 1, 1) + timedelta(hours=5 * i)).isoformat(),
+} for i in range(1, 24)]
+
+
+class Server(object):
+    def __init__(self, fail_on_call=None, max_limit=None, with_next=True):
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+        self.max_limit = max_limit
+        self.with_next = with_next
+
+    def __call__(self, method, path, args, post_args):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise ValueError("Connection lost")
+
+        objects = ORDERS
+        if "id__gt" in args:
+            objects = [obj for obj in objects if obj["id"] > args["id__gt"]]
+        if "created_on__gte" in args:
+            objects = [obj for obj in objects if args["created_on__gte"] <= obj["created_on"] < args["created_on__lt"]]
+        offset = args.get("offset", 0)
+        limit = min(args["limit"], self.max_limit or args["limit"])
+        meta = {}
+        if self.with_next:
+            meta["next"] = "next" if offset + limit < len(objects) else None
+        return {"meta": meta, "objects": objects[offset:offset + limit]}
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "orders.ndjson")
+        self.checkpoint = FileCheckpoint(self.path + ".checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read_ids(self, path):
+        with open(path) as export_file:
+            return [json.loads(line)["id"] for line in export_file]
+
+    def test_resume_after_crash(self):
+        server = Server(fail_on_call=3)
+        export = Export(FakeIcebergAPI(server), MerchantOrder, NDJSONSink(self.path), page_size=5, checkpoint=self.checkpoint)
+        self.assertRaises(ValueError, export.run)
+        self.assertEqual(self.checkpoint.load()["last_id"], 10)
+
+        # Simulate a page written without checkpoint before the crash
+        with open(self.path, "ab") as export_file:
+            export_file.write('{"id": 11}\n')
+
+        self.assertEqual(export.run(), 23)
+        self.assertEqual(self.read_ids(self.path), range(1, 24))
+        self.assertEqual(server.calls, 3 + 3)
+        self.assertTrue(self.checkpoint.load()["done"])
+        self.assertEqual(export.run(), 23)  # Already done
+        self.assertEqual(server.calls, 6)
+
+    def test_limit_capped_by_api(self):
+        for with_next in (True, False):
+            handler = FakeIcebergAPI(Server(max_limit=4, with_next=with_next))
+            export = Export(handler, MerchantOrder, NDJSONSink(self.path), page_size=10, checkpoint=self.checkpoint)
+            self.assertEqual(export.run(), 23)
+            self.assertEqual(self.read_ids(self.path), range(1, 24))
+            self.assertEqual(len(handler.requests), 6 if with_next else 7)  # Without meta.next: up to an empty page
+            self.checkpoint.clear()
+
+    def test_offset_cursor(self):
+        handler = FakeIcebergAPI(Server())
+        export = Export(handler, "merchant_order", NDJSONSink(self.path), filters={"status": "80"}, page_size=10, cursor="offset")
+        self.assertEqual(export.run(), 23)
+        self.assertEqual([args["offset"] for method, path, args, post_args in handler.requests], [0, 10, 20])
+        self.assertEqual(handler.requests[0][2]["status"], "80")
+        self.assertEqual(self.read_ids(self.path), range(1, 24))
+
+    def test_csv_sink(self):
+        path = os.path.join(self.tmp_dir, "orders.csv")
+        sink = CSVSink(path, ["id", "amount", "user.username", "missing"])
+        Export(FakeIcebergAPI(Server()), "merchant_order", sink, page_size=10).run()
+
+        with open(path) as export_file:
+            rows = list(csv.reader(export_file))
+        self.assertEqual(rows[0], ["id", "amount", "user.username", "missing"])
+        self.assertEqual(rows[1], ["1", "10", "user-\xc3\xa91", ""])
+        self.assertEqual(len(rows), 24)
+
+    def test_partitioned_export(self):
+        server = Server(fail_on_call=2)
+        export = PartitionedExport(FakeIcebergAPI(server), "merchant_order", "created_on",
+                                   datetime(2015, 1, 1), datetime(2015, 1, 6), output_dir=os.path.join(self.tmp_dir, "exports"),
+                                   page_size=3, concurrency=1)
+        self.assertEqual(len(export.partitions()), 5)
+
+        report = export.run()
+        self.assertEqual(len(report.failed), 1)
+
+        report = export.run()  # Resumes the failed partition
+        self.assertFalse(report.has_errors())
+        self.assertEqual(sum(report.succeeded), 23)
+
+        ids = []
+        for filename in sorted(os.listdir(export.output_dir)):
+            if filename.endswith(".ndjson"):
+                ids.extend(self.read_ids(os.path.join(export.output_dir, filename)))
+        self.assertEqual(ids, range(1, 24))
+
+    def test_csv_partitions_require_fields(self):
+        self.assertRaises(ValueError, PartitionedExport, None, "order", "created_on",
+                          datetime(2015, 1, 1), datetime(2015, 1, 2), output_dir=self.tmp_dir, format="csv")
+
+
+if __name__ == '__main__':
+    unittest.main()
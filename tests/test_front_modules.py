@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from icebergsdk.conf import ConfigurationDebug
+from icebergsdk.front_modules import FrontModules
+from icebergsdk.utils.instrumentation import register_hook, unregister_hook
+
+
+class DictCache(object):
+    """
+    Minimal django-like cache
+    """
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+
+class FakeFrontModules(FrontModules):
+    delay = 0
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('conf', ConfigurationDebug)
+        super(FakeFrontModules, self).__init__(*args, **kwargs)
+        self.requests = []
+
+    def request(self, path, args=None, post_args=None, files=None, method=None, headers=None):
+        self.requests.append(args)
+        time.sleep(self.delay)
+        return {"modules": {"version": len(self.requests)}}
+
+
+class TestFrontModulesCache(unittest.TestCase):
+    def setUp(self):
+        FrontModules._local_caches.clear()
+
+    def age_entry(self, modules, age):
+        entry = modules.local_cache.get(modules.cache_key)
+        entry['fetched_at'] = time.time() - age
+
+    def test_fresh_data_served_from_local_cache(self):
+        modules = FakeFrontModules(cache=DictCache())
+        self.assertEqual(modules.get_module_data("version"), 1)
+        self.assertEqual(modules.get_module_data("version"), 1)
+        self.assertEqual(len(modules.requests), 1)
+        self.assertIn(modules.cache_key, modules.cache.data)
+
+    def test_shared_cache_fills_local_cache(self):
+        cache = DictCache()
+        FakeFrontModules(cache=cache).modules_data
+        FrontModules._local_caches.clear()
+
+        modules = FakeFrontModules(cache=cache)
+        self.assertEqual(modules.get_module_data("version"), 1)
+        self.assertEqual(len(modules.requests), 0)
+
+    def test_stale_data_served_while_refreshing(self):
+        modules = FakeFrontModules()
+        modules.modules_data
+        self.age_entry(modules, modules.cache_soft_expire + 1)
+
+        self.assertEqual(modules.get_module_data("version"), 1)  # Stale
+        for _ in range(50):
+            if modules.local_cache.get(modules.cache_key)['data']['modules']['version'] == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(modules.get_module_data("version"), 2)
+
+    def test_expired_data_downloaded(self):
+        modules = FakeFrontModules()
+        modules.modules_data
+        self.age_entry(modules, modules.cache_hard_expire + 1)
+        self.assertEqual(modules.get_module_data("version"), 2)
+
+    def test_cache_expire_alias(self):
+        modules = FakeFrontModules()
+        self.assertEqual(modules.cache_expire, modules.cache_soft_expire)
+        modules.cache_expire = 60
+        self.assertEqual(modules.cache_soft_expire, 60)
+
+        class ShortCacheFrontModules(FakeFrontModules):
+            cache_expire = 30
+        self.assertEqual(ShortCacheFrontModules().cache_soft_expire, 30)
+
+    def test_legacy_entry_untouched(self):
+        """
+        The entries of the previous versions (data without wrapper) are under another key,
+        still read by the workers not upgraded yet
+        """
+        modules = FakeFrontModules(cache=DictCache())
+        legacy_key = "icebergsdk:frontmodule:data:en:%s:False" % modules.conf.ICEBERG_ENV
+        modules.cache.data[legacy_key] = {"modules": {"version": 0}}
+        self.assertEqual(modules.get_module_data("version"), 1)
+        self.assertEqual(modules.cache.data[legacy_key], {"modules": {"version": 0}})
+
+    def test_local_cache_by_configuration(self):
+        class OtherConfiguration(ConfigurationDebug):
+            ICEBERG_MODULES_URL = "http://connect.other.iceberg-marketplace.com/modules/"
+
+        modules = FakeFrontModules()
+        other_modules = FakeFrontModules(conf=OtherConfiguration)
+        self.assertIsNot(modules.local_cache, other_modules.local_cache)
+        self.assertIs(modules.local_cache, FakeFrontModules(lang="fr").local_cache)
+        self.assertNotEqual(modules.cache_key, other_modules.cache_key)
+
+        modules.modules_data
+        other_modules.modules_data
+        self.assertEqual(len(other_modules.requests), 1)
+
+    def test_concurrent_misses_coalesced(self):
+        modules = FakeFrontModules()
+        modules.delay = 0.1
+        results = []
+
+        def load():
+            results.append(modules.get_module_data("version"))
+
+        threads = [threading.Thread(target=load) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(len(modules.requests), 1)
+
+
+class FailingFrontModules(FakeFrontModules):
+    def request(self, *args, **kwargs):
+        if self.lang == "xx":
+            raise ValueError("Unknown lang")
+        return super(FailingFrontModules, self).request(*args, **kwargs)
+
+
+class TestFrontModulesWarmUp(unittest.TestCase):
+    def setUp(self):
+        FrontModules._local_caches.clear()
+
+    def test_warm_up_fills_caches(self):
+        cache = DictCache()
+        events = []
+        on_warm_up = lambda event_name, data: events.append(data)
+        register_hook("frontmodules_warm_up", on_warm_up)
+        try:
+            report = FailingFrontModules.warm_up(iter(["en", "fr", "xx"]), concurrency=3, cache=cache)
+        finally:
+            unregister_hook("frontmodules_warm_up", on_warm_up)
+
+        self.assertEqual(report.succeeded, ["en", "fr"])
+        self.assertEqual([lang for lang, error in report.failed], ["xx"])
+        self.assertTrue(report.elapsed >= 0)
+        self.assertEqual(events[0]["langs"], ["en", "fr", "xx"])
+        self.assertEqual(events[0]["failed"], ["xx"])
+        self.assertEqual(events[0]["elapsed"], report.elapsed)
+
+        for lang in ("en", "fr"):
+            modules = FakeFrontModules(lang=lang, cache=cache)
+            self.assertIn(modules.cache_key, cache.data)
+            modules.modules_data
+            self.assertEqual(modules.requests, [])  # Served by the local cache
+
+    def test_warm_up_force(self):
+        FakeFrontModules.warm_up(["en"])
+        modules = FakeFrontModules(lang="en")
+        first_fetch = modules.local_cache.get(modules.cache_key)['fetched_at']
+        time.sleep(0.01)
+        FakeFrontModules.warm_up(["en"], force=True)
+        self.assertTrue(modules.local_cache.get(modules.cache_key)['fetched_at'] > first_fetch)
+
+
+if __name__ == '__main__':
+    unittest.main()
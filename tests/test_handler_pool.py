@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.conf import ConfigurationDebug
+from icebergsdk.handler_pool import HandlerPool
+
+
+class PoolConfiguration(ConfigurationDebug):
+    ICEBERG_APPLICATION_NAMESPACE = "test-app"
+    ICEBERG_APPLICATION_SECRET_KEY = "secret"
+    ICEBERG_API_PRIVATE_KEY = "private"
+
+
+class AuthServer(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.logins = []
+        self.lock = threading.Lock()
+
+    def __call__(self, method, path, args, post_args):
+        if path in ('user/sso/', 'user/auth/'):
+            time.sleep(self.delay)
+            with self.lock:
+                self.logins.append(args.get('username') or args['email'])
+                count = len(self.logins)
+            return {"username": args.get('username') or args['email'].split("@")[0], "access_token": "token-%s" % count}
+        raise ValueError(path)
+
+
+class TestHandlerPool(unittest.TestCase):
+    def setUp(self):
+        self.server = AuthServer()
+        self.pool = HandlerPool(conf=PoolConfiguration, handler_class=FakeIcebergAPI, responder=self.server)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_handlers_cached_per_user(self):
+        handler_a = self.pool.sso_user_handler("a@example.com", first_name="A")
+        handler_b = self.pool.sso_user_handler("b@example.com")
+
+        self.assertIs(self.pool.sso_user_handler("a@example.com"), handler_a)
+        self.assertIsNot(handler_a, handler_b)
+        self.assertEqual(self.server.logins, ["a@example.com", "b@example.com"])
+        self.assertEqual((handler_a.username, handler_a.access_token), ("a", "token-1"))
+        self.assertIs(handler_a.session, handler_b.session)
+        self.assertIsNot(handler_a._objects_store, handler_b._objects_store)
+
+    def test_auth_user_handler(self):
+        handler = self.pool.auth_user_handler("staff", "staff@example.com")
+        self.assertEqual(handler.username, "staff")
+        self.assertEqual(handler._auth_response["access_token"], "token-1")
+
+    def test_expired_token_renewed_on_same_handler(self):
+        handler = self.pool.sso_user_handler("a@example.com")
+        handler.token_expires_at = time.time() - 1
+
+        self.assertIs(self.pool.sso_user_handler("a@example.com"), handler)
+        self.assertEqual(handler.access_token, "token-2")
+
+    def test_invalidate(self):
+        self.pool.sso_user_handler("a@example.com")
+        self.pool.invalidate("a@example.com")
+        self.pool.sso_user_handler("a@example.com")
+        self.assertEqual(len(self.server.logins), 2)
+
+    def test_concurrent_logins_coalesced(self):
+        self.server.delay = 0.1
+        handlers = []
+        threads = [threading.Thread(target=lambda: handlers.append(self.pool.sso_user_handler("a@example.com")))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.server.logins), 1)
+        self.assertEqual(len(set(id(handler) for handler in handlers)), 1)
+
+    def test_background_refresh(self):
+        pool = HandlerPool(conf=PoolConfiguration, handler_class=FakeIcebergAPI, responder=self.server,
+                           token_ttl=60, refresh_margin=120, refresh_interval=0.05)
+        handler = pool.sso_user_handler("a@example.com")
+        pool.start()
+        try:
+            for _ in range(100):
+                if handler.access_token != "token-1":
+                    break
+                time.sleep(0.01)
+        finally:
+            pool.stop()
+        self.assertNotEqual(handler.access_token, "token-1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from io import BytesIO
+
+import requests
+
+from icebergsdk.api import IcebergAPI
+from icebergsdk.conf import ConfigurationDebug
+from icebergsdk.exceptions import IcebergServerError
+from icebergsdk.resources import ProductOffer, ProductOfferImage
+from icebergsdk.utils.multipart import MultipartEncoder, MultipartFile
+
+IMAGE_BYTES = b"\x89PNG" + b"0123456789" * 20000
+
+
+class FakeResponse(object):
+    status_code = 201
+    elapsed = timedelta(seconds=0)
+
+    def __init__(self, data):
+        self.content = json.dumps(data)
+        self.text = self.content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class RecordingSession(object):
+    """
+    Session reading the uploaded body chunk by chunk, like the http connection does
+    """
+    def __init__(self):
+        self.requests = []
+
+    def request(self, method, url, timeout=None, params=None, data=None, files=None, headers=None):
+        chunks = []
+        while True:
+            chunk = data.read(8192)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.requests.append({"method": method, "url": url, "headers": headers, "body": b"".join(chunks),
+                              "length": len(data), "chunks": len(chunks)})
+        return FakeResponse({"id": 4, "resource_uri": "/v1/offer_image/4/"})
+
+
+class TestMultipartEncoder(unittest.TestCase):
+    def test_body(self):
+        progress = []
+        encoder = MultipartEncoder({"image": MultipartFile(b"abc", filename="photo.jpg")}, fields={"name": u"é"},
+                                   progress=lambda sent, total, speed: progress.append((sent, total)))
+        body = encoder.read()
+
+        self.assertEqual(len(body), len(encoder))
+        self.assertIn('Content-Disposition: form-data; name="image"; filename="photo.jpg"\r\nContent-Type: image/jpeg\r\n\r\nabc\r\n', body)
+        self.assertIn('name="name"\r\n\r\n\xc3\xa9\r\n', body)
+        self.assertTrue(body.endswith("--%s--\r\n" % encoder.boundary))
+        self.assertEqual(progress, [(len(body), len(body))])
+        self.assertEqual(encoder.read(10), b"")
+
+    def test_not_seekable_source(self):
+        class Stream(object):
+            def __init__(self):
+                self.buffer = BytesIO(b"data")
+
+            def read(self, size=-1):
+                return self.buffer.read(size)
+
+        multipart_file = MultipartFile(Stream())
+        self.assertEqual(multipart_file.size, 4)
+        self.assertEqual(multipart_file.filename, "image")
+
+
+class TestSendImage(unittest.TestCase):
+    def setUp(self):
+        self.session = RecordingSession()
+        self.handler = IcebergAPI(conf=ConfigurationDebug, session=self.session)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check_upload(self, filename):
+        request = self.session.requests[-1]
+        self.assertEqual(request["method"], "post")
+        self.assertTrue(request["headers"]["Content-Type"].startswith("multipart/form-data; boundary="))
+        self.assertEqual(len(request["body"]), request["length"])
+        self.assertTrue(request["chunks"] > 1)  # Streamed
+        self.assertIn('filename="%s"' % filename, request["body"])
+        self.assertIn(IMAGE_BYTES, request["body"])
+
+    def test_send_image_from_path(self):
+        image_path = os.path.join(self.tmp_dir, "photo.png")
+        with open(image_path, "wb") as image_file:
+            image_file.write(IMAGE_BYTES)
+
+        opened = []
+        original_init = MultipartFile.__init__
+
+        def init(multipart_file, *args, **kwargs):
+            original_init(multipart_file, *args, **kwargs)
+            opened.append(multipart_file.fileobj)
+
+        MultipartFile.__init__ = init
+        try:
+            self.handler.send_image("offer/1/add_image/", image_path)
+        finally:
+            MultipartFile.__init__ = original_init
+
+        self.check_upload("photo.png")
+        self.assertIn("Content-Type: image/png", self.session.requests[-1]["body"])
+        self.assertTrue(opened[0].closed)
+
+    def test_add_image_from_buffer(self):
+        progress = []
+        offer = ProductOffer(handler=self.handler)
+        offer.resource_uri = "/v1/productoffer/1/"
+        buffer = BytesIO(IMAGE_BYTES)
+
+        image = offer.add_image(image=buffer, filename="photo.png", progress=lambda *args: progress.append(args))
+
+        self.assertTrue(isinstance(image, ProductOfferImage))
+        self.assertEqual(image.id, 4)
+        self.check_upload("photo.png")
+        self.assertTrue(self.session.requests[-1]["url"].endswith("/v1/productoffer/1/add_image/"))
+        self.assertFalse(buffer.closed)
+        self.assertEqual(progress[-1][0], progress[-1][1])
+
+    def test_send_image_from_bytes(self):
+        self.handler.send_image("offer/1/add_image/", image=IMAGE_BYTES)
+        self.check_upload("image")
+
+    def test_missing_image(self):
+        self.assertRaises(ValueError, self.handler.send_image, "offer/1/add_image/")
+
+
+class FlakySession(object):
+    """
+    Session failing the first upload of the urls in fail_urls, with a connection
+    timeout or a server error
+    """
+    def __init__(self, fail_urls=(), error="timeout"):
+        self.uploads = []
+        self.attempts = []
+        self.fail_urls = set(fail_urls)
+        self.error = error
+        self.lock = threading.Lock()
+
+    def request(self, method, url, timeout=None, params=None, data=None, files=None, headers=None):
+        body = data.read()
+        with self.lock:
+            self.attempts.append(url)
+            if url.split("/v1/")[1] in self.fail_urls:
+                self.fail_urls.remove(url.split("/v1/")[1])
+                if self.error == "timeout":
+                    raise requests.ConnectTimeout("connect timeout")
+                response = FakeResponse({"error": "unavailable"})
+                response.status_code = 503
+                return response
+            self.uploads.append((url, body))
+            image_id = len(self.uploads)
+        return FakeResponse({"id": image_id, "resource_uri": "/v1/offer_image/%s/" % image_id})
+
+
+class TestAddImages(unittest.TestCase):
+    def setUp(self):
+        self.session = FlakySession()
+        self.handler = IcebergAPI(conf=ConfigurationDebug, session=self.session)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def offer(self, offer_id):
+        offer = ProductOffer(handler=self.handler)
+        offer.resource_uri = "/v1/productoffer/%s/" % offer_id
+        return offer
+
+    def test_add_images(self):
+        self.session.fail_urls.add("productoffer/3/add_image/")
+        image_path = os.path.join(self.tmp_dir, "photo.png")
+        with open(image_path, "wb") as image_file:
+            image_file.write(IMAGE_BYTES)
+
+        offer_1, offer_2, offer_3 = self.offer(1), self.offer(2), self.offer(3)
+        buffer = BytesIO(b"other image")
+        images = [
+            (offer_1, image_path),
+            (offer_1, bytearray(IMAGE_BYTES)),  # Same content as the file
+            (offer_2, image_path),  # Other offer: uploaded again
+            (offer_3, buffer),
+        ]
+        report = self.handler.ProductOffer.add_images(images, concurrency=1, retry_delay=0)
+
+        self.assertEqual(report.skipped, [images[1]])
+        self.assertEqual(len(report.succeeded), 3)
+        self.assertFalse(report.has_errors())
+        self.assertTrue(all(isinstance(image, ProductOfferImage) for image in report.succeeded))
+        uploads = [(url.split("/v1/")[1], body) for url, body in self.session.uploads]
+        self.assertEqual([url for url, body in uploads], [
+            "productoffer/1/add_image/", "productoffer/2/add_image/", "productoffer/3/add_image/"])
+        self.assertIn(b"other image", uploads[2][1])  # Buffer sent again after the connection timeout
+
+    def test_invalid_images_reported(self):
+        offer = self.offer(1)
+        buffer = BytesIO(b"shared image")
+        missing_path = os.path.join(self.tmp_dir, "missing.png")
+        images = [
+            (offer, missing_path),
+            (offer, IMAGE_BYTES),  # Not a bytearray: a missing path
+            (offer, buffer),
+            (self.offer(2), buffer),  # Same file-like object
+        ]
+        report = self.handler.ProductOffer.add_images(images, concurrency=2)
+
+        self.assertEqual(len(report.succeeded), 1)
+        failed = dict((image if not hasattr(image, 'read') else id(image), error)
+                      for (offer, image), error in report.failed)
+        self.assertTrue(isinstance(failed[missing_path], IOError))
+        self.assertTrue(isinstance(failed[IMAGE_BYTES], IOError))
+        self.assertTrue(isinstance(failed[id(buffer)], ValueError))
+        self.assertEqual(len(self.session.uploads), 1)
+        self.assertNotIn(missing_path, self.session.uploads[0][1])
+
+    def test_server_errors_not_retried(self):
+        self.session.fail_urls.add("productoffer/1/add_image/")
+        self.session.error = "server"
+        report = self.handler.ProductOffer.add_images([(self.offer(1), bytearray(IMAGE_BYTES))], retry_delay=0)
+        self.assertEqual(report.succeeded, [])
+        self.assertTrue(isinstance(report.errors[0], IcebergServerError))
+        self.assertEqual(len(self.session.attempts), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.resources import ProductOfferImage
+from icebergsdk.resources.product import IMAGE_VARIANTS, IMG_MEDIUM_WIDTH
+from icebergsdk.utils.image_server_utils import build_resized_image_url
+
+IMAGE_SERVER_URL = "https://images.example.com"
+
+
+class TestImageVariantUrls(unittest.TestCase):
+    def setUp(self):
+        self.handler = FakeIcebergAPI()
+        self.handler.conf = type("Conf", (self.handler.conf,), {"IMAGE_SERVER_URL": IMAGE_SERVER_URL})
+
+    def image(self, url):
+        return ProductOfferImage.findOrCreate(self.handler, {
+            "id": abs(hash(url)), "resource_uri": "/v1/offer_image/%s/" % abs(hash(url)), "url": url})
+
+    def test_sizes_are_ints(self):
+        self.assertEqual(IMG_MEDIUM_WIDTH, 600)
+        self.assertTrue(all(isinstance(size, int) for width, height, mode in IMAGE_VARIANTS.values() for size in (width, height)))
+
+    def test_build_variant_urls(self):
+        images = [self.image("https://cdn.example.com/a.jpg"), self.image("http://cdn.example.com/b.jpg")]
+        urls = ProductOfferImage.build_variant_urls(images)
+
+        self.assertEqual(sorted(urls[0].keys()), sorted(IMAGE_VARIANTS.keys()))
+        self.assertEqual(urls[0]["thumbnail_crop"], "%s/ext/crop/150x150/cdn.example.com/a.jpg" % IMAGE_SERVER_URL)
+        self.assertEqual(urls[1]["zoom_fit"], "%s/ext/fit/1024x1024/cdn.example.com/b.jpg" % IMAGE_SERVER_URL)
+        # Same urls as the single variant methods
+        self.assertEqual(urls[0]["medium_fit"], images[0].medium_fit_url())
+        self.assertEqual(urls[1]["zoom_crop"], images[1].zoome_crop_url())
+
+    def test_cleaned_url_follows_url_changes(self):
+        image = self.image("https://cdn.example.com/a.jpg")
+        self.assertEqual(image.cleaned_url, "cdn.example.com/a.jpg")
+        image.url = "https://cdn.example.com/c.jpg"
+        self.assertEqual(image.variant_urls({"small": (10, 20, "fitfill")}),
+                         {"small": "%s/ext/fitfill/10x20/cdn.example.com/c.jpg" % IMAGE_SERVER_URL})
+
+    def test_invalid_mode(self):
+        image = self.image("https://cdn.example.com/a.jpg")
+        self.assertRaises(Exception, image.variant_urls, {"small": (10, 20, "stretch")})
+
+    def test_without_image_server(self):
+        self.assertEqual(build_resized_image_url(None, "https://cdn.example.com/a.jpg", 10, 10), "https://cdn.example.com/a.jpg")
+        self.handler.conf.IMAGE_SERVER_URL = None
+        image = self.image("https://cdn.example.com/a.jpg")
+        self.assertEqual(image.variant_urls()["medium_crop"], "https://cdn.example.com/a.jpg")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import unittest
+
+from lxml import etree
+
+from icebergsdk.parser import XMLParser
+
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<products version="2">
+    <product id="1">
+        <name>Robe</name>
+        <images>
+            <image>http://example.com/1.jpg</image>
+            <image>http://example.com/2.jpg</image>
+        </images>
+        <variations>
+            <variation sku="A1"><stock>3</stock></variation>
+        </variations>
+        <description lang="fr">Une robe</description>
+        <empty/>
+    </product>
+    <product id="2">
+        <name>Chemise</name>
+        <images>
+            <image>http://example.com/3.jpg</image>
+        </images>
+    </product>
+</products>
+"""
+
+
+class XMLParserTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = XMLParser()
+
+    def test_same_output_as_recursive(self):
+        """
+        Iterative etree_to_dict matches the recursive implementation
+        """
+        root = etree.fromstring(FEED)
+        self.assertEqual(self.parser.etree_to_dict(root), self.parser.etree_to_dict_recursive(root))
+        self.assertEqual(
+            self.parser.etree_to_dict(root, avoid_xml_double_dict=False),
+            self.parser.etree_to_dict_recursive(root, avoid_xml_double_dict=False)
+        )
+
+    def test_output(self):
+        products = self.parser.etree_to_dict(etree.fromstring(FEED))['products']['product']
+        self.assertEqual(len(products), 2)
+        self.assertEqual(products[0]['@id'], '1')
+        self.assertEqual(products[0]['images'], ['http://example.com/1.jpg', 'http://example.com/2.jpg'])
+        self.assertEqual(products[0]['variations'], {'@sku': 'A1', 'stock': '3'})
+        self.assertEqual(products[0]['description'], {'@lang': 'fr', '#text': 'Une robe'})
+        self.assertEqual(products[0]['empty'], None)
+        self.assertEqual(products[1]['images'], 'http://example.com/3.jpg')
+
+    def test_deep_feed(self):
+        """
+        Feeds deeper than the recursion limit can be converted
+        """
+        root = node = etree.Element("root")
+        depth = sys.getrecursionlimit() + 100
+        for i in xrange(depth):
+            node = etree.SubElement(node, "level")
+        node.text = "bottom"
+
+        value = self.parser.etree_to_dict(root)['root']
+        for i in xrange(depth - 1):
+            value = value['level']
+        self.assertEqual(value, {'level': 'bottom'})
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.polling import PollingStrategy, ResourceWatcher
+from icebergsdk.utils.instrumentation import register_hook, unregister_hook
+
+
+class PollingStrategyTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        register_hook("polling", self.on_polling)
+
+    def tearDown(self):
+        unregister_hook("polling", self.on_polling)
+
+    def on_polling(self, event_name, data):
+        self.events.append(data)
+
+    def test_condition_met(self):
+        values = iter(xrange(10))
+        strategy = PollingStrategy(initial_interval=0.001, max_wait=5)
+        met, value = strategy.poll(lambda: next(values), lambda value: value == 3, name="test")
+
+        self.assertTrue(met)
+        self.assertEqual(value, 3)
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(self.events[0]["name"], "test")
+        self.assertEqual(self.events[0]["polls"], 4)
+        self.assertTrue(self.events[0]["met"])
+
+    def test_terminal_value(self):
+        values = iter(["pending", "failed", "succeeded"])
+        strategy = PollingStrategy(initial_interval=0.001)
+        met, value = strategy.poll(lambda: next(values), lambda value: value == "succeeded",
+                                   is_terminal=lambda value: value == "failed")
+        self.assertFalse(met)
+        self.assertEqual(value, "failed")
+
+    def test_deadline_not_overshot(self):
+        strategy = PollingStrategy(initial_interval=10, max_wait=0.2)
+        start = time.time()
+        met, value = strategy.poll(lambda: None, lambda value: False)
+        self.assertFalse(met)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(self.events[0]["polls"], 2)
+
+    def test_max_polls(self):
+        strategy = PollingStrategy(initial_interval=0.001, max_polls=3)
+        strategy.poll(lambda: None, lambda value: False)
+        self.assertEqual(self.events[0]["polls"], 3)
+
+    def test_wait_for_value(self):
+        statuses = iter(["draft", "draft", "active"])
+
+        def responder(method, path, args, post_args):
+            return {"id": 1, "resource_uri": "/v1/productoffer/1/", "status": next(statuses)}
+
+        api_handler = FakeIcebergAPI(responder)
+        offer = api_handler.ProductOffer.findOrCreate({"id": 1, "resource_uri": "/v1/productoffer/1/"})
+        self.assertTrue(offer.wait_for_value("status", "active", retry_every=0.001))
+        self.assertEqual(len(api_handler.requests), 3)
+
+    def test_wait_for_triggers_number_of_checks(self):
+        api_handler = FakeIcebergAPI(lambda method, path, args, post_args: {"meta": {"total_count": 0}, "objects": []})
+        webhook = api_handler.Webhook.findOrCreate({"id": 1, "resource_uri": "/v1/webhook/1/"})
+        self.assertEqual(webhook.wait_for_triggers(max_number_of_checks=6, check_every_seconds=0.01), [])
+        self.assertEqual(len(api_handler.requests), 6)
+        self.assertEqual(self.events[0]["polls"], 6)
+
+
+class ResourceWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.statuses = {}
+
+        def responder(method, path, args, post_args):
+            objects = []
+            for offer_id in args['id__in'].split(","):
+                if len(self.statuses[offer_id]) > 1:
+                    self.statuses[offer_id].pop(0)
+                objects.append({
+                    "id": int(offer_id),
+                    "resource_uri": "/v1/productoffer/%s/" % offer_id,
+                    "status": self.statuses[offer_id][0],
+                })
+            return {"meta": {}, "objects": objects}
+
+        self.api_handler = FakeIcebergAPI(responder)
+        self.offers = []
+        for i in xrange(1, 6):
+            self.statuses[str(i)] = ["draft"] * i + ["active"]
+            self.offers.append(self.api_handler.ProductOffer.findOrCreate({
+                "id": i, "resource_uri": "/v1/productoffer/%s/" % i, "status": "draft"
+            }))
+
+    def test_watch_values(self):
+        """
+        One listing request per round for all the watched objects
+        """
+        watcher = ResourceWatcher(self.api_handler, initial_interval=0, batch_size=3)
+        futures = [watcher.watch_value(offer, "status", "active") for offer in self.offers]
+        watcher.run_until_complete()
+
+        self.assertEqual([future.result() for future in futures], [True] * 5)
+        self.assertEqual([offer.status for offer in self.offers], ["active"] * 5)
+        # 5 rounds, resolved offers are not requested again: 2 + 2 + 1 + 1 + 1 batches
+        self.assertEqual(len(self.api_handler.requests), 7)
+        self.assertEqual(watcher.pending, [])
+
+    def test_timeout(self):
+        watcher = ResourceWatcher(self.api_handler, initial_interval=0)
+        future = watcher.watch_value(self.offers[4], "status", "active", max_wait=0)
+        watcher.run_until_complete()
+        self.assertFalse(future.result())
+
+    def test_background_thread(self):
+        values = iter([0, 1, 2, 3])
+        watcher = ResourceWatcher(self.api_handler, initial_interval=0.01)
+        future = watcher.watch_callable(lambda: next(values), lambda value: value == 3)
+        watcher.start()
+        try:
+            self.assertTrue(future.result(timeout=5))
+        finally:
+            watcher.stop()
+        self.assertEqual(future.value, 3)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.exceptions import IcebergMultipleObjectsReturned, IcebergObjectNotFound
+from icebergsdk.resources import ProductOffer
+
+
+class FakeOffers(object):
+    def __init__(self, count=25):
+        self.objects = [
+            {"id": i, "resource_uri": "/v1/productoffer/%s/" % i, "price": i * 10,
+             "status": "active" if i % 2 else "draft"}
+            for i in range(1, count + 1)
+        ]
+
+    def __call__(self, method, path, args, post_args):
+        objects = list(self.objects)
+        if "status" in args:
+            objects = [obj for obj in objects if obj["status"] == args["status"]]
+        if "id" in args:
+            objects = [obj for obj in objects if obj["id"] == args["id"]]
+        order_by = args.get("order_by")
+        if order_by:
+            objects.sort(key=lambda obj: obj[order_by.lstrip("-")], reverse=order_by.startswith("-"))
+        offset, limit = args["offset"], args["limit"]
+        page = objects[offset:offset + limit]
+        return {
+            "meta": {"total_count": len(objects), "offset": offset, "limit": limit,
+                     "next": "next" if offset + limit < len(objects) else None},
+            "objects": page,
+        }
+
+
+class QuerySetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.api_handler = FakeIcebergAPI(FakeOffers())
+
+    def test_chaining_is_lazy(self):
+        queryset = self.api_handler.ProductOffer.filter(status="active").order_by("-price")
+        self.assertEqual(self.api_handler.requests, [])
+        self.assertEqual(queryset.args, {"status": "active", "order_by": "-price"})
+
+        base = self.api_handler.ProductOffer.filter(status="active")
+        base.order_by("price")
+        self.assertEqual(base.args, {"status": "active"})
+
+    def test_count(self):
+        queryset = self.api_handler.ProductOffer.filter(status="active")
+        self.assertEqual(queryset.count(), 13)
+        self.assertEqual(queryset.count(), 13)
+        self.assertEqual(len(self.api_handler.requests), 1)
+        self.assertEqual(self.api_handler.requests[0][2]["limit"], 1)
+
+        self.assertEqual(self.api_handler.ProductOffer.query()[5:10].count(), 5)
+        self.assertEqual(self.api_handler.ProductOffer.query()[20:40].count(), 5)
+
+    def test_iteration_pages_and_cache(self):
+        queryset = self.api_handler.ProductOffer.query(page_size=10).order_by("-price")
+        iterator = iter(queryset)
+        self.assertEqual(next(iterator).id, 25)
+        self.assertEqual(len(self.api_handler.requests), 1)
+
+        offers = list(queryset)
+        self.assertEqual([offer.id for offer in offers], range(25, 0, -1))
+        self.assertTrue(all(isinstance(offer, ProductOffer) for offer in offers))
+        self.assertEqual([args["offset"] for method, path, args, post_args in self.api_handler.requests], [0, 10, 20])
+
+        self.assertEqual(len(queryset), 25)
+        self.assertEqual(queryset.count(), 25)
+        self.assertEqual(queryset[3].id, 22)
+        self.assertEqual(len(self.api_handler.requests), 3)
+
+    def test_slices(self):
+        queryset = self.api_handler.ProductOffer.order_by("id")[5:17]
+        self.assertEqual([offer.id for offer in queryset], range(6, 18))
+        self.assertEqual(self.api_handler.requests[0][2]["offset"], 5)
+        self.assertEqual(self.api_handler.requests[0][2]["limit"], 12)
+
+        nested = self.api_handler.ProductOffer.order_by("id")[5:17][2:100]
+        self.assertEqual((nested.start, nested.stop), (7, 17))
+        self.assertEqual(self.api_handler.ProductOffer.order_by("id")[10:][:3].stop, 13)
+
+        self.assertRaises(ValueError, lambda: self.api_handler.ProductOffer.query()[::2])
+        self.assertRaises(ValueError, lambda: self.api_handler.ProductOffer.query()[-1])
+
+    def test_slice_of_fetched_queryset(self):
+        queryset = self.api_handler.ProductOffer.order_by("id")
+        list(queryset)
+        sliced = queryset[5:8]
+        self.assertTrue(isinstance(sliced, queryset.__class__))
+        self.assertEqual([offer.id for offer in sliced], [6, 7, 8])
+        self.assertEqual(sliced.count(), 3)
+        self.assertEqual(len(self.api_handler.requests), 1)
+
+    def test_page_size_capped_by_api(self):
+        offers = FakeOffers()
+        api_handler = FakeIcebergAPI(lambda method, path, args, post_args: offers(method, path, dict(args, limit=min(args["limit"], 10)), post_args))
+        queryset = api_handler.ProductOffer.query(page_size=100).order_by("id")
+        self.assertEqual([offer.id for offer in queryset], range(1, 26))
+        self.assertEqual([args["offset"] for method, path, args, post_args in api_handler.requests], [0, 10, 20])
+
+    def test_index_and_first(self):
+        queryset = self.api_handler.ProductOffer.order_by("id")
+        self.assertEqual(queryset[4].id, 5)
+        self.assertEqual(self.api_handler.requests[0][2]["offset"], 4)
+        self.assertEqual(self.api_handler.requests[0][2]["limit"], 1)
+        self.assertRaises(IndexError, lambda: queryset[30])
+        self.assertRaises(IndexError, lambda: queryset[:3][3])
+
+        self.assertEqual(queryset.first().id, 1)
+        self.assertEqual(queryset.filter(status="unknown").first(), None)
+        self.assertFalse(queryset.filter(status="unknown"))
+
+    def test_get(self):
+        self.assertEqual(self.api_handler.ProductOffer.query().get(id=3).id, 3)
+        self.assertRaises(IcebergObjectNotFound, self.api_handler.ProductOffer.query().get, id=300)
+        self.assertRaises(IcebergMultipleObjectsReturned, self.api_handler.ProductOffer.query().get, status="active")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from decimal import Decimal
+
+from helpers.fake_handler import FakeIcebergAPI
+
+
+class SerializationTest(unittest.TestCase):
+    def setUp(self):
+        self.api_handler = FakeIcebergAPI(lambda method, path, args, post_args: "No Content")
+        self.offer = self.api_handler.ProductOffer.findOrCreate({
+            "id": 1,
+            "resource_uri": "/v1/productoffer/1/",
+            "price": "10.00",
+            "name": u"Robe étoilée",
+            "merchant": {"id": 2, "resource_uri": "/v1/merchant/2/"},
+            "attributes": {"color": "red"},
+        })
+
+    def test_loaded_object_is_unchanged(self):
+        self.assertFalse(self.offer.has_changed())
+        self.assertEqual(self.offer.serialize(self.offer), {})
+
+    def test_same_value_is_not_sent(self):
+        self.offer.price = Decimal("10.00")
+        self.offer.merchant = self.api_handler.Store.findOrCreate({"id": 2, "resource_uri": "/v1/merchant/2/"})
+        self.assertEqual(self.offer.serialize(self.offer), {})
+
+    def test_only_changed_values_are_sent(self):
+        self.offer.price = Decimal("12.50")
+        self.offer.name = u"Robe bleue"
+        self.offer.attributes["color"] = "blue"  # modified in place
+        self.offer.description = "New field"
+
+        self.assertEqual(self.offer.serialize(self.offer), {
+            "price": "12.50",
+            "name": "Robe bleue",
+            "attributes": {"color": "blue"},
+            "description": "New field",
+        })
+
+    def test_only_containers_copied_when_loaded(self):
+        self.assertEqual(sorted(self.offer._original_values), ["attributes"])
+
+        self.offer.price = Decimal("12.50")
+        self.offer.price = Decimal("11.00")
+        self.assertEqual(self.offer._original_values["price"], Decimal("10.00"))
+        self.offer.price = Decimal("10.00")
+        self.assertFalse(self.offer.has_changed())
+
+    def test_reloaded_value_is_unchanged(self):
+        self.offer.name = u"Robe bleue"
+        self.api_handler.ProductOffer.findOrCreate({"id": 1, "resource_uri": "/v1/productoffer/1/", "name": u"Robe bleue"})
+        self.assertFalse(self.offer.has_changed())
+
+    def test_saved_values_are_not_sent_again(self):
+        self.offer.price = Decimal("12.50")
+        self.offer.save(return_data=False)
+
+        self.assertEqual(self.api_handler.requests[0][3], {"price": "12.50"})
+        self.assertFalse(self.offer.has_changed())
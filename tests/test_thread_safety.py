@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+import unittest
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.resources import ProductOffer, Store
+
+
+class TestHandlerThreadSafety(unittest.TestCase):
+    THREADS = 16
+    ROUNDS = 300
+
+    def setUp(self):
+        self.check_interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)  # Switch threads as often as possible
+        self.handler = FakeIcebergAPI()
+
+    def tearDown(self):
+        sys.setcheckinterval(self.check_interval)
+
+    def run_threads(self, target):
+        errors = []
+
+        def run(thread_number):
+            try:
+                target(thread_number)
+            except Exception as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_identity_preserved(self):
+        seen = [[] for _ in range(self.THREADS)]
+
+        def find_objects(thread_number):
+            for i in range(self.ROUNDS):
+                object_id = i % 20
+                offer = ProductOffer.findOrCreate(self.handler, {
+                    "id": object_id,
+                    "resource_uri": "/v1/productoffer/%s/" % object_id,
+                    "merchant": {"id": object_id % 3, "resource_uri": "/v1/merchant/%s/" % (object_id % 3)},
+                })
+                seen[thread_number].append(offer)
+
+        self.run_threads(find_objects)
+
+        for object_id in range(20):
+            offers = set(id(offers[i]) for offers in seen for i in range(object_id, self.ROUNDS, 20))
+            self.assertEqual(len(offers), 1)
+        merchants = set(id(offers[i].merchant) for offers in seen for i in range(3))
+        self.assertEqual(len(merchants), 3)
+        self.assertTrue(all(isinstance(offers[0].merchant, Store) for offers in seen))
+        self.assertIs(self.handler._objects_store["productoffer"]["5"], seen[0][5])
+
+    def test_find_and_remove(self):
+        def find_and_remove(thread_number):
+            for i in range(self.ROUNDS):
+                object_id = i % 5
+                offer = ProductOffer.findOrCreate(self.handler, {"id": object_id, "resource_uri": "/v1/productoffer/%s/" % object_id})
+                self.assertEqual(offer.id, object_id)
+                ProductOffer.remove_from_objects_store(self.handler, "productoffer", object_id)
+
+        self.run_threads(find_and_remove)
+
+    def test_clear_while_used(self):
+        identity_map = self.handler._objects_store
+
+        def use_and_clear(thread_number):
+            for i in range(self.ROUNDS):
+                data_type = "type_%s" % (i % 7)
+                if thread_number % 4 == 0:
+                    identity_map.clear()
+                else:
+                    identity_map.get_or_create(data_type, str(i), Store)
+                    identity_map.remove(data_type, str(i))
+
+        self.run_threads(use_and_clear)
+
+    def test_credentials_consistency(self):
+        credentials = [("user-a", "token-a"), ("user-b", "token-b")]
+        expected_tokens = set(self.handler.conf.ICEBERG_AUTH_HEADER + " %s:%s" % credential for credential in credentials)
+        tokens = set()
+
+        def switch_or_read(thread_number):
+            for i in range(self.ROUNDS):
+                if thread_number % 2:
+                    self.handler.set_credentials(*credentials[i % 2])
+                else:
+                    tokens.add(self.handler.get_auth_token())
+
+        self.handler.set_credentials(*credentials[0])
+        self.run_threads(switch_or_read)
+        self.assertTrue(tokens <= expected_tokens)
+
+    def test_credentials_attributes(self):
+        self.handler.username = "user"
+        self.handler.access_token = "token"
+        self.assertEqual(self.handler.get_auth_token(), "%s user:token" % self.handler.conf.ICEBERG_AUTH_HEADER)
+        self.handler.set_credentials("other", "other-token", auth_response={"username": "other"})
+        self.assertEqual((self.handler.username, self.handler.access_token), ("other", "other-token"))
+        self.assertEqual(self.handler._auth_response, {"username": "other"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+
+from icebergsdk.api import IcebergAPI
+from icebergsdk.conf import ConfigurationDebug
+from icebergsdk.exceptions import IcebergClientUnauthorizedError
+from icebergsdk.token_store import FileTokenStore, SQLiteTokenStore
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+
+class TokenConfiguration(ConfigurationDebug):
+    ICEBERG_APPLICATION_NAMESPACE = "test-app"
+    ICEBERG_APPLICATION_SECRET_KEY = "secret"
+    ICEBERG_API_PRIVATE_KEY = "private"
+
+
+class FakeResponse(object):
+    elapsed = timedelta(seconds=0)
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.content = json.dumps(data)
+        self.text = self.content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AuthSession(object):
+    """
+    Session answering the auth requests, and the other requests with 401 for revoked tokens
+    """
+    def __init__(self):
+        self.logins = 0
+        self.revoked = set()
+
+    def request(self, method, url, timeout=None, params=None, data=None, files=None, headers=None):
+        if url.endswith("/user/sso/") or url.endswith("/user/auth/"):
+            self.logins += 1
+            return FakeResponse(200, {"username": "john", "access_token": "token-%s" % self.logins})
+        if headers["Authorization"].split(":")[-1] in self.revoked:
+            return FakeResponse(401, {})
+        return FakeResponse(200, {"id": 1})
+
+
+class TokenStoreTestMixin(object):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.session = AuthSession()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def new_handler(self, store=None):
+        return IcebergAPI(conf=TokenConfiguration, session=self.session, token_store=store or self.store)
+
+    def test_set_get_delete(self):
+        token = {"username": "john", "access_token": "abc", "auth_response": {"a": 1}, "expires_at": time.time() + 100}
+        self.store.set("key", token)
+        self.assertEqual(self.store.get("key"), token)
+        self.assertEqual(self.store.get("key", min_validity=200), None)
+        self.store.delete("key")
+        self.assertEqual(self.store.get("key"), None)
+
+    def test_expired_tokens_ignored(self):
+        self.store.set("old", {"username": "john", "access_token": "abc", "auth_response": {}, "expires_at": time.time() - 1})
+        self.assertEqual(self.store.get("old"), None)
+
+    def test_token_reused_by_fresh_handlers(self):
+        handler = self.new_handler().sso_user(email="john@example.com")
+        self.assertEqual(handler.access_token, "token-1")
+
+        other_handler = self.new_handler().sso_user(email="john@example.com")  # Ex: another process
+        self.assertEqual(other_handler.access_token, "token-1")
+        self.assertEqual(other_handler._auth_response["username"], "john")
+        self.assertEqual(self.session.logins, 1)
+
+        self.new_handler().sso_user(email="other@example.com")
+        self.new_handler().auth_user("john", "john@example.com")
+        self.assertEqual(self.session.logins, 3)
+
+    def test_invalidated_on_unauthorized(self):
+        handler = self.new_handler().sso_user(email="john@example.com")
+        self.session.revoked.add("token-1")
+        self.assertRaises(IcebergClientUnauthorizedError, handler.request, "user/1/")
+        self.assertEqual(handler.token_expires_at, 0)
+
+        handler = self.new_handler().sso_user(email="john@example.com")
+        self.assertEqual(handler.access_token, "token-2")
+
+    def test_login_options_in_key(self):
+        self.new_handler().auth_user("john", "john@example.com", is_staff=True)
+        self.new_handler().auth_user("john", "john@example.com")
+        self.new_handler().sso_user(email="john@example.com")
+        self.new_handler().sso_user(email="john@example.com", currency="USD")
+        self.new_handler().sso_user(email="john@example.com", include_application_data=False)
+        self.assertEqual(self.session.logins, 5)
+
+        self.new_handler().auth_user("john", "john@example.com", is_staff=True)
+        self.assertEqual(self.session.logins, 5)
+
+    def test_key_by_api_url(self):
+        class SandboxConfiguration(TokenConfiguration):
+            ICEBERG_API_URL = "http://api.sandbox.local.iceberg.technology"
+
+        self.assertEqual(TokenConfiguration.ICEBERG_ENV, SandboxConfiguration.ICEBERG_ENV)
+        self.assertNotEqual(self.store.build_key(TokenConfiguration, "sso_user", "john@example.com"),
+                            self.store.build_key(SandboxConfiguration, "sso_user", "john@example.com"))
+
+    def test_refused_token_doesnt_remove_new_one(self):
+        handler = self.new_handler().sso_user(email="john@example.com")
+        key = handler._token_store_key
+        # Meanwhile, another process got and stored a new token
+        self.store.set(key, dict(self.store.get(key), access_token="token-new"))
+
+        self.session.revoked.add("token-1")
+        self.assertRaises(IcebergClientUnauthorizedError, handler.request, "user/1/")
+        self.assertEqual(self.store.get(key)["access_token"], "token-new")
+
+        self.store.delete(key, access_token="token-1")
+        self.assertEqual(self.store.get(key)["access_token"], "token-new")
+        self.store.delete(key, access_token="token-new")
+        self.assertEqual(self.store.get(key), None)
+
+    def test_anonymous_conversion_not_stored(self):
+        self.new_handler().sso_user(email="john@example.com", from_session_id="abc")
+        self.new_handler().sso_user(email="john@example.com", from_session_id="abc")
+        self.assertEqual(self.session.logins, 2)
+
+
+class FileTokenStoreTest(TokenStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(FileTokenStoreTest, self).setUp()
+        self.path = os.path.join(self.tmp_dir, "tokens.json")
+        self.store = FileTokenStore(self.path)
+
+    def test_file_private(self):
+        self.store.set("key", {"username": "john", "access_token": "abc", "auth_response": {}, "expires_at": time.time() + 100})
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0600)
+
+    @unittest.skipIf(Fernet is None, "cryptography is not installed")
+    def test_encrypted(self):
+        store = FileTokenStore(self.path, encryption_key=Fernet.generate_key())
+        self.new_handler(store).sso_user(email="john@example.com")
+        with open(self.path) as store_file:
+            self.assertNotIn("token-1", store_file.read())
+        self.assertEqual(self.new_handler(store).sso_user(email="john@example.com").access_token, "token-1")
+
+    @unittest.skipIf(Fernet is not None, "cryptography is installed")
+    def test_encryption_requires_cryptography(self):
+        self.assertRaises(Exception, FileTokenStore, self.path, encryption_key="key")
+
+
+class SQLiteTokenStoreTest(TokenStoreTestMixin, unittest.TestCase):
+    def setUp(self):
+        super(SQLiteTokenStoreTest, self).setUp()
+        self.store = SQLiteTokenStore(os.path.join(self.tmp_dir, "tokens.db"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import hmac
+import json
+import threading
+import unittest
+from StringIO import StringIO
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import requests
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.resources import MerchantOrder
+from icebergsdk.webhook_receiver import WebhookReceiver
+
+SECRET_KEY = "secret"
+
+
+def sign(body, secret_key=SECRET_KEY):
+    return hmac.new(secret_key, body, digestmod=hashlib.sha1).hexdigest()
+
+
+def webhook_body(trigger_id=1, event="merchant_order_confirmed"):
+    return json.dumps({
+        "trigger_id": trigger_id,
+        "event": event,
+        "data": {"id": 3, "resource_uri": "/v1/merchant_order/3/", "status": "60"},
+    })
+
+
+def call_app(app, body, method="POST", headers=None):
+    environ = {
+        "REQUEST_METHOD": method,
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": StringIO(body),
+    }
+    environ.update(headers or {})
+    response = {}
+
+    def start_response(status, headers):
+        response["status"] = int(status.split(" ")[0])
+        response["headers"] = dict(headers)
+
+    app(environ, start_response)
+    return response
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class TestWebhookReceiver(unittest.TestCase):
+    def setUp(self):
+        self.handler = FakeIcebergAPI()
+        self.receiver = WebhookReceiver(handler=self.handler, secret_key=SECRET_KEY, workers=2, queue_size=2)
+        self.events = []
+        self.receiver.register("*", self.events.append)
+
+    def tearDown(self):
+        self.receiver.stop()
+
+    def post(self, body, signature=None):
+        return call_app(self.receiver, body, headers={"HTTP_X_ICEBERG_SIGNATURE": signature or sign(body)})
+
+    def test_dispatch_hydrated_resource(self):
+        confirmed = []
+        self.receiver.register("merchant_order_confirmed", confirmed.append)
+        self.receiver.start()
+
+        self.assertEqual(self.post(webhook_body())["status"], 202)
+        self.receiver.join()
+
+        self.assertEqual(len(confirmed), 1)
+        self.assertEqual(self.events, confirmed)
+        event = confirmed[0]
+        self.assertEqual(event.trigger_id, 1)
+        self.assertTrue(isinstance(event.resource, MerchantOrder))
+        self.assertEqual(event.resource.status, "60")
+        self.assertEqual(self.handler.requests, [])
+
+    def test_signature_checked(self):
+        body = webhook_body()
+        self.assertEqual(self.post(body, signature=sign(body, "other"))["status"], 403)
+        self.assertEqual(call_app(self.receiver, body)["status"], 403)
+        self.assertEqual(self.receiver.queue.qsize(), 0)
+
+    def test_secret_key_required(self):
+        self.assertRaises(ValueError, WebhookReceiver, handler=self.handler)
+        self.assertRaises(ValueError, WebhookReceiver, handler=self.handler, secret_key="")
+
+        receiver = WebhookReceiver(handler=self.handler, allow_unsigned=True)
+        self.assertEqual(call_app(receiver, webhook_body())["status"], 202)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post("not json")["status"], 400)
+        self.assertEqual(call_app(self.receiver, "", method="GET")["status"], 405)
+
+    def test_duplicated_trigger_ignored(self):
+        self.receiver.start()
+        self.assertEqual(self.post(webhook_body(trigger_id=5))["status"], 202)
+        self.assertEqual(self.post(webhook_body(trigger_id=5))["status"], 200)
+        self.receiver.join()
+        self.assertEqual(len(self.events), 1)
+
+    def test_backpressure(self):
+        # Workers not started: the queue fills up
+        self.assertEqual(self.post(webhook_body(trigger_id=1))["status"], 202)
+        self.assertEqual(self.post(webhook_body(trigger_id=2))["status"], 202)
+        response = self.post(webhook_body(trigger_id=3))
+        self.assertEqual(response["status"], 503)
+        self.assertEqual(response["headers"]["Retry-After"], "30")
+
+        self.receiver.start()
+        self.receiver.join()
+        # The refused webhook is accepted when retried
+        self.assertEqual(self.post(webhook_body(trigger_id=3))["status"], 202)
+        self.receiver.join()
+        self.assertEqual(sorted(event.trigger_id for event in self.events), [1, 2, 3])
+
+    def test_callback_errors_dont_stop_workers(self):
+        def failing(event):
+            raise ValueError("callback error")
+        self.receiver.register("merchant_order_confirmed", failing)
+        self.receiver.start()
+        self.post(webhook_body(trigger_id=1))
+        self.post(webhook_body(trigger_id=2))
+        self.receiver.join()
+        self.assertEqual(len(self.events), 2)
+
+    def test_failed_trigger_processed_again(self):
+        failures = [ValueError("callback error")]
+
+        def failing(event):
+            if failures:
+                raise failures.pop()
+        self.receiver.register("merchant_order_confirmed", failing)
+        self.receiver.start()
+
+        self.assertEqual(self.post(webhook_body(trigger_id=7))["status"], 202)
+        self.receiver.join()
+        self.assertEqual(self.post(webhook_body(trigger_id=7))["status"], 202)
+        self.receiver.join()
+        self.assertEqual(self.post(webhook_body(trigger_id=7))["status"], 200)
+        self.assertEqual(len(self.events), 2)
+
+    def test_standalone_server(self):
+        self.receiver.start()
+        server = make_server("127.0.0.1", 0, self.receiver, handler_class=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            body = webhook_body()
+            response = requests.post(
+                "http://127.0.0.1:%s/" % server.server_port,
+                data=body,
+                headers={"X-Iceberg-Signature": sign(body)}
+            )
+            self.assertEqual(response.status_code, 202)
+            self.receiver.join()
+            self.assertEqual(len(self.events), 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from StringIO import StringIO
+
+from helpers.fake_handler import FakeIcebergAPI
+from icebergsdk.utils.checkpoint import FileCheckpoint
+from icebergsdk.webhook_tools import WebhookReplayer, WebhookScanner, WebhookStats, export_ndjson, percentile
+
+WEBHOOKS = [
+    {"id": 1, "event": "new_merchant_available", "resource_uri": "/v1/webhook/1/"},
+    {"id": 2, "event": "product_offer_updated", "resource_uri": "/v1/webhook/2/"},
+]
+
+TRIGGERS = {
+    1: [{"id": i, "status": "failed", "resource_uri": "/v1/webhook_trigger/%s/" % i} for i in range(1, 6)],
+    2: [{"id": 10, "status": "failed", "resource_uri": "/v1/webhook_trigger/10/"}],
+}
+
+
+def listing(objects, args):
+    offset, limit = args['offset'], args['limit']
+    page = objects[offset:offset + limit]
+    return {
+        "meta": {"next": "next" if offset + limit < len(objects) else None, "total_count": len(objects)},
+        "objects": page,
+    }
+
+
+def responder(method, path, args, post_args):
+    if path == "webhook/":
+        return listing(WEBHOOKS, args)
+    if path.endswith("triggers/"):
+        webhook_id = int(path.split("/")[3])
+        triggers = [t for t in TRIGGERS[webhook_id] if args.get('status') in (None, t['status'])]
+        return listing(triggers, args)
+    if path.endswith("attempts/"):
+        trigger_id = int(path.split("/")[3])
+        attempts = [{"id": trigger_id * 100 + n, "response_code": 500, "response_time": trigger_id + n} for n in range(2)]
+        return listing(attempts, args)
+    raise ValueError(path)
+
+
+class TestWebhookScanner(unittest.TestCase):
+    def test_scan(self):
+        handler = FakeIcebergAPI(responder)
+        scanner = WebhookScanner(handler, application=7, page_size=2, concurrency=3)
+        records = list(scanner.scan())
+
+        self.assertEqual(sorted(record['trigger']['id'] for record in records), [1, 2, 3, 4, 5, 10])
+        first_record = [record for record in records if record['trigger']['id'] == 1][0]
+        self.assertEqual(first_record['event'], "new_merchant_available")
+        self.assertEqual(len(first_record['attempts']), 2)
+        self.assertEqual(handler.requests[0][2]['application'], 7)
+        trigger_requests = [request for request in handler.requests if request[1].endswith("triggers/")]
+        self.assertEqual(trigger_requests[0][2]['status'], "failed")
+
+    def test_webhooks_scanned_concurrently(self):
+        active = []
+        max_active = []
+        lock = threading.Lock()
+
+        def slow_responder(method, path, args, post_args):
+            if path.endswith("triggers/"):
+                with lock:
+                    active.append(path)
+                    max_active.append(len(active))
+                time.sleep(0.05)
+                with lock:
+                    active.remove(path)
+            return responder(method, path, args, post_args)
+
+        records = list(WebhookScanner(FakeIcebergAPI(slow_responder), concurrency=2).scan())
+        self.assertEqual(sorted(record['trigger']['id'] for record in records), [1, 2, 3, 4, 5, 10])
+        self.assertEqual(max(max_active), 2)
+
+    def test_records_streamed(self):
+        many_triggers = [{"id": i, "status": "failed", "resource_uri": "/v1/webhook_trigger/%s/" % i} for i in range(100, 400)]
+        pages = []
+
+        def big_responder(method, path, args, post_args):
+            if path.endswith("triggers/") and path != "/v1/webhook/2/triggers/":
+                pages.append(args['offset'])
+                return listing(many_triggers, args)
+            return responder(method, path, args, post_args)
+
+        scanner = WebhookScanner(FakeIcebergAPI(big_responder), page_size=10, concurrency=2, with_attempts=False, buffer_size=5)
+        records = scanner.scan()
+        next(records)
+        time.sleep(0.3)
+        self.assertTrue(len(pages) <= 3)  # Blocked by the full buffer
+        records.close()
+
+    def test_page_size_capped_by_api(self):
+        def capped_responder(method, path, args, post_args):
+            return responder(method, path, dict(args, limit=min(args['limit'], 2)), post_args)
+
+        records = list(WebhookScanner(FakeIcebergAPI(capped_responder), page_size=10, with_attempts=False).scan())
+        self.assertEqual(sorted(record['trigger']['id'] for record in records), [1, 2, 3, 4, 5, 10])
+
+    def test_stats_and_export(self):
+        handler = FakeIcebergAPI(responder)
+        stats = WebhookStats()
+        output = StringIO()
+        count = export_ndjson(stats.collect(WebhookScanner(handler).scan()), output)
+
+        self.assertEqual(count, 6)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(sorted(json.loads(line)['trigger']['id'] for line in lines), [1, 2, 3, 4, 5, 10])
+
+        rows = stats.as_rows()
+        self.assertEqual([row['webhook_id'] for row in rows], [1, 2])
+        self.assertEqual(rows[0]['failed_triggers'], 5)
+        self.assertEqual(rows[0]['attempts'], 10)
+        self.assertEqual(rows[0]['latency_max'], 6)
+        self.assertEqual(rows[1]['latency_avg'], 10.5)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 50), None)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile(range(1, 101), 95), 95)
+
+
+class TestWebhookReplayer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.checkpoint = FileCheckpoint(os.path.join(self.tmp_dir, "replay.json"))
+        self.delivered = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def deliver(self, trigger):
+        with self.lock:
+            self.delivered.append(trigger['id'])
+
+    def test_replay_filtered(self):
+        handler = FakeIcebergAPI(responder)
+        progress = []
+        replayer = WebhookReplayer(handler, self.deliver, events=["new_merchant_available"], filters={"event_id": 3},
+                                   concurrency=3, rate_limit=1000, progress=lambda done, total, report: progress.append((done, total)))
+        report = replayer.replay()
+
+        self.assertEqual(sorted(report.succeeded), [1, 2, 3, 4, 5])
+        self.assertEqual(sorted(self.delivered), [1, 2, 3, 4, 5])
+        self.assertEqual(progress[-1], (5, 5))
+        self.assertTrue(all(request[0] == "GET" for request in handler.requests))
+        trigger_request = [request for request in handler.requests if request[1].endswith("triggers/")][0]
+        self.assertEqual(trigger_request[2]['event_id'], 3)
+
+    def test_replay_period(self):
+        dates = {1: "2015-03-01T09:00:00", 2: "2015-03-01T10:00:00", 3: "2015-03-01T12:00:00+02:00",
+                 4: "2015-03-02T08:00:00", 10: "2015-03-01T11:00:00"}
+
+        def dated_responder(method, path, args, post_args):
+            data = responder(method, path, args, post_args)
+            if path.endswith("triggers/"):
+                data['objects'] = [dict(trigger, created_on=dates.get(trigger['id'])) for trigger in data['objects']]
+            return data
+
+        replayer = WebhookReplayer(FakeIcebergAPI(dated_responder), self.deliver,
+                                   created_after=datetime.datetime(2015, 3, 1, 10),
+                                   created_before="2015-03-02T08:00:00Z")
+        report = replayer.replay()
+        self.assertEqual(sorted(report.succeeded), [2, 3, 10])
+        self.assertEqual(sorted(self.delivered), [2, 3, 10])
+
+    def test_resume_from_checkpoint(self):
+        def failing_deliver(trigger):
+            if trigger['id'] == 4:
+                raise ValueError("Outage")
+            self.deliver(trigger)
+
+        handler = FakeIcebergAPI(responder)
+        report = WebhookReplayer(handler, failing_deliver, checkpoint=self.checkpoint, checkpoint_every=2).replay()
+        self.assertEqual(len(report.failed), 1)
+        self.assertEqual(sorted(self.checkpoint.load()['replayed']), [1, 2, 3, 5, 10])
+
+        del self.delivered[:]
+        report = WebhookReplayer(handler, self.deliver, checkpoint=self.checkpoint).replay()
+        self.assertEqual(self.delivered, [4])
+        self.assertEqual(len(report.skipped), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()